@@ -0,0 +1,207 @@
+"""Deterministic generator of synthetic C++ headers for benchmarking.
+
+The same CorpusSpec always produces the same files, so timings taken on
+different days or machines describe the same input.
+"""
+
+
+import os
+import random
+
+
+_SCALAR_TYPES = ('int', 'bool', 'double', 'float', 'char', 'long',
+                 'unsigned int', 'size_t')
+_CLASS_TYPES = ('std::string', 'QString', 'Widget', 'Model', 'Request',
+                'Response', 'Buffer', 'Timestamp')
+_CONTAINERS = ('std::vector', 'std::list', 'std::shared_ptr', 'QList',
+               'std::unique_ptr')
+
+
+class CorpusSpec(object):
+    """Shape of a synthetic corpus.
+
+    files: number of headers
+    classes: classes per header
+    methods: virtual methods per class
+    namespace_depth: nesting of the namespaces around the classes
+    template_depth: maximum nesting of template arguments in signatures
+    macro_density: chance, per method, of preprocessor lines around it
+    inline_body: number of statements in one inline method per class
+    seed: seed of the random generator
+    nesting_depth: when not 0, every header also gets a stress class with
+                   this many classes nested in it and a template argument
+                   nested as deep
+    """
+
+    def __init__(self, files=20, classes=10, methods=20, namespace_depth=2,
+                 template_depth=2, macro_density=0.1, inline_body=5,
+                 seed=1, nesting_depth=0):
+        self.files = files
+        self.classes = classes
+        self.methods = methods
+        self.namespace_depth = namespace_depth
+        self.template_depth = template_depth
+        self.macro_density = macro_density
+        self.inline_body = inline_body
+        self.seed = seed
+        self.nesting_depth = nesting_depth
+
+    def ToDict(self):
+        return dict(self.__dict__)
+
+
+def _Type(rng, depth):
+    if depth > 0 and rng.random() < 0.5:
+        container = rng.choice(_CONTAINERS)
+        if container == 'std::vector' and rng.random() < 0.3:
+            return 'std::map<%s, %s>' % (rng.choice(_SCALAR_TYPES),
+                                         _Type(rng, depth - 1))
+        return '%s<%s>' % (container, _Type(rng, depth - 1))
+    return rng.choice(_SCALAR_TYPES + _CLASS_TYPES)
+
+
+def _Parameter(rng, spec, index):
+    parameter_type = _Type(rng, spec.template_depth)
+    style = rng.random()
+    if style < 0.3:
+        parameter_type = 'const %s&' % parameter_type
+    elif style < 0.4:
+        parameter_type += '*'
+    return '%s arg%d' % (parameter_type, index)
+
+
+def _Method(rng, spec, class_index, method_index):
+    parameters = ', '.join([_Parameter(rng, spec, i)
+                            for i in range(rng.randint(0, 4))])
+    return_type = rng.choice(('void', 'void', _Type(rng, spec.template_depth)))
+    const = rng.random() < 0.3 and ' const' or ''
+    pure = rng.random() < 0.7 and ' = 0' or ''
+    return '  virtual %s Method%d_%d(%s)%s%s;' % (
+        return_type, class_index, method_index, parameters, const, pure)
+
+
+def _Class(rng, spec, file_index, class_index):
+    name = 'Class%d_%d' % (file_index, class_index)
+    lines = ['class %s : public Base%d {' % (name, class_index % 3),
+             ' public:',
+             '  %s();' % name,
+             '  virtual ~%s();' % name]
+    for method_index in range(spec.methods):
+        guarded = rng.random() < spec.macro_density
+        if guarded:
+            lines.append('#ifdef FEATURE_%d' % method_index)
+            lines.append('#define FEATURE_%d_ENABLED 1' % method_index)
+        lines.append(_Method(rng, spec, class_index, method_index))
+        if guarded:
+            lines.append('#endif  // FEATURE_%d' % method_index)
+    if spec.inline_body:
+        lines.append('  int Compute(int value) const {')
+        lines.append('    int total = value;')
+        for statement in range(spec.inline_body):
+            lines.append('    total = total * %d + member_%d_;' %
+                         (statement + 1, statement % 3))
+        lines.append('    return total;')
+        lines.append('  }')
+    lines.append(' private:')
+    for member in range(3):
+        lines.append('  int member_%d_;' % member)
+    lines.append('};')
+    return name, lines
+
+
+def _NestedClass(rng, spec, file_index):
+    name = 'Nested%d' % file_index
+    argument = rng.choice(_SCALAR_TYPES)
+    for unused_depth in range(spec.nesting_depth):
+        argument = '%s<%s>' % (rng.choice(_CONTAINERS), argument)
+    lines = ['class %s {' % name,
+             ' public:',
+             '  virtual void Deep(const %s& arg0) = 0;' % argument]
+    for depth in range(spec.nesting_depth):
+        indent = '  ' * (depth + 1)
+        lines.append('%sclass %s_%d {' % (indent, name, depth))
+        lines.append('%s public:' % indent)
+        lines.append('%s  virtual int Level%d() const = 0;' % (indent, depth))
+    for depth in reversed(range(spec.nesting_depth)):
+        lines.append('%s};' % ('  ' * (depth + 1)))
+    lines.append('};')
+    return name, lines
+
+
+def GenerateHeader(spec, file_index):
+    """Returns (source, [class name, ...]) of one header of the corpus."""
+    rng = random.Random('%d:%d' % (spec.seed, file_index))
+    guard = 'CORPUS_HEADER_%d_H' % file_index
+    lines = ['// Generated benchmark header %d.' % file_index,
+             '#ifndef %s' % guard,
+             '#define %s' % guard,
+             '',
+             '#include <map>',
+             '#include "base.h"',
+             '']
+    namespaces = ['ns%d_%d' % (file_index, depth)
+                  for depth in range(spec.namespace_depth)]
+    for namespace in namespaces:
+        lines.append('namespace %s {' % namespace)
+    class_names = []
+    for class_index in range(spec.classes):
+        name, class_lines = _Class(rng, spec, file_index, class_index)
+        class_names.append(name)
+        lines.append('')
+        lines.extend(class_lines)
+    if spec.nesting_depth:
+        name, class_lines = _NestedClass(rng, spec, file_index)
+        class_names.append(name)
+        lines.append('')
+        lines.extend(class_lines)
+    lines.append('')
+    for namespace in reversed(namespaces):
+        lines.append('}  // namespace %s' % namespace)
+    lines.append('')
+    lines.append('#endif  // %s' % guard)
+    lines.append('')
+    return '\n'.join(lines), class_names
+
+
+def GenerateInterface(spec, file_index):
+    """Returns (filename, source) of an interface NewClass can read.
+
+    NewClass only understands one-word types, so these signatures are
+    simpler than the ones in GenerateHeader().
+    """
+    rng = random.Random('interface:%d:%d' % (spec.seed, file_index))
+    name = 'ICorpus%d' % file_index
+    words = ('int', 'bool', 'double', 'QString', 'Widget*', 'Model&')
+    lines = ['#ifndef %s_H' % name.upper(),
+             '#define %s_H' % name.upper(),
+             '',
+             'class %s' % name,
+             '{',
+             ' public:',
+             '    virtual ~%s(){}' % name,
+             '']
+    for method_index in range(spec.methods * spec.classes):
+        parameters = ', '.join(['%s arg%d' % (rng.choice(words), i)
+                                for i in range(rng.randint(1, 4))])
+        lines.append('    virtual %s method%d(%s) = 0;' %
+                     (rng.choice(words), method_index, parameters))
+    lines.extend(['};', '', '#endif //%s_H' % name.upper(), ''])
+    return name + '.h', '\n'.join(lines)
+
+
+def WriteCorpus(spec, directory):
+    """Writes the headers of spec into directory.
+
+    Returns:
+      [(path, [class name, ...]), ...]
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    result = []
+    for file_index in range(spec.files):
+        source, class_names = GenerateHeader(spec, file_index)
+        path = os.path.join(directory, 'corpus%d.h' % file_index)
+        with open(path, 'w') as fp:
+            fp.write(source)
+        result.append((path, class_names))
+    return result
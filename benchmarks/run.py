@@ -0,0 +1,237 @@
+"""Benchmark the C++ generators on a synthetic header corpus.
+
+Each pipeline stage is timed on its own: tokenize.GetTokens, the AST
+builder, gmock_class._GenerateMocks and NewClass class generation, the
+latter also on one interface of --interface-methods methods.  The best of
+--repeat runs is reported as JSON, along with the time of a fixed
+calibration loop that makes timings from different machines comparable.
+
+Usage:
+  python -m benchmarks.run [--files N] [--classes N] [--methods N]
+                           [--namespace-depth N] [--template-depth N]
+                           [--macro-density F] [--inline-body N]
+                           [--seed N] [--nesting-depth N]
+                           [--interface-methods N] [--repeat N]
+                           [--output FILE]
+"""
+
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(_ROOT, 'external-libs', 'gmock-generator'))
+sys.path.append(os.path.join(_ROOT, 'src'))
+
+from cpp import ast
+from cpp import gmock_class
+from cpp import tokenize
+
+from benchmarks import corpus
+
+
+def CountNodes(nodes):
+    """Returns the number of nodes, including the members of classes."""
+    count = 0
+    pending = list(nodes)
+    while pending:
+        node = pending.pop()
+        count += 1
+        if isinstance(node, ast.Class) and node.body:
+            pending.extend(node.body)
+    return count
+
+
+def _Best(repeat, function):
+    best = None
+    for unused_run in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def _CalibrationLoop():
+    # Dictionary, string and integer work, like the tokenizer and parser.
+    counts = {}
+    total = 0
+    for i in range(200000):
+        key = 'name%d' % (i % 1000)
+        counts[key] = counts.get(key, 0) + 1
+        total += len(key)
+    return total
+
+
+def Calibrate(repeat):
+    """Returns the best time of a fixed loop, a measure of machine speed."""
+    return _Best(repeat, _CalibrationLoop)[0]
+
+
+def _Rate(count, seconds):
+    if not seconds:
+        return None
+    return count / seconds
+
+
+def BenchTokenize(sources, repeat):
+    def Run():
+        count = 0
+        for unused_filename, source in sources:
+            for unused_token in tokenize.GetTokens(source):
+                count += 1
+        return count
+    seconds, tokens = _Best(repeat, Run)
+    return {'seconds': seconds, 'tokens': tokens,
+            'tokens_per_second': _Rate(tokens, seconds),
+            'files_per_second': _Rate(len(sources), seconds)}
+
+
+def BenchParse(sources, repeat):
+    best = None
+    for unused_run in range(repeat):
+        # Tokenize outside of the timed region, the builder marks tokens
+        # it pushes back so every run needs fresh ones.
+        token_lists = [(filename, list(tokenize.GetTokens(source)))
+                       for filename, source in sources]
+        start = time.perf_counter()
+        asts = [list(filter(None, ast.AstBuilder(iter(tokens),
+                                                 filename).Generate()))
+                for filename, tokens in token_lists]
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    nodes = sum([CountNodes(nodes) for nodes in asts])
+    return {'seconds': best, 'nodes': nodes,
+            'nodes_per_second': _Rate(nodes, best),
+            'files_per_second': _Rate(len(sources), best)}, asts
+
+
+def BenchGenerate(sources, asts, repeat):
+    def Run():
+        lines = 0
+        for (filename, source), nodes in zip(sources, asts):
+            lines += len(gmock_class._GenerateMocks(filename, source, nodes,
+                                                    None))
+        return lines
+    seconds, lines = _Best(repeat, Run)
+    classes = sum([len([n for n in nodes if isinstance(n, ast.Class)])
+                   for nodes in asts])
+    return {'seconds': seconds, 'classes': classes, 'lines': lines,
+            'classes_per_second': _Rate(classes, seconds),
+            'files_per_second': _Rate(len(sources), seconds)}
+
+
+def BenchNewClass(spec, directory, repeat):
+    import NewClass
+    output_directory = os.path.join(directory, 'classes')
+    os.makedirs(output_directory)
+    interfaces = []
+    for file_index in range(spec.files):
+        filename, source = corpus.GenerateInterface(spec, file_index)
+        path = os.path.join(directory, filename)
+        with open(path, 'w') as fp:
+            fp.write(source)
+        interfaces.append(path)
+
+    saved_argv = sys.argv
+    saved_cwd = os.getcwd()
+    os.chdir(output_directory)
+    try:
+        def Run():
+            for path in interfaces:
+                sys.argv = ['NewClass.py', '--no-cache', 'class', path]
+                NewClass.main()
+            return len(interfaces)
+        seconds, files = _Best(repeat, Run)
+    finally:
+        sys.argv = saved_argv
+        os.chdir(saved_cwd)
+    return {'seconds': seconds, 'files': files,
+            'methods': spec.methods * spec.classes * files,
+            'files_per_second': _Rate(files, seconds)}
+
+
+def RunBenchmarks(spec, repeat=3, interface_methods=10000):
+    """Returns the benchmark results for spec as a dict."""
+    directory = tempfile.mkdtemp(prefix='cpp-bench-')
+    try:
+        headers = corpus.WriteCorpus(spec, directory)
+        sources = []
+        for path, unused_class_names in headers:
+            with open(path) as fp:
+                sources.append((path, fp.read()))
+        parse, asts = BenchParse(sources, repeat)
+        phases = {
+            'tokenize': BenchTokenize(sources, repeat),
+            'parse': parse,
+            'generate': BenchGenerate(sources, asts, repeat),
+            'newclass': BenchNewClass(spec, directory, repeat),
+            'newclass_large': BenchNewClass(
+                corpus.CorpusSpec(files=1, classes=1,
+                                  methods=interface_methods, seed=spec.seed),
+                os.path.join(directory, 'large'), repeat),
+        }
+    finally:
+        shutil.rmtree(directory)
+    return {
+        'corpus': dict(spec.ToDict(),
+                       bytes=sum([len(source) for _, source in sources])),
+        'python': platform.python_version(),
+        'repeat': repeat,
+        'calibration_seconds': Calibrate(repeat),
+        'phases': phases,
+    }
+
+
+def main(argv=sys.argv):
+    defaults = corpus.CorpusSpec()
+    parser = argparse.ArgumentParser(prog='benchmarks.run')
+    parser.add_argument('--files', type=int, default=defaults.files)
+    parser.add_argument('--classes', type=int, default=defaults.classes)
+    parser.add_argument('--methods', type=int, default=defaults.methods)
+    parser.add_argument('--namespace-depth', type=int,
+                        default=defaults.namespace_depth)
+    parser.add_argument('--template-depth', type=int,
+                        default=defaults.template_depth)
+    parser.add_argument('--macro-density', type=float,
+                        default=defaults.macro_density)
+    parser.add_argument('--inline-body', type=int,
+                        default=defaults.inline_body)
+    parser.add_argument('--seed', type=int, default=defaults.seed)
+    parser.add_argument('--nesting-depth', type=int,
+                        default=defaults.nesting_depth,
+                        help='add a class nesting this many classes and '
+                        'template arguments to every header')
+    parser.add_argument('--interface-methods', type=int, default=10000,
+                        help='methods of the interface of the newclass_large '
+                        'phase')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', metavar='FILE',
+                        help='write the JSON report here instead of stdout')
+    args = parser.parse_args(argv[1:])
+
+    spec = corpus.CorpusSpec(args.files, args.classes, args.methods,
+                             args.namespace_depth, args.template_depth,
+                             args.macro_density, args.inline_body, args.seed,
+                             args.nesting_depth)
+    report = json.dumps(RunBenchmarks(spec, args.repeat,
+                                      args.interface_methods),
+                        indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            fp.write(report + '\n')
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -39,10 +39,16 @@ except ImportError:
     # Python 2.x
     import __builtin__ as builtins
 
+import bisect
+import os
+import pickle
 import sys
 import traceback
 
+from cpp import disk_cache
 from cpp import keywords
+from cpp import metrics
+from cpp import profiling
 from cpp import tokenize
 from cpp import utils
 
@@ -96,18 +102,43 @@ TYPE_MODIFIER_MAP = {
 
 _INTERNAL_TOKEN = 'internal'
 _NAMESPACE_POP = 'ns-pop'
+_CLASS_POP = 'class-pop'
 
 
-# TODO(nnorwitz): use this as a singleton for templated_types, etc
-# where we don't want to create a new empty dict each time.  It is also const.
 class _NullDict(object):
-    __contains__ = lambda self: False
+    """Empty, immutable container used as a singleton for templated_types,
+    etc where we don't want to create a new empty list or dict each time."""
+    __slots__ = ()
+
+    __contains__ = lambda self, key: False
+    __len__ = lambda self: 0
+    __iter__ = lambda self: iter(())
     keys = values = items = iterkeys = itervalues = iteritems = lambda self: ()
 
+    def __repr__(self):
+        return '{}'
+
+    def __reduce__(self):
+        # Unpickle to the module level singleton rather than a copy.
+        return '_NULL_DICT'
+
+
+_NULL_DICT = _NullDict()
+
+
+# Namespace tuples shared between all declarations in the same namespace.
+_namespaces = {}
+
+
+def _InternNamespace(namespace):
+    namespace = tuple(namespace)
+    return _namespaces.setdefault(namespace, namespace)
+
 
 # TODO(nnorwitz): move AST nodes into a separate module.
 class Node(object):
     """Base AST node."""
+    __slots__ = ('start', 'end')
 
     def __init__(self, start, end):
         self.start = start
@@ -142,6 +173,8 @@ class Node(object):
 
 
 class Define(Node):
+    __slots__ = ('name', 'definition')
+
     def __init__(self, start, end, name, definition):
         Node.__init__(self, start, end)
         self.name = name
@@ -153,6 +186,8 @@ class Define(Node):
 
 
 class Include(Node):
+    __slots__ = ('filename', 'system')
+
     def __init__(self, start, end, filename, system):
         Node.__init__(self, start, end)
         self.filename = filename
@@ -166,6 +201,8 @@ class Include(Node):
 
 
 class Goto(Node):
+    __slots__ = ('label',)
+
     def __init__(self, start, end, label):
         Node.__init__(self, start, end)
         self.label = label
@@ -175,6 +212,8 @@ class Goto(Node):
 
 
 class Expr(Node):
+    __slots__ = ('expr',)
+
     def __init__(self, start, end, expr):
         Node.__init__(self, start, end)
         self.expr = expr
@@ -188,20 +227,24 @@ class Expr(Node):
 
 
 class Return(Expr):
-    pass
+    __slots__ = ()
 
 
 class Delete(Expr):
-    pass
+    __slots__ = ()
 
 
 class Friend(Expr):
+    __slots__ = ('namespace',)
+
     def __init__(self, start, end, expr, namespace):
         Expr.__init__(self, start, end, expr)
-        self.namespace = namespace[:]
+        self.namespace = _InternNamespace(namespace)
 
 
 class Using(Node):
+    __slots__ = ('names',)
+
     def __init__(self, start, end, names):
         Node.__init__(self, start, end)
         self.names = names
@@ -211,11 +254,13 @@ class Using(Node):
 
 
 class Parameter(Node):
+    __slots__ = ('name', 'type', 'default')
+
     def __init__(self, start, end, name, parameter_type, default):
         Node.__init__(self, start, end)
         self.name = name
         self.type = parameter_type
-        self.default = default
+        self.default = default or _NULL_DICT
 
     def Requires(self, node):
         # TODO(nnorwitz): handle namespaces, etc.
@@ -230,10 +275,12 @@ class Parameter(Node):
 
 
 class _GenericDeclaration(Node):
+    __slots__ = ('name', 'namespace')
+
     def __init__(self, start, end, name, namespace):
         Node.__init__(self, start, end)
         self.name = name
-        self.namespace = namespace[:]
+        self.namespace = _InternNamespace(namespace)
 
     def FullName(self):
         prefix = ''
@@ -250,6 +297,8 @@ class _GenericDeclaration(Node):
 
 # TODO(nnorwitz): merge with Parameter in some way?
 class VariableDeclaration(_GenericDeclaration):
+    __slots__ = ('type', 'initial_value')
+
     def __init__(self, start, end, name, var_type, initial_value, namespace):
         _GenericDeclaration.__init__(self, start, end, name, namespace)
         self.type = var_type
@@ -271,6 +320,8 @@ class VariableDeclaration(_GenericDeclaration):
 
 
 class Typedef(_GenericDeclaration):
+    __slots__ = ('alias',)
+
     def __init__(self, start, end, name, alias, namespace):
         _GenericDeclaration.__init__(self, start, end, name, namespace)
         self.alias = alias
@@ -295,6 +346,8 @@ class Typedef(_GenericDeclaration):
 
 
 class _NestedType(_GenericDeclaration):
+    __slots__ = ('fields',)
+
     def __init__(self, start, end, name, fields, namespace):
         _GenericDeclaration.__init__(self, start, end, name, namespace)
         self.fields = fields
@@ -311,14 +364,16 @@ class _NestedType(_GenericDeclaration):
 
 
 class Union(_NestedType):
-    pass
+    __slots__ = ()
 
 
 class Enum(_NestedType):
-    pass
+    __slots__ = ()
 
 
 class Class(_GenericDeclaration):
+    __slots__ = ('bases', 'body', 'templated_types')
+
     def __init__(self, start, end, name, bases, templated_types, body, namespace):
         _GenericDeclaration.__init__(self, start, end, name, namespace)
         self.bases = bases
@@ -354,10 +409,13 @@ class Class(_GenericDeclaration):
 
 
 class Struct(Class):
-    pass
+    __slots__ = ()
 
 
 class Function(_GenericDeclaration):
+    __slots__ = ('return_type', 'parameters', 'modifiers', 'body',
+                 'templated_types')
+
     def __init__(self, start, end, name, return_type, parameters,
                  modifiers, templated_types, body, namespace):
         _GenericDeclaration.__init__(self, start, end, name, namespace)
@@ -397,6 +455,8 @@ class Function(_GenericDeclaration):
 
 
 class Method(Function):
+    __slots__ = ('in_class',)
+
     def __init__(self, start, end, name, in_class, return_type, parameters,
                  modifiers, templated_types, body, namespace):
         Function.__init__(self, start, end, name, return_type, parameters,
@@ -408,6 +468,8 @@ class Method(Function):
 
 class Type(_GenericDeclaration):
     """Type used for any variable (eg class, primitive, struct, etc)."""
+    __slots__ = ('templated_types', 'modifiers', 'reference', 'pointer',
+                 'array')
 
     def __init__(self, start, end, name, templated_types, modifiers,
                  reference, pointer, array):
@@ -418,8 +480,8 @@ class Type(_GenericDeclaration):
           modifiers: [str] type modifiers (keywords) eg, const, mutable, etc.
           reference, pointer, array: bools
         """
-        _GenericDeclaration.__init__(self, start, end, name, [])
-        self.templated_types = templated_types
+        _GenericDeclaration.__init__(self, start, end, name, ())
+        self.templated_types = templated_types or _NULL_DICT
         if not name and modifiers:
             self.name = modifiers.pop()
         self.modifiers = modifiers
@@ -455,6 +517,19 @@ class Type(_GenericDeclaration):
         return False
 
 
+class _TypeFrame(object):
+    """A template argument list being converted by TypeConverter.ToType()."""
+
+    __slots__ = ('end', 'result', 'name_tokens', 'reference', 'pointer',
+                 'array')
+
+    def __init__(self, end):
+        self.end = end  # Index of the closing '>' or of the end of tokens.
+        self.result = []
+        self.name_tokens = []
+        self.reference = self.pointer = self.array = False
+
+
 class TypeConverter(object):
 
     def __init__(self, namespace_stack):
@@ -479,60 +554,79 @@ class TypeConverter(object):
         For example, code like class Foo : public Bar<x, y> { ... };
         the "Bar<x, y>" portion gets converted to an AST.
 
+        Template arguments are converted with an explicit stack of
+        _TypeFrames rather than by recursion, so deeply nested templates
+        cost the same per token as flat ones.
+
         Returns:
           [Class(...), ...]
         """
-        result = []
-        name_tokens = []
-        reference = pointer = array = False
+        # Index of the '>' matching each '<'.
+        template_ends = {}
+        opened = []
+        for i, token in enumerate(tokens):
+            if token.name == '<':
+                opened.append(i)
+            elif token.name == '>' and opened:
+                template_ends[opened.pop()] = i
 
-        def AddType(templated_types):
+        def AddType(frame, templated_types):
             # Partition tokens into name and modifier tokens.
             names = []
             modifiers = []
-            for t in name_tokens:
+            for t in frame.name_tokens:
                 if keywords.IsKeyword(t.name):
                     modifiers.append(t.name)
                 else:
                     names.append(t.name)
             name = ''.join(names)
-            if name_tokens:
-                result.append(Type(name_tokens[0].start, name_tokens[-1].end,
-                                   name, templated_types, modifiers,
-                                   reference, pointer, array))
-            del name_tokens[:]
-
+            if frame.name_tokens:
+                frame.result.append(Type(frame.name_tokens[0].start,
+                                         frame.name_tokens[-1].end,
+                                         name, templated_types, modifiers,
+                                         frame.reference, frame.pointer,
+                                         frame.array))
+            del frame.name_tokens[:]
+
+        stack = []
+        frame = _TypeFrame(len(tokens))
         i = 0
-        end = len(tokens)
-        while i < end:
-            token = tokens[i]
-            if token.name == '<':
-                new_tokens, new_end = self._GetTemplateEnd(tokens, i+1)
-                AddType(self.ToType(new_tokens))
+        while 1:
+            if i >= frame.end:
+                if frame.name_tokens:
+                    # No '<' in the tokens, just a simple name and no template.
+                    AddType(frame, [])
+                if not stack:
+                    return frame.result
+                templated_types = frame.result
                 # If there is a comma after the template, we need to consume
                 # that here otherwise it becomes part of the name.
-                i = new_end
-                reference = pointer = array = False
+                i = frame.end + 2
+                frame = stack.pop()
+                AddType(frame, templated_types)
+                frame.reference = frame.pointer = frame.array = False
+                continue
+            token = tokens[i]
+            if token.name == '<':
+                if i not in template_ends:
+                    raise IndexError('no > for < at %s' % token.start)
+                stack.append(frame)
+                frame = _TypeFrame(template_ends[i])
             elif token.name == ',':
-                AddType([])
-                reference = pointer = array = False
+                AddType(frame, [])
+                frame.reference = frame.pointer = frame.array = False
             elif token.name == '*':
-                pointer = True
+                frame.pointer = True
             elif token.name == '&':
-                reference = True
+                frame.reference = True
             elif token.name == '[':
-               pointer = True
+               frame.pointer = True
             elif token.name == ']':
                 pass
             else:
-                name_tokens.append(token)
+                frame.name_tokens.append(token)
             i += 1
 
-        if name_tokens:
-            # No '<' in the tokens, just a simple name and no template.
-            AddType([])
-        return result
-
     def DeclarationToParts(self, parts, needs_name_removed):
         name = None
         default = []
@@ -673,9 +767,54 @@ class TypeConverter(object):
             end -= 1
         return start, end+1
 
+
+class ParseError(object):
+    """A declaration AstBuilder skipped after failing to parse it."""
+
+    def __init__(self, filename, line, column, token, message, in_class):
+        self.filename = filename
+        self.line = line        # 1-based, None when the source is unknown.
+        self.column = column    # 1-based, None when the source is unknown.
+        self.token = token      # Name of the first token of the declaration.
+        self.message = message
+        self.in_class = in_class
+
+    def ToDict(self):
+        return {'filename': self.filename, 'line': self.line,
+                'column': self.column, 'token': self.token,
+                'message': self.message, 'in_class': self.in_class}
+
+    def __str__(self):
+        suffix = ''
+        if self.in_class:
+            suffix = ' in class %s' % self.in_class
+        return '%s:%s:%s: %s near %r%s' % (self.filename, self.line,
+                                           self.column, self.message,
+                                           self.token, suffix)
+
+
+class _ClassFrame(object):
+    """A class whose body is being parsed by AstBuilder."""
+
+    def __init__(self, class_type, class_token, name, bases, templated_types,
+                 builder):
+        self.class_type = class_type
+        self.class_token = class_token
+        self.name = name
+        self.bases = bases
+        self.templated_types = templated_types
+        self.body = []
+        # State of the builder restored when the body is complete.
+        self.in_class = builder.in_class
+        self.in_class_name_only = builder.in_class_name_only
+        self.visibility = builder.visibility
+        self.desired_class_names = builder.desired_class_names
+
+
 class AstBuilder(object):
     def __init__(self, token_stream, filename, in_class='', visibility=None,
-                 namespace_stack=[]):
+                 namespace_stack=[], desired_class_names=None, recover=False,
+                 source=None, macros=None):
         self.tokens = token_stream
         self.filename = filename
         # TODO(nnorwitz): use a better data structure (deque) for the queue.
@@ -693,6 +832,27 @@ class AstBuilder(object):
         self.current_token = None
         # Keep the state whether we are currently handling a typedef or not.
         self._handling_typedef = False
+        # Only the bodies of these classes are parsed and Generate() stops
+        # once all of them have been produced.  None means all classes.
+        self.desired_class_names = desired_class_names
+        # Classes being parsed, innermost last.  Their bodies are parsed by
+        # this builder rather than by nested ones so that the depth of the
+        # nesting is not limited by the recursion limit.
+        self._class_frames = []
+        # Internal tokens ending the open namespaces and classes, innermost
+        # last.
+        self._scope_ends = []
+        # With recover, a declaration that cannot be parsed is added to
+        # errors and skipped instead of stopping Generate().  Recovering
+        # needs the source the tokens came from, and the macros they were
+        # tokenized with.
+        self.recover = recover
+        self.source = source
+        self.macros = macros
+        self.errors = []
+        # Tokens of the whole source and their starts, see _SourceTokens().
+        self._source_tokens = None
+        self._source_token_starts = None
 
         self.converter = TypeConverter(self.namespace_stack)
 
@@ -702,6 +862,15 @@ class AstBuilder(object):
                          (msg, self.filename, token, printable_queue))
 
     def Generate(self):
+        nodes = self._Generate()
+        if metrics.current is not None:
+            nodes = metrics.current.Count(nodes, 'parse', 'nodes')
+        return nodes
+
+    def _Generate(self):
+        remaining_class_names = None
+        if self.desired_class_names:
+            remaining_class_names = set(self.desired_class_names)
         while 1:
             token = self._GetNextToken()
             if not token:
@@ -711,18 +880,156 @@ class AstBuilder(object):
             self.current_token = token
 
             # Dispatch on the next token type.
-            if token.token_type == _INTERNAL_TOKEN:
-                if token.name == _NAMESPACE_POP:
-                    self.namespace_stack.pop()
+            try:
+                if token.token_type == _INTERNAL_TOKEN:
+                    self._scope_ends.pop()
+                    if token.name == _NAMESPACE_POP:
+                        self.namespace_stack.pop()
+                        continue
+                    assert token.name == _CLASS_POP, token
+                    result = self._FinishClass(self._class_frames[-1])
+                    self._class_frames.pop()
+                else:
+                    result = self._GenerateOne(token)
+            except MemoryError:
+                raise
+            except Exception:
+                if not self.recover:
+                    self.HandleError('exception', token)
+                    raise
+                result = self._Recover(token)
+            if result is None:
+                continue
+            if self._class_frames:
+                # Part of the body of the innermost class.
+                self._class_frames[-1].body.append(result)
+                if metrics.current is not None:
+                    metrics.current.Add('nodes', 1)
                 continue
+            yield result
+
+            if (remaining_class_names and isinstance(result, Class) and
+                result.body is not None):
+                remaining_class_names.discard(result.name)
+                if not remaining_class_names:
+                    # Every requested class was found, skip the rest.
+                    break
+
+    def _Recover(self, token):
+        """Records the error of the declaration starting at token and skips
+        the rest of it, up to the next ; or matching } in its scope.
+
+        The handler that failed may have consumed any number of tokens, so
+        the end of the declaration is found in the source and the tokens
+        it consumed after that are tokenized again.
 
+        Returns:
+          the class whose end is token, None for other declarations
+        """
+        error = sys.exc_info()[1]
+        source = self.source
+        name = token.name
+        if token.token_type == _INTERNAL_TOKEN:
+            name = '}'
+        line = source.count('\n', 0, token.start) + 1
+        column = token.start - source.rfind('\n', 0, token.start)
+        parse_error = ParseError(self.filename, line, column, name,
+                                 '%s: %s' % (error.__class__.__name__, error),
+                                 self.in_class or None)
+        self.errors.append(parse_error)
+        if metrics.current is not None:
+            metrics.current.parse_errors.append(parse_error.ToDict())
+        sys.stderr.write('Skipped declaration at %s\n' % parse_error)
+
+        # Find the end of the declaration.  When a class failed to finish,
+        # only what follows its } is skipped.
+        offset = token.start
+        if token.token_type == _INTERNAL_TOKEN:
+            offset = token.end
+        end = len(source)
+        depth = 0
+        following = iter(self._SourceTokens(offset, len(source)))
+        for t in following:
+            if t.token_type != tokenize.SYNTAX:
+                continue
+            if t.name == '{':
+                depth += 1
+            elif t.name == '}':
+                depth -= 1
+                if depth < 0:
+                    # The } ending the enclosing scope.
+                    end = t.start
+                    break
+                if depth == 0:
+                    end = t.end
+                    # Skip the ; ending a class or an initializer too.
+                    for t in following:
+                        if t.name == ';':
+                            end = t.end
+                        break
+                    break
+            elif t.name == ';' and depth == 0:
+                end = t.end
+                break
+        # Always skip the token that failed.
+        end = max(end, token.end)
+
+        # Drop the rest of the declaration from the pending tokens.
+        while 1:
+            t = self._GetNextToken()
+            if t is None:
+                resume = len(source)
+                break
+            if t.token_type == _INTERNAL_TOKEN or t.start >= end:
+                self._AddBackToken(t)
+                resume = t.start
+                break
+
+        # Put back what was consumed after the declaration, replacing the
+        # } of the scopes that end there with their internal tokens.
+        if end < resume:
+            scope_ends = dict([(t.start, t) for t in self._scope_ends])
+            tokens = []
+            for t in self._SourceTokens(end, resume):
+                if t.name == '}':
+                    t = scope_ends.get(t.start, t)
+                t.whence = tokenize.WHENCE_QUEUE
+                tokens.append(t)
+            self.token_queue.extend(reversed(tokens))
+
+        if token.token_type != _INTERNAL_TOKEN:
+            return None
+        # Only what follows the body of the class was skipped.
+        frame = self._class_frames.pop()
+        class_token = frame.class_token
+        return frame.class_type(class_token.start, class_token.end,
+                                frame.name, frame.bases, frame.templated_types,
+                                frame.body, self.namespace_stack)
+
+    def _SourceTokens(self, start, end):
+        """Returns new tokens of the source from start up to end.
+
+        The whole source is tokenized once, on the first error, with the
+        macros of the builder: a part of it tokenized on its own would lose
+        the conditionals it is in.  The tokens stop at a character the
+        tokenizer cannot handle, as parsing does.
+        """
+        if self._source_tokens is None:
+            self._source_tokens = []
             try:
-                result = self._GenerateOne(token)
-                if result is not None:
-                    yield result
-            except:
-                self.HandleError('exception', token)
-                raise
+                for t in tokenize.GetTokens(self.source, self.macros):
+                    self._source_tokens.append(t)
+            except tokenize.TokenizeError:
+                pass
+            self._source_token_starts = [t.start for t in self._source_tokens]
+        first = bisect.bisect_left(self._source_token_starts, start)
+        last = bisect.bisect_left(self._source_token_starts, end)
+        return [tokenize.Token(t.token_type, t.name, t.start, t.end)
+                for t in self._source_tokens[first:last]]
+
+    def _IsClassBodyWanted(self, class_name):
+        return (not self.desired_class_names or
+                class_name in self.desired_class_names)
 
     def _CreateVariable(self, pos_token, name, type_name, type_modifiers,
                         ref_pointer_name_seq, templated_types, value=None):
@@ -905,7 +1212,10 @@ class AstBuilder(object):
     def _GetNextToken(self):
         if self.token_queue:
             return self.token_queue.pop()
-        return next(self.tokens)
+        try:
+            return next(self.tokens)
+        except StopIteration:
+            return None
 
     def _AddBackToken(self, token):
         if token.whence == tokenize.WHENCE_STREAM:
@@ -1535,9 +1845,19 @@ class AstBuilder(object):
             assert token.token_type == tokenize.SYNTAX, token
             assert token.name == '{', token
 
-            ast = AstBuilder(self.GetScope(), self.filename, class_name,
-                             visibility, self.namespace_stack)
-            body = list(ast.Generate())
+            if self._IsClassBodyWanted(class_name):
+                if not self._handling_typedef:
+                    self._BeginClass(class_type, class_token, class_name,
+                                     bases, templated_types, visibility)
+                    return None
+                ast = AstBuilder(self.GetScope(), self.filename, class_name,
+                                 visibility, self.namespace_stack)
+                body = list(ast.Generate())
+            else:
+                # Consume the body without building an AST for it.
+                for unused_token in self.GetScope():
+                    pass
+                body = []
 
             if not self._handling_typedef:
                 token = self._GetNextToken()
@@ -1561,6 +1881,55 @@ class AstBuilder(object):
         return class_type(class_token.start, class_token.end, class_name,
                           bases, templated_types, body, self.namespace_stack)
 
+    def _BeginClass(self, class_type, class_token, class_name, bases,
+                    templated_types, visibility):
+        """Makes _Generate() parse the body of a class as part of it.
+
+        The class is returned by _FinishClass() when the internal token
+        replacing its closing } is reached.
+        """
+        tokens = list(self.GetScope())
+        # Replace the trailing } with the internal class pop token.
+        internal_token = tokenize.Token(_INTERNAL_TOKEN, _CLASS_POP,
+                                        tokens[-1].start, tokens[-1].end)
+        internal_token.whence = tokens[-1].whence
+        tokens[-1] = internal_token
+        self._AddBackTokens(tokens)
+        self._scope_ends.append(internal_token)
+        self._class_frames.append(_ClassFrame(class_type, class_token,
+                                              class_name, bases,
+                                              templated_types, self))
+        self.in_class = class_name
+        if class_name is None:
+            self.in_class_name_only = None
+        else:
+            self.in_class_name_only = class_name.split('::')[-1]
+        self.visibility = visibility
+        # Nested classes are always needed by their enclosing class.
+        self.desired_class_names = None
+
+    def _FinishClass(self, frame):
+        self.in_class = frame.in_class
+        self.in_class_name_only = frame.in_class_name_only
+        self.visibility = frame.visibility
+        self.desired_class_names = frame.desired_class_names
+
+        class_token = frame.class_token
+        token = self._GetNextToken()
+        if token.token_type != tokenize.NAME:
+            assert token.token_type == tokenize.SYNTAX, token
+            assert token.name == ';', token
+        else:
+            new_class = frame.class_type(class_token.start, class_token.end,
+                                         frame.name, frame.bases, None,
+                                         frame.body, self.namespace_stack)
+            modifiers = []
+            return self._CreateVariable(class_token, token.name, new_class,
+                                        modifiers, token.name, None)
+        return frame.class_type(class_token.start, class_token.end,
+                                frame.name, frame.bases, frame.templated_types,
+                                frame.body, self.namespace_stack)
+
     def handle_namespace(self):
         token = self._GetNextToken()
         # Support anonymous namespaces.
@@ -1568,24 +1937,25 @@ class AstBuilder(object):
         if token.token_type == tokenize.NAME:
             name = token.name
             token = self._GetNextToken()
-        self.namespace_stack.append(name)
         assert token.token_type == tokenize.SYNTAX, token
-        # Create an internal token that denotes when the namespace is complete.
-        internal_token = tokenize.Token(_INTERNAL_TOKEN, _NAMESPACE_POP,
-                                        None, None)
-        internal_token.whence = token.whence
         if token.name == '=':
             # TODO(nnorwitz): handle aliasing namespaces.
-            name, next_token = self.GetName()
+            unused_alias, next_token = self.GetName()
             assert next_token.name == ';', next_token
-            self._AddBackToken(internal_token)
-        else:
-            assert token.name == '{', token
-            tokens = list(self.GetScope())
-            # Replace the trailing } with the internal namespace pop token.
-            tokens[-1] = internal_token
-            # Handle namespace with nothing in it.
-            self._AddBackTokens(tokens)
+            return None
+        assert token.name == '{', token
+        tokens = list(self.GetScope())
+        # Replace the trailing } with an internal token that denotes when
+        # the namespace is complete.
+        internal_token = tokenize.Token(_INTERNAL_TOKEN, _NAMESPACE_POP,
+                                        tokens[-1].start, tokens[-1].end)
+        internal_token.whence = tokens[-1].whence
+        tokens[-1] = internal_token
+        # The namespace is only entered once it was parsed without errors.
+        self.namespace_stack.append(name)
+        # Handle namespace with nothing in it.
+        self._AddBackTokens(tokens)
+        self._scope_ends.append(internal_token)
         return None
 
     def handle_using(self):
@@ -1663,17 +2033,129 @@ class AstBuilder(object):
         self._IgnoreUpTo(tokenize.SYNTAX, ';')
 
 
-def BuilderFromSource(source, filename):
+def BuilderFromSource(source, filename, desired_class_names=None,
+                      recover=False, macros=None):
     """Utility method that returns an AstBuilder from source code.
 
     Args:
       source: 'C++ source code'
       filename: 'file1'
+      desired_class_names: set(['Class1', ...]) or None for all classes
+      recover: skip declarations that cannot be parsed, see AstBuilder
+      macros: {name: value or None} deciding conditionals, see
+              tokenize.GetTokens()
 
     Returns:
       AstBuilder
     """
-    return AstBuilder(tokenize.GetTokens(source), filename)
+    return AstBuilder(tokenize.GetTokens(source, macros), filename,
+                      desired_class_names=desired_class_names,
+                      recover=recover, source=source, macros=macros)
+
+
+_parser_version = None
+
+
+def ParserVersion():
+    """Returns a digest of the parser sources, used to invalidate caches."""
+    global _parser_version
+    if _parser_version is None:
+        _parser_version = disk_cache.ModulesKey(keywords, tokenize,
+                                                sys.modules[__name__])
+    return _parser_version
+
+
+def AstCache():
+    """Returns the DiskCache used to persist parsed files between runs.
+
+    Its entries are pickles, so it is private to the user even when the
+    cache directory is shared.
+    """
+    return disk_cache.DiskCache(disk_cache.PrivateDirectory('ast'),
+                                disk_cache.DefaultMaxBytes(), private=True)
+
+
+def GenerateSource(source, filename, desired_class_names=None, cache=None,
+                   errors=None, macros=None):
+    """Yields the top-level nodes for source code as they are parsed.
+
+    Args:
+      source: 'C++ source code'
+      filename: 'file1'
+      desired_class_names: set(['Class1', ...]) or None for all classes
+      cache: DiskCache holding previously parsed sources or None
+      errors: list that a ParseError is appended to for every declaration
+              that cannot be parsed, which is then skipped; None to raise
+              on the first one
+      macros: {name: value or None} of the macros known to be (un)defined,
+              whose conditionals are then evaluated; None to keep every
+              branch but those of #if 0
+
+    Yields:
+      Node
+    """
+    key = None
+    if cache is not None:
+        key = disk_cache.HashKey(ParserVersion(), source,
+                                 ' '.join(sorted(desired_class_names or ())),
+                                 repr(_SortedMacros(macros)))
+        nodes = None
+        with metrics.Phase('parse'):
+            data = cache.Get(key)
+            if data is not None:
+                try:
+                    nodes = pickle.loads(data)
+                except Exception:
+                    pass  # Corrupt or stale entry, parse it again.
+        if nodes is not None:
+            if metrics.current is not None:
+                metrics.current.cached = True
+                metrics.current.Add('nodes', _CountNodes(nodes))
+            for node in nodes:
+                yield node
+            return
+
+    builder = BuilderFromSource(source, filename, desired_class_names,
+                                errors is not None, macros)
+    nodes = []
+    for node in builder.Generate():
+        if node:
+            nodes.append(node)
+            yield node
+    if builder.errors:
+        errors.extend(builder.errors)
+    elif cache is not None:
+        # Partial results are not cached, they could hide the errors.
+        with metrics.Phase('parse'):
+            cache.Put(key, pickle.dumps(nodes, pickle.HIGHEST_PROTOCOL))
+
+
+def _SortedMacros(macros):
+    if macros is None:
+        return None
+    return sorted(macros.items(), key=lambda item: item[0])
+
+
+def _CountNodes(nodes):
+    # The nodes AstBuilder.Generate() produces, those of class bodies too.
+    count = 0
+    pending = list(nodes)
+    while pending:
+        node = pending.pop()
+        count += 1
+        if isinstance(node, Class) and node.body:
+            pending.extend(node.body)
+    return count
+
+
+def ParseSource(source, filename, desired_class_names=None, cache=None,
+                errors=None, macros=None):
+    """Returns the list of top-level nodes for source code.
+
+    See GenerateSource() for the arguments.
+    """
+    return list(GenerateSource(source, filename, desired_class_names, cache,
+                               errors, macros))
 
 
 def PrintIndentifiers(filename, should_print):
@@ -1712,15 +2194,34 @@ def PrintAllIndentifiers(filenames, should_print):
 
 
 def main(argv):
-    for filename in argv[1:]:
+    filenames = argv[1:]
+    cache = AstCache()
+    if '--no-cache' in filenames:
+        filenames = [f for f in filenames if f != '--no-cache']
+        cache = None
+    profile = None
+    for arg in filenames:
+        if arg == '--profile':
+            profile = profiling.DefaultPath(argv[0])
+        elif arg.startswith('--profile='):
+            profile = arg[len('--profile='):]
+    filenames = [f for f in filenames if not f.startswith('--profile')]
+
+    if profile:
+        profiling.Profile(lambda: _PrintAsts(filenames, cache), profile)
+    else:
+        _PrintAsts(filenames, cache)
+
+
+def _PrintAsts(filenames, cache):
+    for filename in filenames:
         source = utils.ReadFile(filename)
         if source is None:
             continue
 
         print('Processing %s' % filename)
-        builder = BuilderFromSource(source, filename)
         try:
-            entire_ast = filter(None, builder.Generate())
+            entire_ast = ParseSource(source, filename, cache=cache)
         except KeyboardInterrupt:
             return
         except:
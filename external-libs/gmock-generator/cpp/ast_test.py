@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for cpp.ast."""
+
+
+import os
+import sys
+import unittest
+
+# Allow the cpp imports below to work when run as a standalone script.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from cpp import ast
+
+
+def _Parse(source):
+    return list(ast.BuilderFromSource(source, '<test>').Generate())
+
+
+class NodeLayoutTest(unittest.TestCase):
+
+    def testNodesHaveNoInstanceDict(self):
+        nodes = _Parse('class Foo { virtual int Bar(int x); };')
+        method = nodes[0].body[0]
+        for node in (nodes[0], method, method.return_type,
+                     method.parameters[0]):
+            self.assertFalse(hasattr(node, '__dict__'), node)
+
+    def testNamespacesAreShared(self):
+        nodes = _Parse('namespace a { namespace b { class Foo {}; } '
+                       'class Bar {}; namespace b { class Baz {}; } }')
+        foo, bar, baz = nodes
+        self.assertEqual(('a', 'b'), foo.namespace)
+        self.assertEqual(('a',), bar.namespace)
+        self.assertIs(foo.namespace, baz.namespace)
+
+    def testEmptyTemplatedTypesAreShared(self):
+        nodes = _Parse('class Foo { virtual int Bar(Baz x); };')
+        method = nodes[0].body[0]
+        self.assertIs(ast._NULL_DICT, method.return_type.templated_types)
+        self.assertIs(ast._NULL_DICT,
+                      method.parameters[0].type.templated_types)
+        self.assertEqual([], list(method.return_type.templated_types))
+
+
+
+class DeepNestingTest(unittest.TestCase):
+
+    # Deeper than the recursion limit allows with a frame per level.
+    DEPTH = sys.getrecursionlimit()
+
+    def testNestedClasses(self):
+        source = ''.join(['class C%d { public: virtual int F%d() = 0;\n' %
+                          (i, i) for i in range(self.DEPTH)])
+        source += '};\n' * self.DEPTH + 'class After {};'
+        nodes = _Parse(source)
+        self.assertEqual(['C0', 'After'], [node.name for node in nodes])
+        node = nodes[0]
+        for i in range(1, self.DEPTH):
+            method, node = node.body
+            self.assertEqual('F%d' % (i - 1), method.name)
+            self.assertEqual('C%d' % i, node.name)
+        self.assertEqual(['F%d' % (self.DEPTH - 1)],
+                         [method.name for method in node.body])
+
+    def testNestedTemplateArguments(self):
+        argument = 'int'
+        for unused_depth in range(self.DEPTH):
+            argument = 'std::vector<%s>' % argument
+        nodes = _Parse('class Foo { virtual void Bar(const %s& x); };' %
+                       argument)
+        parameter_type = nodes[0].body[0].parameters[0].type
+        for unused_depth in range(self.DEPTH):
+            self.assertEqual('std::vector', parameter_type.name)
+            parameter_type, = parameter_type.templated_types
+        self.assertEqual('int', parameter_type.name)
+
+
+
+class RecoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stderr = sys.stderr
+        sys.stderr = open(os.devnull, 'w')
+
+    def tearDown(self):
+        sys.stderr.close()
+        sys.stderr = self.stderr
+
+    def Parse(self, source):
+        errors = []
+        nodes = ast.ParseSource(source, 'x.h', errors=errors)
+        return nodes, errors
+
+    def Members(self, nodes):
+        return [(node.name, [member.name for member in node.body])
+                for node in nodes]
+
+    def testWithoutErrorsListRaises(self):
+        self.assertRaises(AttributeError, ast.ParseSource,
+                          'class A { bool Broken(; };', 'x.h')
+
+    def testSkipsToNextSemicolon(self):
+        nodes, errors = self.Parse('class A {\n  virtual int F() = 0;\n'
+                                   '  bool Broken(; int y;\n'
+                                   '  virtual void G() = 0;\n};\n'
+                                   'class B {};')
+        self.assertEqual([('A', ['F', 'y', 'G']), ('B', [])],
+                         self.Members(nodes))
+        error, = errors
+        self.assertEqual(('x.h', 3, 3, 'bool', 'A'),
+                         (error.filename, error.line, error.column,
+                          error.token, error.in_class))
+        self.assertTrue(error.message.startswith('AttributeError: '),
+                        error.message)
+
+    def testSkipsToMatchingBrace(self):
+        nodes, errors = self.Parse('class : { int x; };\n'
+                                   'class B { virtual void G(); };')
+        self.assertEqual([('B', ['G'])], self.Members(nodes))
+        self.assertEqual([(1, 'class')],
+                         [(error.line, error.token) for error in errors])
+
+    def testDeclarationRunningPastEndOfClass(self):
+        nodes, errors = self.Parse(
+            'namespace n {\nclass A { virtual int F() = 0 };\n'
+            'class B { virtual void G(); };\n}\nclass C {};')
+        self.assertEqual([('A', []), ('B', ['G']), ('C', [])],
+                         self.Members(nodes))
+        self.assertEqual([('n',), ('n',), ()],
+                         [node.namespace for node in nodes])
+        self.assertEqual([(2, 'A')],
+                         [(error.line, error.in_class) for error in errors])
+
+    def testClassIsKeptWhenItsDeclaratorFails(self):
+        nodes, errors = self.Parse('class A { int x; } *p;\nclass B {};')
+        self.assertEqual([('A', ['x']), ('B', [])], self.Members(nodes))
+        self.assertEqual(['}'], [error.token for error in errors])
+
+    def testInactiveBranchesStaySkipped(self):
+        macros = {'NEVER': None}
+        errors = []
+        nodes = ast.ParseSource('class A {\n  bool Broken(;\n#if NEVER\n'
+                                '  virtual void Hidden();\n#else\n'
+                                '  virtual void G();\n#endif\n};',
+                                'x.h', errors=errors, macros=macros)
+        self.assertEqual([('A', ['G'])], self.Members(nodes))
+        self.assertEqual([(2, 'bool')],
+                         [(error.line, error.token) for error in errors])
+        # The directives before the error decide the branches after it.
+        errors = []
+        nodes = ast.ParseSource('#if NEVER\n#else\n'
+                                'class A { bool Broken(; virtual void G(); };\n'
+                                '#endif\n#if NEVER\nclass Hidden {};\n#endif\n'
+                                'class B {};', 'x.h', errors=errors,
+                                macros=macros)
+        self.assertEqual([('A', ['G']), ('B', [])], self.Members(nodes))
+        self.assertEqual(1, len(errors))
+
+
+if __name__ == '__main__':
+    unittest.main()
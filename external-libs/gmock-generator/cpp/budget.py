@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Wall time and memory budgets of one header, for --timeout and
+--memory-limit.
+
+The time budget is an interval timer whose SIGALRM handler raises
+BudgetExceeded in whatever code is running, for example the tokenizer
+scanning for the end of an unterminated string.  The memory budget lowers
+the address space limit (RLIMIT_AS) of the process to its current size
+plus the budget, so that allocating more raises MemoryError, which is
+turned into BudgetExceeded too.
+
+Budgets need the main thread of a process on a POSIX system.  Where
+/proc/self/statm is missing, the memory budget limits the whole process.
+"""
+
+
+import signal
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class BudgetExceeded(BaseException):
+    """Raised when a header takes more time or memory than its budget.
+
+    It is not an Exception so that the error handling of the parser
+    does not take it for a parse error.
+    """
+
+
+def Supported():
+    """Returns True if budgets can be enforced on this system."""
+    return resource is not None and hasattr(signal, 'setitimer')
+
+
+def _AddressSpace():
+    """Returns the bytes of address space in use, 0 if unknown."""
+    try:
+        fp = open('/proc/self/statm')
+    except IOError:
+        return 0
+    try:
+        pages = int(fp.read().split()[0])
+    finally:
+        fp.close()
+    return pages * resource.getpagesize()
+
+
+class Budget(object):
+    """Context manager enforcing the budgets of one header.
+
+    Args:
+      seconds: wall time allowed or None
+      memory_bytes: address space the process may grow by or None
+    """
+
+    def __init__(self, seconds=None, memory_bytes=None):
+        self.seconds = seconds
+        self.memory_bytes = memory_bytes
+        self._handler = None
+        self._limits = None
+
+    def _OnAlarm(self, unused_signum, unused_frame):
+        raise BudgetExceeded('exceeded the time budget of %gs' % self.seconds)
+
+    def __enter__(self):
+        if self.memory_bytes:
+            self._limits = resource.getrlimit(resource.RLIMIT_AS)
+            soft, hard = self._limits
+            limit = _AddressSpace() + self.memory_bytes
+            if hard != resource.RLIM_INFINITY:
+                limit = min(limit, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+        if self.seconds:
+            self._handler = signal.signal(signal.SIGALRM, self._OnAlarm)
+            signal.setitimer(signal.ITIMER_REAL, self.seconds)
+        return self
+
+    def __exit__(self, exc_type, unused_value, unused_traceback):
+        if self.seconds:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self._handler)
+        if self._limits is not None:
+            resource.setrlimit(resource.RLIMIT_AS, self._limits)
+            self._limits = None
+        if exc_type is not None and issubclass(exc_type, MemoryError):
+            if self.memory_bytes:
+                raise BudgetExceeded('exceeded the memory budget of %d MiB' %
+                                     (self.memory_bytes // 1048576))
+        return False
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for cpp.budget."""
+
+
+import os
+import signal
+import sys
+import unittest
+
+# Allow the cpp imports below to work when run as a standalone script.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from cpp import budget
+
+
+@unittest.skipUnless(budget.Supported(), 'budgets are not supported')
+class BudgetTest(unittest.TestCase):
+
+    def testTimeBudget(self):
+        handler = signal.getsignal(signal.SIGALRM)
+        try:
+            with budget.Budget(seconds=0.05):
+                while 1:
+                    pass
+        except budget.BudgetExceeded as e:
+            self.assertEqual('exceeded the time budget of 0.05s', str(e))
+        self.assertEqual((0.0, 0.0), signal.getitimer(signal.ITIMER_REAL))
+        self.assertEqual(handler, signal.getsignal(signal.SIGALRM))
+
+    def testTimeBudgetIsNotAnException(self):
+        def Run():
+            with budget.Budget(seconds=0.05):
+                while 1:
+                    try:
+                        pass
+                    except Exception:
+                        pass
+        self.assertRaises(budget.BudgetExceeded, Run)
+
+    def testMemoryBudget(self):
+        limits = budget.resource.getrlimit(budget.resource.RLIMIT_AS)
+        def Run():
+            with budget.Budget(memory_bytes=64 * 1048576):
+                return bytearray(1024 * 1048576)
+        self.assertRaises(budget.BudgetExceeded, Run)
+        self.assertEqual(limits,
+                         budget.resource.getrlimit(budget.resource.RLIMIT_AS))
+        # The limit is lifted again.
+        self.assertEqual(1024 * 1048576, len(bytearray(1024 * 1048576)))
+
+    def testWithinBudget(self):
+        with budget.Budget(seconds=10, memory_bytes=64 * 1048576):
+            data = bytearray(1048576)
+        self.assertEqual(1048576, len(data))
+
+
+if __name__ == '__main__':
+    unittest.main()
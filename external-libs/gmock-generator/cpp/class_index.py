@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Persistent SQLite index of the classes declared in a source tree.
+
+The index records every class definition with its namespace, bases and
+virtual method signatures, so a class can be found by name without
+parsing any header.  A nested class is recorded with the classes around
+it in its namespace, e.g. ns::Outer for ns::Outer::Inner.  Declarations
+that cannot be parsed are skipped, and the classes around them indexed.  Updating it only re-parses files whose mtime or
+size changed and whose content hash differs from the indexed one.
+
+Index files are marked with their own SQLite application_id.  Only a
+file so marked, or an empty one, is ever rebuilt; any other file given
+as an index is left alone and raises IndexFileError.
+
+Usage:
+  python -m cpp.class_index index.sqlite source-dir...        (update)
+  python -m cpp.class_index --find index.sqlite ClassName...  (query)
+"""
+
+
+import os
+import sqlite3
+import sys
+
+from cpp import ast
+from cpp import disk_cache
+from cpp import headers
+from cpp import tokenize
+from cpp import utils
+
+
+# Bump when the schema or the stored data changes.
+_SCHEMA_VERSION = 2
+
+# The application_id of index files, "CPIX".
+_APPLICATION_ID = 0x43504958
+
+# The tables of _SCHEMA, those referenced by others last.
+_TABLES = ('methods', 'bases', 'classes', 'files')
+
+_SCHEMA = """
+CREATE TABLE files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE TABLE classes (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    namespace TEXT NOT NULL,
+    start INTEGER NOT NULL
+);
+CREATE INDEX classes_by_name ON classes(name);
+CREATE INDEX classes_by_path ON classes(path);
+CREATE TABLE bases (
+    class_id INTEGER NOT NULL REFERENCES classes(id) ON DELETE CASCADE,
+    name TEXT NOT NULL
+);
+CREATE INDEX bases_by_class ON bases(class_id);
+CREATE TABLE methods (
+    class_id INTEGER NOT NULL REFERENCES classes(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    modifiers INTEGER NOT NULL
+);
+CREATE INDEX methods_by_class ON methods(class_id);
+"""
+
+
+def _TypeText(node_type):
+    if node_type is None:
+        return 'void'
+    text = node_type.name
+    if node_type.modifiers:
+        text = ' '.join(node_type.modifiers) + ' ' + text
+    if node_type.templated_types:
+        text += '<%s>' % ', '.join([_TypeText(t)
+                                    for t in node_type.templated_types])
+    if node_type.pointer:
+        text += '*'
+    if node_type.reference:
+        text += '&'
+    return text
+
+
+def MethodSignature(source, node):
+    """Returns the C++ text of a method declaration, without 'virtual'."""
+    parameters = ''
+    if node.parameters:
+        parameters = source[node.parameters[0].start:node.parameters[-1].end]
+        parameters = ' '.join(parameters.split())
+    signature = '%s %s(%s)' % (_TypeText(node.return_type), node.name,
+                               parameters)
+    if node.modifiers & ast.FUNCTION_CONST:
+        signature += ' const'
+    if node.modifiers & ast.FUNCTION_PURE_VIRTUAL:
+        signature += ' = 0'
+    return signature
+
+
+class ClassInfo(object):
+    """A class definition found in the index."""
+
+    def __init__(self, path, name, namespace, bases, methods):
+        self.path = path
+        self.name = name
+        self.namespace = namespace
+        self.bases = bases
+        self.methods = methods
+
+    def FullName(self):
+        return '::'.join(list(self.namespace) + [self.name])
+
+    def __repr__(self):
+        return 'ClassInfo(%s in %s)' % (self.FullName(), self.path)
+
+
+class IndexFileError(Exception):
+    """Raised on a file that is not a class index this version can use."""
+
+
+class ClassIndex(object):
+    """Class definitions of a source tree, stored in a SQLite file."""
+
+    def __init__(self, filename, create=False):
+        """
+        Args:
+          filename: the SQLite file of the index
+          create: whether to create the index when filename does not
+                  exist, rather than raise IndexFileError
+        """
+        self.filename = filename
+        if not create and not os.path.exists(filename):
+            raise IndexFileError('%s: no such class index' % filename)
+        self._db = sqlite3.connect(filename)
+        try:
+            self._Open()
+        except:
+            self._db.close()
+            raise
+
+    def _Open(self):
+        db = self._db
+        try:
+            application_id = db.execute('PRAGMA application_id').fetchone()[0]
+            version = db.execute('PRAGMA user_version').fetchone()[0]
+            tables = set([table for (table,) in db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")])
+        except sqlite3.DatabaseError as error:
+            raise IndexFileError('%s: %s' % (self.filename, error))
+        if application_id != _APPLICATION_ID:
+            # An empty file, or an index written before it was marked.
+            if application_id != 0 or not tables <= set(_TABLES):
+                raise IndexFileError('%s: not a class index' % self.filename)
+        if version > _SCHEMA_VERSION:
+            raise IndexFileError('%s: written by a newer version of the '
+                                 'class index' % self.filename)
+        db.execute('PRAGMA foreign_keys = ON')
+        if version != _SCHEMA_VERSION or tables != set(_TABLES):
+            self._CreateSchema()
+        elif application_id != _APPLICATION_ID:
+            db.execute('PRAGMA application_id = %d' % _APPLICATION_ID)
+            db.commit()
+
+    def _CreateSchema(self):
+        db = self._db
+        for table in _TABLES:
+            db.execute('DROP TABLE IF EXISTS %s' % table)
+        db.executescript(_SCHEMA)
+        db.execute('PRAGMA application_id = %d' % _APPLICATION_ID)
+        db.execute('PRAGMA user_version = %d' % _SCHEMA_VERSION)
+        db.commit()
+
+    def Close(self):
+        self._db.close()
+
+    def Update(self, roots, extensions=utils.HEADER_EXTENSIONS):
+        """Brings the index up to date with the headers under roots.
+
+        Returns:
+          (number of files parsed, number of files removed)
+        """
+        db = self._db
+        known = {}
+        for path, mtime, size, digest in db.execute(
+                'SELECT path, mtime, size, hash FROM files'):
+            known[path] = (mtime, size, digest)
+        parsed = 0
+        seen = set()
+        with db:
+            for root in roots:
+                root = os.path.abspath(root)
+                for path in utils.FindHeaders([root], extensions):
+                    seen.add(path)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    old = known.get(path)
+                    if old and old[:2] == (stat.st_mtime, stat.st_size):
+                        continue
+                    source = utils.ReadFile(path, False)
+                    if source is None:
+                        continue
+                    digest = disk_cache.HashKey(source)
+                    if old and old[2] == digest:
+                        db.execute('UPDATE files SET mtime = ?, size = ? '
+                                   'WHERE path = ?',
+                                   (stat.st_mtime, stat.st_size, path))
+                        continue
+                    self._IndexFile(path, source, stat, digest)
+                    parsed += 1
+            removed = [path for path in known if path not in seen and
+                       _IsUnder(path, roots)]
+            db.executemany('DELETE FROM files WHERE path = ?',
+                           [(path,) for path in removed])
+        return parsed, len(removed)
+
+    def _IndexFile(self, path, source, stat, digest):
+        db = self._db
+        db.execute('DELETE FROM files WHERE path = ?', (path,))
+        db.execute('INSERT INTO files VALUES (?, ?, ?, ?)',
+                   (path, stat.st_mtime, stat.st_size, digest))
+        # Declarations that cannot be parsed are reported and skipped.
+        nodes = []
+        try:
+            for node in ast.GenerateSource(source, path, errors=[]):
+                nodes.append(node)
+        except tokenize.TokenizeError as error:
+            # Parsing stops there; the file row is kept so that it is not
+            # parsed again until it changes.
+            sys.stderr.write('Indexed %s up to: %s\n' % (path, error))
+        # (node, namespace) left to index, nested classes included.
+        stack = [(node, [n or '' for n in node.namespace])
+                 for node in reversed(nodes)]
+        while stack:
+            node, namespace = stack.pop()
+            if not isinstance(node, ast.Class) or node.body is None:
+                continue
+            cursor = db.execute(
+                'INSERT INTO classes (path, name, namespace, start) '
+                'VALUES (?, ?, ?, ?)',
+                (path, node.name or '', '::'.join(namespace), node.start))
+            class_id = cursor.lastrowid
+            db.executemany('INSERT INTO bases VALUES (?, ?)',
+                           [(class_id, base.name)
+                            for base in node.bases or ()])
+            db.executemany('INSERT INTO methods VALUES (?, ?, ?, ?)',
+                           [(class_id, m.name, MethodSignature(source, m),
+                             m.modifiers)
+                            for m in node.body if headers.IsVirtualMethod(m)])
+            enclosing = namespace + [node.name or '']
+            stack.extend([(member, enclosing)
+                          for member in reversed(node.body)])
+
+    def FindClasses(self, name):
+        """Returns [ClassInfo, ...] for the classes called name.
+
+        name may be qualified with its namespace and the classes around
+        it, e.g. 'ns::Foo' or 'Outer::Inner'.
+        """
+        parts = [part for part in name.split('::') if part]
+        if not parts:
+            return []
+        namespace = '::'.join(parts[:-1])
+        result = []
+        rows = self._db.execute(
+            'SELECT id, path, name, namespace FROM classes WHERE name = ? '
+            'ORDER BY path, start', (parts[-1],)).fetchall()
+        for class_id, path, class_name, class_namespace in rows:
+            if namespace and not ('::' + class_namespace).endswith(
+                    '::' + namespace):
+                continue
+            bases = [base for (base,) in self._db.execute(
+                'SELECT name FROM bases WHERE class_id = ?', (class_id,))]
+            methods = [signature for (signature,) in self._db.execute(
+                'SELECT signature FROM methods WHERE class_id = ?',
+                (class_id,))]
+            class_namespace = class_namespace and class_namespace.split('::')
+            result.append(ClassInfo(path, class_name, class_namespace or [],
+                                    bases, methods))
+        return result
+
+    def FindHeader(self, name):
+        """Returns the path of the header defining name or None."""
+        classes = self.FindClasses(name)
+        if not classes:
+            return None
+        return classes[0].path
+
+
+def _IsUnder(path, roots):
+    for root in roots:
+        root = os.path.abspath(root)
+        if path == root or path.startswith(os.path.join(root, '')):
+            return True
+    return False
+
+
+def main(argv=sys.argv):
+    if len(argv) < 3:
+        sys.stderr.write(__doc__)
+        return 1
+    try:
+        if argv[1] == '--find':
+            index = ClassIndex(argv[2])
+        else:
+            index = ClassIndex(argv[1], create=True)
+    except IndexFileError as error:
+        sys.stderr.write('%s\n' % error)
+        return 1
+    if argv[1] == '--find':
+        for name in argv[3:]:
+            for info in index.FindClasses(name):
+                print('%s: %s' % (info.path, info.FullName()))
+                for base in info.bases:
+                    print('  : %s' % base)
+                for method in info.methods:
+                    print('  virtual %s;' % method)
+        index.Close()
+        return 0
+    parsed, removed = index.Update(argv[2:])
+    index.Close()
+    print('Indexed %d file(s), removed %d file(s)' % (parsed, removed))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
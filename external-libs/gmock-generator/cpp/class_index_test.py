@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for cpp.class_index."""
+
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+# Allow the cpp imports below to work when run as a standalone script.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from cpp import class_index
+
+
+class ClassIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.index = class_index.ClassIndex(os.path.join(self.root, 'db'),
+                                            create=True)
+
+    def tearDown(self):
+        self.index.Close()
+        shutil.rmtree(self.root)
+
+    def WriteHeader(self, filename, source, mtime=None):
+        path = os.path.join(self.root, filename)
+        with open(path, 'w') as fp:
+            fp.write(source)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def testFindClass(self):
+        path = self.WriteHeader('IFoo.h', """
+namespace app {
+class IFoo : public IBase {
+ public:
+  virtual ~IFoo() {}
+  virtual int Bar(const std::string& s) const = 0;
+  void NotVirtual();
+};
+}  // namespace app
+""")
+        self.assertEqual((1, 0), self.index.Update([self.root]))
+        info, = self.index.FindClasses('app::IFoo')
+        self.assertEqual(path, info.path)
+        self.assertEqual('app::IFoo', info.FullName())
+        self.assertEqual(['IBase'], info.bases)
+        self.assertEqual(['int Bar(const std::string& s) const = 0'],
+                         info.methods)
+        self.assertEqual([], self.index.FindClasses('other::IFoo'))
+        self.assertEqual(path, self.index.FindHeader('IFoo'))
+
+    def testNestedClasses(self):
+        self.WriteHeader('Outer.h', """
+namespace app {
+class Outer {
+ public:
+  class Inner : public IBase {
+    virtual void F() = 0;
+    struct Deepest {};
+  };
+  virtual void G() = 0;
+};
+}  // namespace app
+""")
+        self.index.Update([self.root])
+        info, = self.index.FindClasses('Outer::Inner')
+        self.assertEqual('app::Outer::Inner', info.FullName())
+        self.assertEqual(['IBase'], info.bases)
+        self.assertEqual(['void F() = 0'], info.methods)
+        self.assertEqual(['app::Outer::Inner::Deepest'],
+                         [info.FullName()
+                          for info in self.index.FindClasses('Deepest')])
+        self.assertEqual(['void G() = 0'],
+                         self.index.FindClasses('app::Outer')[0].methods)
+
+    def testSkipsWhatCannotBeParsed(self):
+        self.WriteHeader('Mixed.h', 'class A {\n virtual void F();\n'
+                         ' bool Broken(;\n};\nclass B : { };\n'
+                         'class C { virtual int G() const; };\n')
+        stderr = sys.stderr
+        sys.stderr = open(os.devnull, 'w')
+        try:
+            self.assertEqual((1, 0), self.index.Update([self.root]))
+        finally:
+            sys.stderr.close()
+            sys.stderr = stderr
+        self.assertEqual(['void F()'],
+                         self.index.FindClasses('A')[0].methods)
+        self.assertEqual(['int G() const'],
+                         self.index.FindClasses('C')[0].methods)
+
+    def testIncrementalUpdate(self):
+        self.WriteHeader('A.h', 'class A {};', mtime=1000)
+        self.WriteHeader('B.h', 'class B {};', mtime=1000)
+        self.assertEqual((2, 0), self.index.Update([self.root]))
+        self.assertEqual((0, 0), self.index.Update([self.root]))
+
+        # Touched but unchanged files are not parsed again.
+        self.WriteHeader('A.h', 'class A {};', mtime=2000)
+        self.assertEqual((0, 0), self.index.Update([self.root]))
+
+        self.WriteHeader('B.h', 'class C {};', mtime=2000)
+        os.remove(os.path.join(self.root, 'A.h'))
+        self.assertEqual((1, 1), self.index.Update([self.root]))
+        self.assertEqual([], self.index.FindClasses('A'))
+        self.assertEqual([], self.index.FindClasses('B'))
+        self.assertEqual(1, len(self.index.FindClasses('C')))
+
+    def testKeepsOtherDatabases(self):
+        path = os.path.join(self.root, 'other.sqlite')
+        db = sqlite3.connect(path)
+        db.execute('CREATE TABLE users (name TEXT)')
+        db.execute("INSERT INTO users VALUES ('a')")
+        db.execute('PRAGMA user_version = 7')
+        db.commit()
+        db.close()
+        self.assertRaises(class_index.IndexFileError, class_index.ClassIndex,
+                          path, create=True)
+        db = sqlite3.connect(path)
+        self.assertEqual([('a',)], db.execute('SELECT * FROM users').fetchall())
+        db.close()
+
+    def testMissingIndexIsNotCreated(self):
+        path = os.path.join(self.root, 'mistyped.sqlite')
+        self.assertRaises(class_index.IndexFileError, class_index.ClassIndex,
+                          path)
+        self.assertFalse(os.path.exists(path))
+
+    def testNewerIndexIsKept(self):
+        self.WriteHeader('A.h', 'class A {};')
+        self.index.Update([self.root])
+        self.index._db.execute('PRAGMA user_version = 99')
+        self.index._db.commit()
+        path = self.index.filename
+        self.assertRaises(class_index.IndexFileError, class_index.ClassIndex,
+                          path)
+        self.index._db.execute('PRAGMA user_version = %d' %
+                               class_index._SCHEMA_VERSION)
+        self.index._db.commit()
+        index = class_index.ClassIndex(path)
+        self.assertEqual(1, len(index.FindClasses('A')))
+        index.Close()
+
+    def testUnmarkedIndexIsKept(self):
+        self.WriteHeader('A.h', 'class A {};')
+        self.index.Update([self.root])
+        self.index._db.execute('PRAGMA application_id = 0')
+        self.index._db.commit()
+        index = class_index.ClassIndex(self.index.filename)
+        self.assertEqual(1, len(index.FindClasses('A')))
+        index.Close()
+
+
+if __name__ == '__main__':
+    unittest.main()
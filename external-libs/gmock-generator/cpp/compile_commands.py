@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Headers and macros of a project from its compile_commands.json.
+
+A compilation database lists the command line of every translation unit.
+The headers of the project are those its translation units include,
+directly or not, that lie under the project root, by default the
+directory holding all the translation units and the directories they
+are compiled in, e.g. the project holding src/, include/ and build/.
+A header included by many translation units is listed once, with the
+macros that all of them agree on: a macro defined differently, or only
+by some of them, is unknown and the conditionals depending on it keep
+all their branches.
+
+#include directives are found with a regular expression, without
+evaluating conditionals, so a header included only on another platform
+is listed too.
+"""
+
+
+import json
+import os
+import re
+import shlex
+
+from cpp import utils
+
+
+_INCLUDE = re.compile(r'^[ \t]*#[ \t]*include[ \t]*([<"])([^>"\n]+)[>"]',
+                      re.MULTILINE)
+
+
+class CompileCommand(object):
+    """The flags of one translation unit that matter to the parser.
+
+    Attributes:
+      filename: absolute path of the translation unit
+      macros: {name: value or None if undefined} from -D and -U
+      quote_dirs: directories searched for #include "..." from -iquote
+      include_dirs: directories searched for all includes from -I
+    """
+
+    def __init__(self, directory, filename, arguments):
+        self.directory = directory
+        self.filename = os.path.normpath(os.path.join(directory, filename))
+        self.macros = {}
+        self.quote_dirs = []
+        self.include_dirs = []
+        self._ParseArguments(arguments)
+
+    def _Path(self, path):
+        return os.path.normpath(os.path.join(self.directory, path))
+
+    def _ParseArguments(self, arguments):
+        i = 0
+        while i < len(arguments):
+            argument = arguments[i]
+            i += 1
+            for flag in ('-D', '-U', '-I', '-iquote'):
+                if argument.startswith(flag):
+                    break
+            else:
+                continue
+            value = argument[len(flag):]
+            if not value and i < len(arguments):
+                value = arguments[i]
+                i += 1
+            if flag == '-D':
+                name, equals, definition = value.partition('=')
+                if not equals:
+                    definition = '1'
+                self.macros[name] = definition
+            elif flag == '-U':
+                self.macros[value] = None
+            elif flag == '-I':
+                self.include_dirs.append(self._Path(value))
+            else:
+                self.quote_dirs.append(self._Path(value))
+
+
+def Load(filename):
+    """Returns [CompileCommand, ...] read from a compile_commands.json.
+
+    Raises:
+      IOError, ValueError or KeyError when it cannot be read.
+    """
+    fp = open(filename)
+    try:
+        entries = json.load(fp)
+    finally:
+        fp.close()
+    commands = []
+    for entry in entries:
+        arguments = entry.get('arguments')
+        if arguments is None:
+            arguments = shlex.split(entry['command'])
+        directory = os.path.join(os.path.dirname(os.path.abspath(filename)),
+                                 entry['directory'])
+        commands.append(CompileCommand(directory, entry['file'], arguments))
+    return commands
+
+
+class _IncludeScanner(object):
+    """Finds the headers translation units include, reading each once."""
+
+    def __init__(self):
+        self._includes = {}  # path: [(system, name), ...]
+
+    def _Includes(self, path):
+        try:
+            return self._includes[path]
+        except KeyError:
+            pass
+        source = utils.ReadFile(path, False)
+        includes = []
+        if source is not None:
+            includes = [(quote == '<', name.strip())
+                        for quote, name in _INCLUDE.findall(source)]
+        self._includes[path] = includes
+        return includes
+
+    def Headers(self, command):
+        """Returns the set of headers command includes, directly or not."""
+        headers = set()
+        pending = [command.filename]
+        while pending:
+            path = pending.pop()
+            for system, name in self._Includes(path):
+                directories = command.include_dirs
+                if not system:
+                    directories = ([os.path.dirname(path)] +
+                                   command.quote_dirs + directories)
+                for directory in directories:
+                    header = os.path.normpath(os.path.join(directory, name))
+                    if os.path.isfile(header):
+                        if header not in headers:
+                            headers.add(header)
+                            pending.append(header)
+                        break
+        return headers
+
+
+def _Within(path, root):
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def ProjectHeaders(commands, root=None):
+    """Returns [(header, {name: value or None}), ...] sorted by header.
+
+    Args:
+      commands: [CompileCommand, ...]
+      root: directory the headers must be in, None for the one holding
+            every translation unit and the directory it is compiled in
+    """
+    if not commands:
+        return []
+    if root is None:
+        directories = []
+        for command in commands:
+            directories.append(os.path.dirname(command.filename))
+            directories.append(os.path.normpath(command.directory))
+        root = os.path.commonpath(directories)
+    root = os.path.abspath(root)
+    scanner = _IncludeScanner()
+    macros_by_header = {}
+    for command in commands:
+        headers = scanner.Headers(command)
+        if command.filename.endswith(utils.HEADER_EXTENSIONS):
+            headers.add(command.filename)
+        for header in headers:
+            if not _Within(header, root):
+                continue
+            macros = macros_by_header.get(header)
+            if macros is None:
+                macros_by_header[header] = dict(command.macros)
+            else:
+                # Only what every translation unit agrees on is known.
+                for name in list(macros):
+                    if (name not in command.macros or
+                        command.macros[name] != macros[name]):
+                        del macros[name]
+    return sorted(macros_by_header.items())
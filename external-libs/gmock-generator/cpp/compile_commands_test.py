@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for cpp.compile_commands."""
+
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Allow the cpp imports below to work when run as a standalone script.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from cpp import compile_commands
+
+
+class CompileCommandsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = os.path.realpath(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def WriteFile(self, filename, source=''):
+        path = os.path.join(self.root, filename)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as fp:
+            fp.write(source)
+        return path
+
+    def WriteDatabase(self, entries):
+        return self.WriteFile('build/compile_commands.json',
+                              json.dumps(entries))
+
+    def testArguments(self):
+        command = compile_commands.CompileCommand(
+            '/build', '../src/a.cc',
+            ['c++', '-DA', '-D', 'B=2', '-DC=', '-UD', '-I', 'include',
+             '-I/usr/include/qt', '-iquote', '.', '-isystem', '/sys',
+             '-c', '../src/a.cc'])
+        self.assertEqual('/src/a.cc', command.filename)
+        self.assertEqual({'A': '1', 'B': '2', 'C': '', 'D': None},
+                         command.macros)
+        self.assertEqual(['/build/include', '/usr/include/qt'],
+                         command.include_dirs)
+        self.assertEqual(['/build'], command.quote_dirs)
+
+    def testLoad(self):
+        path = self.WriteDatabase([
+            {'directory': '.', 'file': '../src/a.cc',
+             'command': 'c++ -DNAME="a b" -I../include -c ../src/a.cc'},
+            {'directory': self.root, 'file': 'src/b.cc',
+             'arguments': ['c++', '-DB', '-c', 'src/b.cc']},
+        ])
+        a, b = compile_commands.Load(path)
+        self.assertEqual(os.path.join(self.root, 'src', 'a.cc'), a.filename)
+        self.assertEqual({'NAME': 'a b'}, a.macros)
+        self.assertEqual([os.path.join(self.root, 'include')], a.include_dirs)
+        self.assertEqual(os.path.join(self.root, 'src', 'b.cc'), b.filename)
+        self.assertEqual({'B': '1'}, b.macros)
+
+    def testProjectHeaders(self):
+        self.WriteFile('src/a.cc', '#include "a.h"\n#include <vector>\n')
+        self.WriteFile('src/b.cc', '#include "b.h"\n#include "a.h"\n')
+        a = self.WriteFile('src/a.h', '#include <common/c.h>\n')
+        b = self.WriteFile('src/b.h', '  #  include "../include/common/c.h"')
+        c = self.WriteFile('include/common/c.h', '#include "a.h"\n')
+        self.WriteFile('outside/vector')
+        path = self.WriteDatabase([
+            {'directory': '.', 'file': '../src/a.cc',
+             'arguments': ['c++', '-I../include', '-I../outside', '-DA',
+                           '-DSHARED=1', '-UOFF', '-DDIFFERENT=1']},
+            {'directory': '.', 'file': '../src/b.cc',
+             'arguments': ['c++', '-DSHARED=1', '-UOFF', '-DDIFFERENT=2']},
+        ])
+        headers = compile_commands.ProjectHeaders(
+            compile_commands.Load(path))
+        # outside/vector is under the root, so it belongs to the project
+        # too; the a.h included by c.h does not exist next to it.
+        vector = os.path.join(self.root, 'outside', 'vector')
+        self.assertEqual([c, vector, a, b],
+                         [header for header, unused_macros in headers])
+        macros = dict(headers)
+        self.assertEqual({'SHARED': '1', 'OFF': None}, macros[a])
+        self.assertEqual({'SHARED': '1', 'OFF': None, 'DIFFERENT': '2'},
+                         macros[b])
+
+        root = os.path.join(self.root, 'src')
+        self.assertEqual([a, b], [header for header, unused_macros in
+                                  compile_commands.ProjectHeaders(
+                                      compile_commands.Load(path), root)])
+
+
+if __name__ == '__main__':
+    unittest.main()
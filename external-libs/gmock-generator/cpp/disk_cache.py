@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Size-capped on-disk cache used to keep work between runs.
+
+The cache directory defaults to $XDG_CACHE_HOME/cpp-code-generators and
+can be moved with the CPPGEN_CACHE_DIR environment variable.  The size
+cap defaults to 256 MB and can be changed with CPPGEN_CACHE_MAX_MB.
+
+Entries are created with the permissions the umask allows, so a
+directory can be shared by several users of a host when their umask
+lets the group write, e.g. 002.  A private cache, for entries that must
+not come from another user such as pickles, instead lives in a
+directory of its own that only its owner can enter, and is not used
+when that directory belongs to someone else or others can write to it.
+"""
+
+
+import collections
+import hashlib
+import os
+import tempfile
+import threading
+
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_TEMP_PREFIX = '.tmp-'
+
+_file_mode = None
+
+
+def DefaultDirectory():
+    """Returns the root directory for all caches."""
+    directory = os.environ.get('CPPGEN_CACHE_DIR')
+    if directory:
+        return directory
+    root = os.environ.get('XDG_CACHE_HOME')
+    if not root:
+        root = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'cpp-code-generators')
+
+
+def DefaultMaxBytes():
+    """Returns the size cap for a cache directory in bytes."""
+    try:
+        return int(os.environ['CPPGEN_CACHE_MAX_MB']) * 1024 * 1024
+    except (KeyError, ValueError):
+        return DEFAULT_MAX_BYTES
+
+
+def PrivateDirectory(name):
+    """Returns the directory of the private cache name of the user."""
+    if hasattr(os, 'geteuid'):
+        name = '%s-%d' % (name, os.geteuid())
+    return os.path.join(DefaultDirectory(), name)
+
+
+def _FileMode():
+    # mkstemp() makes files only their owner can read.
+    global _file_mode
+    if _file_mode is None:
+        umask = os.umask(0)
+        os.umask(umask)
+        _file_mode = 0o666 & ~umask
+    return _file_mode
+
+
+def FilesKey(*paths):
+    """Returns a hex digest of the contents of files, e.g. the sources of a
+    generator, used to invalidate entries when one of them changes."""
+    parts = []
+    for path in paths:
+        try:
+            fp = open(path, 'rb')
+            try:
+                parts.append(fp.read())
+            finally:
+                fp.close()
+        except IOError:
+            parts.append(path)
+    return HashKey(*parts)
+
+
+def ModulesKey(*modules):
+    """Returns FilesKey() of the Python source of modules."""
+    return FilesKey(*[os.path.splitext(module.__file__)[0] + '.py'
+                      for module in modules])
+
+
+def HashKey(*parts):
+    """Returns a hex digest identifying the str or bytes parts."""
+    digest = hashlib.sha1()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = part.encode('utf-8')
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class DiskCache(object):
+    """Maps keys to bytes, stored one file per entry in a directory.
+
+    Reading an entry refreshes its mtime, when the entry is writable.
+    Writing an entry evicts the least recently used entries once the
+    directory grows past max_bytes.  The directory is listed once, on the
+    first write; from then on the entries and their total size are kept
+    in memory, so writes do not list it again.  Entries that other
+    processes sharing the directory write later are evicted by them.
+    Entries are written to a temporary file and renamed into place, so
+    concurrent processes never see partial data.  I/O errors are not
+    fatal; they are treated as cache misses.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, private=False):
+        """
+        Args:
+          directory: where the entries are stored
+          max_bytes: size cap of the entries
+          private: whether only the user may read and write the entries,
+                   which are then ignored unless directory is theirs alone
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.private = private
+        self._usable = None  # Whether a private directory is the user's.
+        self._lock = threading.Lock()
+        self._entries = None  # OrderedDict {path: size}, least recent first.
+        self._total = 0
+
+    def _Path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _Usable(self):
+        if not self.private:
+            return True
+        if self._usable is None:
+            try:
+                stat = os.stat(self.directory)
+            except OSError:
+                return False  # Made by the next Put().
+            self._usable = (not hasattr(os, 'geteuid') or
+                            (stat.st_uid == os.geteuid() and
+                             not stat.st_mode & 0o077))
+        return self._usable
+
+    def Get(self, key):
+        """Returns the bytes stored for key or None."""
+        if not self._Usable():
+            return None
+        path = self._Path(key)
+        try:
+            fp = open(path, 'rb')
+            try:
+                data = fp.read()
+            finally:
+                fp.close()
+        except EnvironmentError:
+            return None
+        try:
+            os.utime(path, None)
+        except EnvironmentError:
+            pass  # Written by another user of a shared cache.
+        with self._lock:
+            if self._entries is not None and path in self._entries:
+                self._entries.move_to_end(path)
+        return data
+
+    def Put(self, key, data):
+        """Stores data for key and trims the cache to its size cap."""
+        try:
+            if not os.path.isdir(self.directory):
+                if self.private:
+                    os.makedirs(self.directory, 0o700)
+                else:
+                    os.makedirs(self.directory)
+            if not self._Usable():
+                return
+            fd, temp_path = tempfile.mkstemp(prefix=_TEMP_PREFIX,
+                                             dir=self.directory)
+            try:
+                fp = os.fdopen(fd, 'wb')
+                try:
+                    fp.write(data)
+                finally:
+                    fp.close()
+                if not self.private:
+                    os.chmod(temp_path, _FileMode())
+                os.replace(temp_path, self._Path(key))
+            except:
+                os.remove(temp_path)
+                raise
+            with self._lock:
+                if self._entries is None:
+                    self._Scan()
+                else:
+                    self._Add(self._Path(key), len(data))
+                self._Evict()
+        except EnvironmentError:
+            pass
+
+    def _Scan(self):
+        # Lists the directory, the entries least recently used first.
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.startswith(_TEMP_PREFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Already evicted by another process.
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+        entries.sort()
+        self._entries = collections.OrderedDict(
+            [(path, size) for unused_mtime, path, size in entries])
+        self._total = sum(self._entries.values())
+
+    def _Add(self, path, size):
+        self._total += size - self._entries.pop(path, 0)
+        self._entries[path] = size
+
+    def _Evict(self):
+        while self._total > self.max_bytes and self._entries:
+            path, size = self._entries.popitem(last=False)
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Already evicted by another process.
+            self._total -= size
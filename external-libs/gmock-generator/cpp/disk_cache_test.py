@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for cpp.disk_cache."""
+
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Allow the cpp imports below to work when run as a standalone script.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from cpp import ast
+from cpp import disk_cache
+
+
+class DiskCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testGetAndPut(self):
+        cache = disk_cache.DiskCache(self.directory)
+        self.assertEqual(None, cache.Get('key'))
+        cache.Put('key', b'data')
+        self.assertEqual(b'data', cache.Get('key'))
+
+    def testEvictsLeastRecentlyUsed(self):
+        cache = disk_cache.DiskCache(self.directory, max_bytes=10)
+        cache.Put('old', b'12345')
+        cache.Put('new', b'12345')
+        os.utime(os.path.join(self.directory, 'old'), (1, 1))
+        cache.Put('newest', b'12345')
+        self.assertEqual(None, cache.Get('old'))
+        self.assertEqual(b'12345', cache.Get('new'))
+        self.assertEqual(b'12345', cache.Get('newest'))
+
+    def testListsDirectoryOnce(self):
+        cache = disk_cache.DiskCache(self.directory, max_bytes=20)
+        listdir = os.listdir
+        calls = []
+        def CountingListdir(path):
+            calls.append(path)
+            return listdir(path)
+        os.listdir = CountingListdir
+        try:
+            for index in range(10):
+                cache.Put('key%d' % index, b'12345')
+        finally:
+            os.listdir = listdir
+        self.assertEqual(1, len(calls))
+        self.assertEqual(['key6', 'key7', 'key8', 'key9'],
+                         sorted(listdir(self.directory)))
+
+    def testEntriesFollowUmask(self):
+        umask = os.umask(0o002)
+        try:
+            disk_cache._file_mode = None
+            disk_cache.DiskCache(self.directory).Put('key', b'data')
+        finally:
+            os.umask(umask)
+            disk_cache._file_mode = None
+        mode = os.stat(os.path.join(self.directory, 'key')).st_mode
+        self.assertEqual(0o664, mode & 0o777)
+
+    @unittest.skipUnless(hasattr(os, 'geteuid'), 'needs POSIX owners')
+    def testPrivateEntries(self):
+        directory = os.path.join(self.directory, 'private')
+        umask = os.umask(0o002)
+        try:
+            disk_cache.DiskCache(directory, private=True).Put('key', b'data')
+        finally:
+            os.umask(umask)
+        self.assertEqual(0o700, os.stat(directory).st_mode & 0o777)
+        mode = os.stat(os.path.join(directory, 'key')).st_mode
+        self.assertEqual(0o600, mode & 0o777)
+        self.assertEqual(b'data',
+                         disk_cache.DiskCache(directory, private=True).Get('key'))
+
+        # Others may have written to it.
+        os.chmod(directory, 0o770)
+        cache = disk_cache.DiskCache(directory, private=True)
+        self.assertEqual(None, cache.Get('key'))
+        cache.Put('other', b'data')
+        self.assertFalse(os.path.exists(os.path.join(directory, 'other')))
+
+    def testAstCacheIsPrivate(self):
+        cache_dir = os.environ.get('CPPGEN_CACHE_DIR')
+        os.environ['CPPGEN_CACHE_DIR'] = self.directory
+        try:
+            cache = ast.AstCache()
+        finally:
+            if cache_dir is None:
+                del os.environ['CPPGEN_CACHE_DIR']
+            else:
+                os.environ['CPPGEN_CACHE_DIR'] = cache_dir
+        self.assertTrue(cache.private)
+        self.assertEqual(self.directory, os.path.dirname(cache.directory))
+
+    def testFilesKey(self):
+        path = os.path.join(self.directory, 'template.txt')
+        with open(path, 'w') as fp:
+            fp.write('{{CLASS_NAME}}')
+        key = disk_cache.FilesKey(path)
+        self.assertEqual(key, disk_cache.FilesKey(path))
+        with open(path, 'w') as fp:
+            fp.write('{{CLASS_NAME}} ')
+        self.assertNotEqual(key, disk_cache.FilesKey(path))
+        os.remove(path)
+        self.assertNotEqual(key, disk_cache.FilesKey(path))
+
+    def testParseSourceUsesCache(self):
+        cache = disk_cache.DiskCache(self.directory)
+        source = 'namespace a { class Foo { virtual int Bar(int x); }; }'
+        parsed = ast.ParseSource(source, '<test>', cache=cache)
+        self.assertEqual(1, len(os.listdir(self.directory)))
+        cached = ast.ParseSource(source, '<test>', cache=cache)
+        self.assertEqual(str(parsed), str(cached))
+        self.assertEqual(('a',), cached[0].namespace)
+
+
+if __name__ == '__main__':
+    unittest.main()
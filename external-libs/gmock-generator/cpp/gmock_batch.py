@@ -0,0 +1,671 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Generate Google Mock classes for many headers at once.
+
+gmock_class.main() hands over to Run() when it is given several headers,
+a directory, an output pattern, more than one job or a budget.  Headers
+are parsed in a pool of worker processes, each mock is written straight
+to its output file and failures are collected into one summary at the
+end.  A header that takes longer than --timeout or more memory than
+--memory-limit is abandoned by its worker and reported as a failure.
+With --amalgamate the mocks are sent back instead and written into one
+header, or one per module, by Amalgamate().
+
+With --pipeline the workers only parse and generate: headers are read by
+--io-threads threads of the main process ahead of the workers and the
+mocks are written by as many other threads, so that slow disks and CPUs
+are busy at the same time.  Bounded queues between the stages stop the
+readers from running far ahead of the workers and the workers from
+running far ahead of the writers.  The throughput of each stage is
+printed at the end.
+"""
+
+
+import concurrent.futures
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+
+try:
+  # Python 3.x
+  import queue
+except ImportError:
+  # Python 2.x
+  import Queue as queue
+
+from cpp import ast
+from cpp import budget
+from cpp import gmock_class
+from cpp import headers
+from cpp import metrics
+from cpp import output_cache
+from cpp import utils
+
+
+# State of a worker process, set up by _InitWorker().
+_options = None
+_cache = None
+_header_table = None
+_output_cache = None
+
+
+class Result(object):
+  """Outcome of mocking one header."""
+
+  def __init__(self, filename):
+    self.filename = filename
+    self.class_names = []   # Classes mocked.
+    self.outputs = []       # Files written.
+    self.lines = []         # Mock source, when not writing files.
+    self.mocks = []         # (namespace, class name, lines), --amalgamate.
+    self.writes = []        # (path, blocks) left to the writers, --pipeline.
+    self.seconds = 0.0      # Time the worker spent on the header.
+    self.error = None
+    self.parse_errors = []  # ast.ParseError of skipped declarations.
+    self.metrics = None     # FileMetrics.ToDict(), with --metrics-json/--trace.
+
+
+def OutputPath(pattern, filename, class_name):
+  """Expands {Class} and {Header} in an output pattern."""
+  header = os.path.splitext(os.path.basename(filename))[0]
+  return pattern.format(Class=class_name, Header=header)
+
+
+def ModulePath(pattern, filename):
+  """Expands {Module}, the name of the directory of a header, in a pattern."""
+  module = os.path.basename(os.path.dirname(os.path.abspath(filename)))
+  return pattern.format(Module=module)
+
+
+def _IncludePath(header, directory, include_roots):
+  header = os.path.abspath(header)
+  for root in include_roots:
+    root = os.path.abspath(root)
+    if header.startswith(root + os.sep):
+      directory = root
+      break
+  return os.path.relpath(header, directory).replace(os.sep, '/')
+
+
+def Amalgamate(path, mocks, include_roots=()):
+  """Returns the lines of a header holding many mocks.
+
+  Args:
+    path: where the header is written, which names its include guard and
+          is where headers outside of include_roots are included from
+    mocks: [(header, namespace, class name, lines), ...] where lines are
+           made by gmock_class._GenerateMockClasses()
+    include_roots: directories headers are included relative to
+
+  Returns:
+    [line, ...] including every header once and opening each namespace
+    once for all its mocks, which are sorted by namespace and name.
+  """
+  guard = re.sub('[^0-9A-Za-z]', '_', os.path.basename(path)).upper() + '_'
+  directory = os.path.dirname(os.path.abspath(path))
+  includes = sorted(set([_IncludePath(mock[0], directory, include_roots)
+                         for mock in mocks]))
+  lines = ['#ifndef ' + guard, '#define ' + guard, '',
+           '#include "gmock/gmock.h"']
+  lines.extend(['#include "%s"' % include for include in includes])
+  lines.append('')
+  current = ()
+  for unused_header, namespace, unused_name, class_lines in sorted(
+      mocks, key=lambda mock: (mock[1], mock[2])):
+    common = 0
+    while (common < min(len(current), len(namespace)) and
+           current[common] == namespace[common]):
+      common += 1
+    if common < len(current):
+      for name in reversed(current[common:]):
+        lines.append('}  // namespace %s' % name)
+      lines.append('')
+    if common < len(namespace):
+      lines.extend(['namespace %s {' % name  # }
+                    for name in namespace[common:]])
+      lines.append('')
+    current = namespace
+    lines.extend(class_lines)
+    lines.append('')
+  if current:
+    for name in reversed(current):
+      lines.append('}  // namespace %s' % name)
+    lines.append('')
+  lines.append('#endif  // ' + guard)
+  lines.append('')
+  return lines
+
+
+def _InitWorker(options, indent):
+  global _options, _cache, _header_table, _output_cache
+  _options = options
+  gmock_class._INDENT = indent
+  _cache = _output_cache = None
+  if not options.no_cache:
+    _cache = ast.AstCache()
+    if not options.include_roots:
+      # With -I mocks depend on other headers too.
+      _output_cache = output_cache.OutputCache()
+  _header_table = None
+  if options.include_roots:
+    # Shared by all headers handled by this process.
+    _header_table = headers.HeaderTable(options.include_roots, _cache,
+                                        options.header_macros)
+
+
+def _WriteFile(path, blocks):
+  directory = os.path.dirname(path)
+  if directory and not os.path.isdir(directory):
+    try:
+      os.makedirs(directory)
+    except OSError:
+      if not os.path.isdir(directory):
+        raise
+  fp = open(path, 'w')
+  try:
+    try:
+      gmock_class._WriteMocks(fp, blocks)
+    finally:
+      fp.close()
+  except:
+    # Do not leave half a mock behind, e.g. when a budget ran out.
+    os.remove(path)
+    raise
+
+
+def _MockHeader(task, source=None):
+  filename, desired_class_names = task
+  if not _options.metrics_json and not _options.trace:
+    return _MockFile(filename, desired_class_names, source)
+  metrics.StartFile(filename)
+  try:
+    result = _MockFile(filename, desired_class_names, source)
+  finally:
+    file_metrics = metrics.EndFile()
+  file_metrics.error = result.error
+  result.metrics = file_metrics.ToDict()
+  return result
+
+
+def _MockFile(filename, desired_class_names, source=None):
+  start = time.time()
+  result = Result(filename)
+  memory_bytes = None
+  if _options.memory_limit:
+    memory_bytes = _options.memory_limit * 1048576
+  try:
+    with budget.Budget(_options.timeout, memory_bytes):
+      _Mock(result, filename, desired_class_names, source)
+  except KeyboardInterrupt:
+    raise
+  except budget.BudgetExceeded:
+    result.error = str(sys.exc_info()[1])
+  except Exception:
+    result.error = '%s: %s' % (sys.exc_info()[0].__name__, sys.exc_info()[1])
+  result.seconds = time.time() - start
+  return result
+
+
+def _Mock(result, filename, desired_class_names, source=None):
+  """Reads, unless source is given, parses and mocks one header into
+  result."""
+  if source is None:
+    source = utils.ReadFile(filename, False)
+  if source is None:
+    result.error = 'unable to read file'
+    return
+  pattern = _options.output
+  mode = 'header'
+  if _options.amalgamate:
+    mode = 'amalgamate'
+  elif pattern and '{Class}' in pattern:
+    mode = 'class'
+  macros = _options.header_macros.get(os.path.abspath(filename))
+  mocks = key = None
+  if _output_cache is not None:
+    key = gmock_class._OutputKey(source, mode, desired_class_names, macros)
+    mocks = output_cache.Get(_output_cache, key)
+  if mocks is not None:
+    if metrics.current is not None:
+      metrics.current.cached = True
+      metrics.current.Add('classes', len(mocks))
+  else:
+    mocks = _GenerateMocks(result, filename, source, desired_class_names,
+                           mode, macros)
+    if key is not None:
+      # The output cache needs all of them.
+      mocks = list(mocks)
+      if not result.parse_errors:
+        output_cache.Put(_output_cache, key, mocks)
+
+  # Without --pipeline each mock is written as soon as it is generated,
+  # and only the one being written is held.
+  if mode == 'amalgamate':
+    result.mocks = [(tuple(namespace), class_name, lines)
+                    for namespace, class_name, lines in mocks]
+    result.class_names = [mock[1] for mock in result.mocks]
+  elif mode == 'class':
+    for unused_namespace, class_name, lines in mocks:
+      result.class_names.append(class_name)
+      result.writes.append((OutputPath(pattern, filename, class_name),
+                            [lines]))
+      if not _options.pipeline:
+        _WriteResult(result)
+  else:
+    blocks = _Blocks(mocks, result.class_names)
+    first_block = next(blocks, None)
+    if first_block is not None:
+      blocks = itertools.chain([first_block], blocks)
+      if not pattern:
+        # Sent back to the main process, which writes it to stdout.
+        result.lines = [line for block in blocks for line in block]
+      elif _options.pipeline:
+        result.writes.append((OutputPath(pattern, filename, ''),
+                              list(blocks)))
+      else:
+        result.writes.append((OutputPath(pattern, filename, ''), blocks))
+        _WriteResult(result)
+
+
+def _Blocks(mocks, class_names):
+  """Yields the lines of each of mocks, appending its class to class_names."""
+  for unused_namespace, class_name, lines in mocks:
+    class_names.append(class_name)
+    yield lines
+
+
+def _WriteResult(result):
+  """Writes the files of result.writes, returns the bytes written."""
+  size = 0
+  while result.writes:
+    path, blocks = result.writes.pop(0)
+    _WriteFile(path, blocks)
+    result.outputs.append(path)
+    size += os.path.getsize(path)
+  return size
+
+
+def _GenerateMocks(result, filename, source, desired_class_names, mode,
+                   macros):
+  """Yields (namespace, class name, lines) mocking a header, each as soon
+  as its class has been parsed.
+
+  The lines are those of a file of its own in mode 'class', of one block
+  of the file of the header in mode 'header' and without the namespace in
+  mode 'amalgamate'.
+  """
+  parse_class_names = desired_class_names
+  if _header_table is not None:
+    # Base classes can be defined anywhere in the file.
+    parse_class_names = None
+  parse_errors = None
+  if _options.recover:
+    parse_errors = result.parse_errors
+  entire_ast = ast.GenerateSource(source, filename, parse_class_names,
+                                  _cache, parse_errors, macros)
+  if _header_table is not None:
+    entire_ast = list(entire_ast)
+    _header_table.Add(filename, source, entire_ast)
+
+  class_nodes = gmock_class._SelectedClasses(entire_ast, desired_class_names)
+  if mode == 'amalgamate':
+    for namespace, class_name, lines in gmock_class._GenerateMockClasses(
+        filename, source, class_nodes, None, _header_table):
+      yield list(namespace), class_name, lines
+  elif mode == 'class':
+    for node in class_nodes:
+      for lines in gmock_class._GenerateMockBlocks(filename, source, [node],
+                                                   None, _header_table):
+        yield list(node.namespace), node.name, lines
+  else:
+    # Each class is mocked as soon as it is selected, so the node of a
+    # block is the last one recorded.
+    nodes = []
+    for lines in gmock_class._GenerateMockBlocks(
+        filename, source, gmock_class._Recorded(class_nodes, nodes), None,
+        _header_table):
+      node = nodes.pop()
+      yield list(node.namespace), node.name, lines
+
+
+def _Results(tasks, options, indent):
+  jobs = min(options.jobs, len(tasks))
+  if jobs <= 1:
+    _InitWorker(options, indent)
+    for task in tasks:
+      yield _MockHeader(task)
+    return
+  executor = concurrent.futures.ProcessPoolExecutor(
+      jobs, initializer=_InitWorker, initargs=(options, indent))
+  try:
+    # Small chunks keep the workers balanced when header sizes vary.
+    chunksize = max(1, min(16, len(tasks) // (jobs * 8)))
+    for result in executor.map(_MockHeader, tasks, chunksize=chunksize):
+      yield result
+  finally:
+    executor.shutdown()
+
+
+class StageStats(object):
+  """Throughput of one stage of the --pipeline."""
+
+  def __init__(self, name):
+    self.name = name
+    self.items = 0
+    self.bytes = 0
+    self.busy_seconds = 0.0  # Summed over the threads or processes.
+    self.start = None
+    self.end = None
+    self._lock = threading.Lock()
+
+  def Record(self, start, end, size, busy_seconds=None):
+    """Records one header handled from start to end."""
+    if busy_seconds is None:
+      busy_seconds = end - start
+    with self._lock:
+      self.items += 1
+      self.bytes += size
+      self.busy_seconds += busy_seconds
+      if self.start is None or start < self.start:
+        self.start = start
+      if self.end is None or end > self.end:
+        self.end = end
+
+  def ToDict(self):
+    wall_seconds = 0.0
+    if self.start is not None:
+      wall_seconds = self.end - self.start
+    items_per_second = bytes_per_second = 0.0
+    if wall_seconds > 0:
+      items_per_second = self.items / wall_seconds
+      bytes_per_second = self.bytes / wall_seconds
+    return {'items': self.items, 'bytes': self.bytes,
+            'busy_seconds': self.busy_seconds, 'wall_seconds': wall_seconds,
+            'items_per_second': items_per_second,
+            'bytes_per_second': bytes_per_second}
+
+  def Summary(self):
+    stats = self.ToDict()
+    return ('%-5s %6d header(s) %10.1f KiB in %7.2fs: %8.1f header(s)/s '
+            '%10.1f KiB/s, busy %.2fs' %
+            (self.name, stats['items'], stats['bytes'] / 1024.0,
+             stats['wall_seconds'], stats['items_per_second'],
+             stats['bytes_per_second'] / 1024.0, stats['busy_seconds']))
+
+
+_DONE = object()  # Marks the end of the items of a queue.
+
+
+def _ReadHeaders(tasks, lock, read_queue, stats):
+  """Reader thread, reads the headers of tasks into read_queue."""
+  while 1:
+    with lock:
+      task = next(tasks, _DONE)
+    if task is _DONE:
+      read_queue.put(_DONE)
+      return
+    start = time.time()
+    error = None
+    try:
+      source = utils.ReadFile(task[0], False)
+    except ValueError:
+      # Not UTF-8, the worker would fail the same way.
+      source = None
+      error = '%s: %s' % (sys.exc_info()[0].__name__, sys.exc_info()[1])
+    size = 0
+    if source is not None:
+      size = len(source.encode('utf-8'))
+    elif error is None:
+      error = 'unable to read file'
+    end = time.time()
+    stats.Record(start, end, size)
+    read_queue.put((task, source, error, end - start, size))
+
+
+def _DispatchHeaders(read_queue, readers, writers, executor, limit,
+                     write_queue, stats):
+  """Dispatcher thread, mocks what was read in the worker processes with
+  at most limit headers in them at once and sends the results to the
+  writers."""
+  pending = {}  # Future: (start, size, read seconds).
+
+  def Collect(return_when):
+    done, unused_not_done = concurrent.futures.wait(
+        list(pending), return_when=return_when)
+    for future in done:
+      start, size, read_seconds = pending.pop(future)
+      result = future.result()
+      stats.Record(start, time.time(), size, result.seconds)
+      _AddToMetrics(result, 'read', read_seconds, 'bytes_read', size)
+      write_queue.put(result)
+
+  while readers:
+    item = read_queue.get()
+    if item is _DONE:
+      readers -= 1
+      continue
+    task, source, error, read_seconds, size = item
+    if error is not None:
+      result = Result(task[0])
+      result.error = error
+      write_queue.put(result)
+      continue
+    while len(pending) >= limit:
+      Collect(concurrent.futures.FIRST_COMPLETED)
+    pending[executor.submit(_MockHeader, task, source)] = (
+        time.time(), size, read_seconds)
+  if pending:
+    Collect(concurrent.futures.ALL_COMPLETED)
+  for unused_writer in range(writers):
+    write_queue.put(_DONE)
+
+
+def _WriteResults(write_queue, results_queue, stats):
+  """Writer thread, writes the files of the results in write_queue."""
+  while 1:
+    result = write_queue.get()
+    if result is _DONE:
+      return
+    if result.writes:
+      start = time.time()
+      size = 0
+      try:
+        size = _WriteResult(result)
+      except (IOError, OSError):
+        result.error = '%s: %s' % (sys.exc_info()[0].__name__,
+                                   sys.exc_info()[1])
+      end = time.time()
+      stats.Record(start, end, size)
+      _AddToMetrics(result, 'write', end - start, 'bytes_written', size)
+    results_queue.put(result)
+
+
+def _AddToMetrics(result, phase, seconds, counter, size):
+  # Reading and writing happen outside of the FileMetrics of the worker.
+  if result.metrics is not None:
+    result.metrics['seconds'][phase] += seconds
+    result.metrics[counter] += size
+
+
+def _StartThread(results_queue, target, *args):
+  def Run():
+    try:
+      target(*args)
+    except BaseException:
+      # Raised again by _PipelinedResults().
+      results_queue.put(sys.exc_info()[1])
+  thread = threading.Thread(target=Run)
+  thread.daemon = True
+  thread.start()
+
+
+def _PipelinedResults(tasks, options, indent, stages):
+  """Yields the Result of each task as it is done, see --pipeline.
+
+  The StageStats of the read, mock and write stages are appended to
+  stages.
+  """
+  io_threads = max(1, options.io_threads)
+  jobs = max(1, min(options.jobs, len(tasks)))
+  limit = options.queue_size or 2 * jobs
+  read_stats, mock_stats, write_stats = [StageStats(name) for name in
+                                         ('read', 'mock', 'write')]
+  stages.extend([read_stats, mock_stats, write_stats])
+
+  read_queue = queue.Queue(limit)
+  write_queue = queue.Queue(limit)
+  results_queue = queue.Queue()
+  executor = concurrent.futures.ProcessPoolExecutor(
+      jobs, initializer=_InitWorker, initargs=(options, indent))
+  try:
+    lock = threading.Lock()
+    task_iterator = iter(tasks)
+    for unused_i in range(io_threads):
+      _StartThread(results_queue, _ReadHeaders, task_iterator, lock,
+                   read_queue, read_stats)
+      _StartThread(results_queue, _WriteResults, write_queue, results_queue,
+                   write_stats)
+    _StartThread(results_queue, _DispatchHeaders, read_queue, io_threads,
+                 io_threads, executor, limit, write_queue, mock_stats)
+    for unused_task in tasks:
+      result = results_queue.get()
+      if isinstance(result, BaseException):
+        raise result
+      yield result
+  finally:
+    executor.shutdown()
+
+
+def _WriteAmalgamated(options, mocks, failures):
+  """Writes the amalgamated headers and returns how many were written."""
+  mocks_by_path = {}
+  for (path, namespace, class_name), (header, lines) in mocks.items():
+    mocks_by_path.setdefault(path, []).append(
+        (header, namespace, class_name, lines))
+  written = 0
+  for path, path_mocks in sorted(mocks_by_path.items()):
+    try:
+      _WriteFile(path, [Amalgamate(path, path_mocks, options.include_roots)])
+      written += 1
+    except (IOError, OSError):
+      failures.append((path, str(sys.exc_info()[1])))
+  return written
+
+
+def Run(tasks, options, indent):
+  """Mocks [(filename, set(class names) or None), ...].
+
+  Returns:
+    0 if every header was mocked, 1 otherwise.
+  """
+  if options.output:
+    try:
+      OutputPath(options.output, 'header.h', 'Class')
+    except (KeyError, IndexError, ValueError):
+      sys.stderr.write('Invalid output pattern %r, only {Class} and {Header} '
+                       'can be used.\n' % options.output)
+      return 1
+  if options.amalgamate:
+    try:
+      ModulePath(options.amalgamate, 'module/header.h')
+    except (KeyError, IndexError, ValueError):
+      sys.stderr.write('Invalid amalgamated header %r, only {Module} can be '
+                       'used.\n' % options.amalgamate)
+      return 1
+
+  run_metrics = None
+  if options.metrics_json or options.trace:
+    run_metrics = metrics.RunMetrics()
+  stages = []
+  failures = []
+  parse_errors = []
+  found_class_names = set()
+  writers = {}
+  mocks = {}  # (amalgamated header, namespace, class name): (header, lines)
+  header_count = class_count = output_count = 0
+  if options.pipeline:
+    results = _PipelinedResults(tasks, options, indent, stages)
+  else:
+    results = _Results(tasks, options, indent)
+  for result in results:
+    if run_metrics is not None:
+      run_metrics.Add(result.metrics)
+    parse_errors.extend(result.parse_errors)
+    if result.error is not None:
+      failures.append((result.filename, result.error))
+      continue
+    header_count += 1
+    found_class_names.update(result.class_names)
+    class_count += len(result.class_names)
+    output_count += len(result.outputs)
+    for path in result.outputs:
+      if path in writers:
+        failures.append((result.filename,
+                         '%s was also written for %s' % (path, writers[path])))
+      writers[path] = result.filename
+    for namespace, class_name, lines in result.mocks:
+      key = (ModulePath(options.amalgamate, result.filename), namespace,
+             class_name)
+      if key not in mocks:
+        mocks[key] = result.filename, lines
+      elif mocks[key][1] != lines:
+        failures.append((result.filename, 'Mock%s was also generated for %s'
+                         % ('::'.join(namespace + (class_name,)),
+                            mocks[key][0])))
+    if result.lines:
+      text = '\n'.join(result.lines) + '\n'
+      sys.stdout.write(text)
+      if run_metrics is not None:
+        result.metrics['bytes_written'] += len(text.encode('utf-8'))
+
+  if options.amalgamate:
+    output_count += _WriteAmalgamated(options, mocks, failures)
+
+  desired_class_names = set()
+  for unused_filename, class_names in tasks:
+    desired_class_names.update(class_names or ())
+  missing_class_names = sorted(desired_class_names - found_class_names)
+
+  sys.stderr.write('Mocked %d class(es) from %d header(s), wrote %d file(s).\n'
+                   % (class_count, header_count, output_count))
+  if missing_class_names:
+    sys.stderr.write('Class(es) not found: %s\n' %
+                     ', '.join(missing_class_names))
+  if stages:
+    sys.stderr.write('Pipeline throughput:\n')
+    for stage in stages:
+      sys.stderr.write('  %s\n' % stage.Summary())
+    if run_metrics is not None:
+      run_metrics.stages = dict([(stage.name, stage.ToDict())
+                                 for stage in stages])
+  if parse_errors:
+    sys.stderr.write('Skipped %d declaration(s) that could not be parsed:\n'
+                     % len(parse_errors))
+    for parse_error in parse_errors:
+      sys.stderr.write('  %s\n' % parse_error)
+  if failures:
+    sys.stderr.write('%d failure(s):\n' % len(failures))
+    for filename, error in failures:
+      sys.stderr.write('  %s: %s\n' % (filename, error))
+  if options.metrics_json:
+    run_metrics.Write(options.metrics_json, options.metrics_top)
+  if options.trace:
+    run_metrics.WriteTrace(options.trace)
+  if failures or missing_class_names or not tasks:
+    return 1
+  return 0
@@ -21,19 +21,82 @@ classes for the specified classes.  If no class is specified, all
 classes in the source file are emitted.
 
 Usage:
-  gmock_class.py header-file.h [ClassName]...
-
-Output is sent to stdout.
+  gmock_class.py [options] header-file.h [ClassName]...
+  gmock_class.py [options] header-file.h|directory... -- [ClassName]...
+  gmock_class.py [options] --index FILE ClassName...
+  gmock_class.py [options] --compile-commands FILE [ClassName]...
+
+Output is sent to stdout, or with -o to one file per class or header, for
+example -o mocks/Mock{Class}.h.  Several headers and directories can be
+given before a -- that separates them from the class names; -j N parses
+them in N processes and failures are summarized at the end instead of
+stopping the run.  Parsed headers are cached on disk between
+runs (see cpp/disk_cache.py), and so are mocks of headers whose inputs did
+not change (see cpp/output_cache.py); --no-cache parses from scratch.
+
+With -I, base classes are looked up by following #include directives
+through the given include roots and their virtual methods are mocked
+too.
+
+With --amalgamate FILE, all mocks are written into FILE instead, which
+includes every mocked header once and opens each namespace once.  With
+{Module} in FILE there is one such header per directory of the mocked
+headers, e.g. --amalgamate mocks/mock_{Module}.h.
+
+With --index, classes are looked up by name in a class index built by
+cpp/class_index.py instead of being read from a given header.
+
+With --compile-commands, the headers to mock are those the translation
+units of a compile_commands.json include from the project, each parsed
+once however many translation units include it.  The -D and -U flags
+that all of its translation units agree on decide the #if, #ifdef and
+#ifndef conditionals of a header; conditionals on other macros keep all
+their branches.  See cpp/compile_commands.py.
+
+--pipeline overlaps reading and writing headers, in --io-threads threads,
+with parsing and generating them in the -j processes, with --queue-size
+headers at most waiting between two stages, and prints the throughput of
+each stage.
+
+--timeout SECONDS and --memory-limit MB give every header a budget of
+wall time and of memory its worker process may grow by.  A header that
+exceeds them, for example one with an unterminated string, is abandoned
+and reported as a failure while the rest of the headers are mocked.
+
+--recover keeps going after a declaration that cannot be parsed: it is
+reported with its line, skipped up to the next ; or matching } and the
+other classes of the header are still mocked.  With --metrics-json the
+skipped declarations are listed as parse_errors of each header.
+
+--metrics-json FILE writes per-header counters and phase timings as JSON.
+--trace FILE writes the same timings as a Chrome trace, one track per
+process.
+--memprofile prints the memory used to tokenize, parse and generate each
+header, the top allocation sites and the number of Token, Function, Type
+and Parameter objects.
+
+--profile[=FILE] runs under cProfile, writes FILE (gmock_class.pstats by
+default) and prints where the time went in each phase: read, tokenize,
+parse, generate and write.
 """
 
 __author__ = 'nnorwitz@google.com (Neal Norwitz)'
 
 
+import argparse
 import os
 import re
 import sys
 
 from cpp import ast
+from cpp import budget
+from cpp import class_index
+from cpp import compile_commands
+from cpp import disk_cache
+from cpp import headers
+from cpp import metrics
+from cpp import output_cache
+from cpp import profiling
 from cpp import utils
 
 # Preserve compatibility with Python 2.3.
@@ -47,14 +110,24 @@ _VERSION = (1, 0, 1)  # The version of this script.
 # How many spaces to indent.  Can set me with the INDENT environment variable.
 _INDENT = 2
 
+# A class name given on the command line, maybe qualified.
+_CLASS_NAME = re.compile(r'^(::)?[A-Za-z_]\w*(::[A-Za-z_]\w*)*$')
+
+_generator_version = None
 
-def _GenerateMethods(output_lines, source, class_node):
+
+def _GenerateMethods(output_lines, source, class_node, inherited_methods=()):
+  """Appends the mocks of the virtual methods and returns how many."""
+  method_count = 0
   function_type = (ast.FUNCTION_VIRTUAL | ast.FUNCTION_PURE_VIRTUAL |
                    ast.FUNCTION_OVERRIDE)
   ctor_or_dtor = ast.FUNCTION_CTOR | ast.FUNCTION_DTOR
   indent = ' ' * _INDENT
 
-  for node in class_node.body:
+  # Inherited methods come with the source of the header declaring them.
+  methods = [(source, node) for node in class_node.body]
+  methods.extend(inherited_methods)
+  for source, node in methods:
     # We only care about virtual functions.
     if (isinstance(node, ast.Function) and
         node.modifiers & function_type and
@@ -121,60 +194,64 @@ def _GenerateMethods(output_lines, source, class_node):
       # Create the mock method definition.
       output_lines.extend(['%s%s(%s,' % (indent, mock_method_macro, node.name),
                            '%s%s(%s));' % (indent*3, return_type, args)])
+      method_count += 1
+  return method_count
 
 
-def _GenerateMocks(filename, source, ast_list, desired_class_names):
-  processed_class_names = set()
+def _GenerateMockBlocks(filename, source, ast_list, desired_class_names,
+                       header_table=None):
+  """Yields the lines of each mock class as soon as its node is available."""
+  blocks = _MockBlocks(filename, source, ast_list, desired_class_names,
+                       header_table)
+  if metrics.current is not None:
+    blocks = metrics.current.Count(blocks, 'generate', 'classes')
+  return blocks
+
+
+def _MockClassLines(filename, source, class_node, header_table):
+  """Returns (lines, method count) of the mock of class_node.
+
+  The lines leave out the namespaces of the class and stop after its last
+  method; the caller closes the class.
+  """
   lines = []
+  parent_name = class_node.name
+  # Add template args for templated classes.
+  if class_node.templated_types:
+    # TODO(paulchang): The AST doesn't preserve template argument order,
+    # so we have to make up names here.
+    # TODO(paulchang): Handle non-type template arguments (e.g.
+    # template<typename T, int N>).
+    template_arg_count = len(class_node.templated_types.keys())
+    template_args = ['T%d' % n for n in range(template_arg_count)]
+    template_decls = ['typename ' + arg for arg in template_args]
+    lines.append('template <' + ', '.join(template_decls) + '>')
+    parent_name += '<' + ', '.join(template_args) + '>'
+
+  # Add the class prolog.
+  lines.append('class Mock%s : public %s {'  # }
+               % (class_node.name, parent_name))
+  lines.append('%spublic:' % (' ' * (_INDENT // 2)))
+
+  # Add all the methods.
+  inherited_methods = ()
+  if header_table is not None:
+    inherited_methods = header_table.InheritedMethods(filename, class_node)
+  method_count = _GenerateMethods(lines, source, class_node,
+                                  inherited_methods)
+  return lines, method_count
+
+
+def _SelectedClasses(ast_list, desired_class_names):
   for node in ast_list:
     if (isinstance(node, ast.Class) and node.body and
         # desired_class_names being None means that all classes are selected.
         (not desired_class_names or node.name in desired_class_names)):
-      class_name = node.name
-      parent_name = class_name
-      processed_class_names.add(class_name)
-      class_node = node
-      # Add namespace before the class.
-      if class_node.namespace:
-        lines.extend(['namespace %s {' % n for n in class_node.namespace])  # }
-        lines.append('')
-
-      # Add template args for templated classes.
-      if class_node.templated_types:
-        # TODO(paulchang): The AST doesn't preserve template argument order,
-        # so we have to make up names here.
-        # TODO(paulchang): Handle non-type template arguments (e.g.
-        # template<typename T, int N>).
-        template_arg_count = len(class_node.templated_types.keys())
-        template_args = ['T%d' % n for n in range(template_arg_count)]
-        template_decls = ['typename ' + arg for arg in template_args]
-        lines.append('template <' + ', '.join(template_decls) + '>')
-        parent_name += '<' + ', '.join(template_args) + '>'
-
-      # Add the class prolog.
-      lines.append('class Mock%s : public %s {'  # }
-                   % (class_name, parent_name))
-      lines.append('%spublic:' % (' ' * (_INDENT // 2)))
-
-      # Add all the methods.
-      _GenerateMethods(lines, source, class_node)
-
-      # Close the class.
-      if lines:
-        # If there are no virtual methods, no need for a public label.
-        if len(lines) == 2:
-          del lines[-1]
-
-        # Only close the class if there really is a class.
-        lines.append('};')
-        lines.append('')  # Add an extra newline.
-
-      # Close the namespace.
-      if class_node.namespace:
-        for i in range(len(class_node.namespace)-1, -1, -1):
-          lines.append('}  // namespace %s' % class_node.namespace[i])
-        lines.append('')  # Add an extra newline.
+      yield node
+
 
+def _ReportMissingClasses(filename, desired_class_names,
+                          processed_class_names):
   if desired_class_names:
     missing_class_name_list = list(desired_class_names - processed_class_names)
     if missing_class_name_list:
@@ -184,9 +261,148 @@ def _GenerateMocks(filename, source, ast_list, desired_class_names):
   elif not processed_class_names:
     sys.stderr.write('No class found in %s\n' % filename)
 
+
+def _MockBlocks(filename, source, ast_list, desired_class_names, header_table):
+  file_metrics = metrics.current
+  processed_class_names = set()
+  line_count = 0  # Lines yielded so far.
+  for class_node in _SelectedClasses(ast_list, desired_class_names):
+    lines = []
+    processed_class_names.add(class_node.name)
+    # Add namespace before the class.
+    if class_node.namespace:
+      lines.extend(['namespace %s {' % n for n in class_node.namespace])  # }
+      lines.append('')
+
+    class_lines, method_count = _MockClassLines(filename, source, class_node,
+                                                header_table)
+    lines.extend(class_lines)
+    if file_metrics is not None:
+      file_metrics.Add('methods', method_count)
+
+    # Close the class.
+    if lines:
+      # If there are no virtual methods, no need for a public label.
+      if line_count + len(lines) == 2:
+        del lines[-1]
+
+      # Only close the class if there really is a class.
+      lines.append('};')
+      lines.append('')  # Add an extra newline.
+
+    # Close the namespace.
+    if class_node.namespace:
+      for i in range(len(class_node.namespace)-1, -1, -1):
+        lines.append('}  // namespace %s' % class_node.namespace[i])
+      lines.append('')  # Add an extra newline.
+
+    line_count += len(lines)
+    yield lines
+
+  _ReportMissingClasses(filename, desired_class_names, processed_class_names)
+
+
+def _GenerateMockClasses(filename, source, ast_list, desired_class_names,
+                         header_table=None):
+  """Yields (namespace, class name, lines) of each mock class.
+
+  Unlike the blocks of _GenerateMockBlocks(), the lines leave out the
+  namespace, so that mocks of classes of the same namespace can be put
+  together by gmock_batch.Amalgamate().
+  """
+  classes = _MockClasses(filename, source, ast_list, desired_class_names,
+                         header_table)
+  if metrics.current is not None:
+    classes = metrics.current.Count(classes, 'generate', 'classes')
+  return classes
+
+
+def _MockClasses(filename, source, ast_list, desired_class_names,
+                 header_table):
+  file_metrics = metrics.current
+  processed_class_names = set()
+  for class_node in _SelectedClasses(ast_list, desired_class_names):
+    processed_class_names.add(class_node.name)
+    lines, method_count = _MockClassLines(filename, source, class_node,
+                                          header_table)
+    if file_metrics is not None:
+      file_metrics.Add('methods', method_count)
+    if not method_count:
+      del lines[-1]  # No need for a public label.
+    lines.append('};')
+    yield tuple(class_node.namespace), class_node.name, lines
+
+  _ReportMissingClasses(filename, desired_class_names, processed_class_names)
+
+
+def _GenerateMocks(filename, source, ast_list, desired_class_names,
+                   header_table=None):
+  lines = []
+  for block in _GenerateMockBlocks(filename, source, ast_list,
+                                   desired_class_names, header_table):
+    lines.extend(block)
   return lines
 
 
+def MockSource(filename, source, desired_class_names=None, cache=None,
+               errors=None):
+  """Returns (text, set of class names mocked) of the mocks of source.
+
+  For programs embedding the generator, such as NewClass.py --stdio.  The
+  parser raises on code it cannot parse, unless errors is a list: the
+  declarations that cannot be parsed are then skipped and an
+  ast.ParseError, with the line and token, is appended for each.
+  """
+  nodes = []
+  lines = _GenerateMocks(filename, source, _Recorded(
+      ast.GenerateSource(source, filename, desired_class_names, cache,
+                         errors),
+      nodes), desired_class_names)
+  class_names = set([node.name for node in
+                     _SelectedClasses(nodes, desired_class_names)])
+  return '\n'.join(lines), class_names
+
+
+def _GeneratorVersion():
+  global _generator_version
+  if _generator_version is None:
+    _generator_version = disk_cache.HashKey(
+        ast.ParserVersion(),
+        disk_cache.ModulesKey(sys.modules[__name__], headers))
+  return _generator_version
+
+
+def _OutputKey(source, mode, desired_class_names, macros):
+  """Returns the key of the mocks of source in the output cache.
+
+  mode names the shape of the mocks, see gmock_batch._GenerateMocks().
+  """
+  if macros is not None:
+    macros = sorted(macros.items())
+  return disk_cache.HashKey(_GeneratorVersion(), source, mode,
+                            ' '.join(sorted(desired_class_names or ())),
+                            str(_INDENT), repr(macros))
+
+
+def _Recorded(items, recorded):
+  """Yields items, appending each of them to recorded."""
+  for item in items:
+    recorded.append(item)
+    yield item
+
+
+def _WriteMocks(output, blocks):
+  """Writes blocks of lines as they are produced, joined by newlines."""
+  file_metrics = metrics.current
+  separator = ''
+  for block in blocks:
+    if file_metrics is None:
+      output.write(separator + '\n'.join(block))
+    else:
+      file_metrics.Write(output, separator + '\n'.join(block))
+    separator = '\n'
+
+
 def main(argv=sys.argv):
   if len(argv) < 2:
     sys.stderr.write('Google Mock Class Generator v%s\n\n' %
@@ -202,25 +418,259 @@ def main(argv=sys.argv):
   except:
     sys.stderr.write('Unable to use indent of %s\n' % os.environ.get('INDENT'))
 
-  filename = argv[1]
-  desired_class_names = None  # None means all classes in the source file.
-  if len(argv) >= 3:
-    desired_class_names = set(argv[2:])
+  parser = argparse.ArgumentParser(prog=os.path.basename(argv[0]))
+  parser.add_argument('--no-cache', action='store_true',
+                      help='do not read or write the parsed header cache')
+  parser.add_argument('-I', '--include-root', action='append', default=[],
+                      dest='include_roots', metavar='DIR',
+                      help='directory searched for headers of base classes')
+  parser.add_argument('--index', metavar='FILE',
+                      help='class index used to find the header of each class')
+  parser.add_argument('--compile-commands', metavar='FILE',
+                      help='mock the headers of the project described by '
+                      'the compilation database FILE, evaluating their '
+                      'conditionals with its -D and -U flags')
+  parser.add_argument('-o', '--output', metavar='PATTERN',
+                      help='write mocks to files named by PATTERN, where '
+                      '{Class} is the class and {Header} the header name; '
+                      'without {Class} there is one file per header')
+  parser.add_argument('--amalgamate', metavar='FILE',
+                      help='write all mocks into the single header FILE, or '
+                      'one per directory of the headers with {Module} in '
+                      'FILE')
+  parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                      help='number of processes parsing headers')
+  parser.add_argument('--pipeline', action='store_true',
+                      help='read and write headers in threads while the '
+                      'worker processes parse and generate, and print the '
+                      'throughput of each stage')
+  parser.add_argument('--io-threads', type=int, default=4, metavar='N',
+                      help='number of threads reading and of threads '
+                      'writing with --pipeline')
+  parser.add_argument('--queue-size', type=int, metavar='N',
+                      help='headers queued between two stages of '
+                      '--pipeline, 2 per job by default')
+  parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                      help='give up on a header after SECONDS of wall time '
+                      'and report it as a failure')
+  parser.add_argument('--memory-limit', type=int, metavar='MB',
+                      help='give up on a header when its worker process '
+                      'grows by more than MB megabytes')
+  parser.add_argument('--recover', action='store_true',
+                      help='skip declarations that cannot be parsed, up to '
+                      'the next ; or matching }, report them and mock the '
+                      'classes that could be parsed')
+  parser.add_argument('--profile', nargs='?', metavar='FILE',
+                      const=profiling.DefaultPath(argv[0]),
+                      help='run under cProfile, write the profile to FILE '
+                      'and print a summary by phase; worker processes '
+                      'started by -j are not profiled')
+  parser.add_argument('--metrics-json', metavar='FILE',
+                      help='write counters and timings of every header as '
+                      'JSON to FILE, - for stderr')
+  parser.add_argument('--trace', metavar='FILE',
+                      help='write a Chrome trace of the time spent on every '
+                      'header in each process to FILE')
+  parser.add_argument('--memprofile', action='store_true',
+                      help='run tokenizing, parsing and generating one after '
+                      'the other under tracemalloc and print the memory '
+                      'each of them uses')
+  parser.add_argument('--metrics-top', type=int, default=10, metavar='N',
+                      help='number of slowest headers listed in the metrics')
+  parser.add_argument('names', nargs='*',
+                      metavar='header-file.h|directory|ClassName')
+  # Inputs and class names are told apart by their position only: the
+  # arguments before -- are inputs, without -- only the first one is.
+  argv = argv[1:]
+  class_names = None
+  if '--' in argv:
+    separator = argv.index('--')
+    argv, class_names = argv[:separator], argv[separator + 1:]
+  args = parser.parse_args(argv)
+  if class_names is not None:
+    args.inputs, args.class_names = args.names, class_names
+  elif args.index or args.compile_commands:
+    args.inputs, args.class_names = [], args.names
+  else:
+    args.inputs, args.class_names = args.names[:1], args.names[1:]
+  for name in args.class_names:
+    if not _CLASS_NAME.match(name):
+      parser.error('%s is not a class name; give several headers or '
+                   'directories before -- and the class names after it' % name)
+  if args.compile_commands and args.inputs:
+    parser.error('--compile-commands cannot be used with headers')
+  if not args.inputs and not args.index and not args.compile_commands:
+    parser.error('a header file, --index or --compile-commands is required')
+  if args.output and args.amalgamate:
+    parser.error('-o and --amalgamate cannot be used together')
+  if (args.timeout or args.memory_limit) and not budget.Supported():
+    sys.stderr.write('--timeout and --memory-limit are not supported on '
+                     'this system.\n')
+    return 1
+
+  if args.profile:
+    return profiling.Profile(lambda: _Run(args), args.profile)
+  return _Run(args)
+
+
+def _Run(args):
+  # {header path: macros} of the headers of --compile-commands.
+  args.header_macros = {}
+  if args.compile_commands:
+    headers_to_mock = _ProjectHeaders(args)
+    if headers_to_mock is None:
+      return 1
+  elif not args.inputs:
+    headers_to_mock = _FindHeaders(args.index, args.class_names)
+    if headers_to_mock is None:
+      return 1
+  else:
+    # None means all classes in the source file.
+    desired_class_names = set(args.class_names) or None
+    headers_to_mock = [(path, desired_class_names)
+                       for path in utils.FindHeaders(args.inputs)]
+
+  if args.memprofile:
+    from cpp import memprofile
+    return memprofile.Run(headers_to_mock, args)
+
+  if (args.output or args.amalgamate or args.pipeline or args.jobs > 1 or
+      len(headers_to_mock) != 1 or
+      not (args.inputs or args.class_names) or
+      (args.inputs and os.path.isdir(args.inputs[0])) or
+      args.timeout or args.memory_limit):
+    from cpp import gmock_batch
+    return gmock_batch.Run(headers_to_mock, args, _INDENT)
+
+  (filename, desired_class_names), = headers_to_mock
+  if not args.metrics_json and not args.trace:
+    return _MockFile(filename, desired_class_names, args)
+  run_metrics = metrics.RunMetrics()
+  metrics.StartFile(filename)
+  try:
+    return _MockFile(filename, desired_class_names, args)
+  finally:
+    run_metrics.Add(metrics.EndFile())
+    if args.metrics_json:
+      run_metrics.Write(args.metrics_json, args.metrics_top)
+    if args.trace:
+      run_metrics.WriteTrace(args.trace)
+
+
+def _MockFile(filename, desired_class_names, args):
+  cache = None
+  if not args.no_cache:
+    cache = ast.AstCache()
+  header_table = None
+  if args.include_roots:
+    header_table = headers.HeaderTable(args.include_roots, cache,
+                                       args.header_macros)
+
   source = utils.ReadFile(filename)
   if source is None:
+    metrics.RecordError('unable to read file')
     return 1
 
-  builder = ast.BuilderFromSource(source, filename)
+  macros = args.header_macros.get(os.path.abspath(filename))
+  mocks_cache = key = None
+  if cache is not None and header_table is None:
+    # With -I mocks depend on other headers too.
+    mocks_cache = output_cache.OutputCache()
+    key = _OutputKey(source, 'header', desired_class_names, macros)
+    mocks = output_cache.Get(mocks_cache, key)
+    if mocks is not None:
+      if metrics.current is not None:
+        metrics.current.cached = True
+        metrics.current.Add('classes', len(mocks))
+      _WriteMocks(sys.stdout, [lines for unused_namespace, unused_name, lines
+                               in mocks])
+      _ReportMissingClasses(filename, desired_class_names,
+                            set([mock[1] for mock in mocks]))
+      return
+
+  parse_class_names = desired_class_names
+  if header_table is not None:
+    # Base classes can be defined anywhere in the file.
+    parse_class_names = None
+  parse_errors = None
+  if args.recover:
+    parse_errors = []
   try:
-    entire_ast = filter(None, builder.Generate())
+    # Nodes are parsed lazily, and each mock is written as soon as its
+    # class has been parsed, so only one class is held at a time.  A header
+    # failing half way leaves the mocks of the classes before it.
+    entire_ast = ast.GenerateSource(source, filename, parse_class_names,
+                                    cache, parse_errors, macros)
+    if header_table is not None:
+      entire_ast = list(entire_ast)
+      header_table.Add(filename, source, entire_ast)
+    nodes = []
+    blocks = []
+    if key is not None:
+      # The output cache needs all of them.
+      entire_ast = _Recorded(entire_ast, nodes)
+    mock_blocks = _GenerateMockBlocks(filename, source, entire_ast,
+                                      desired_class_names, header_table)
+    if key is not None:
+      mock_blocks = _Recorded(mock_blocks, blocks)
+    _WriteMocks(sys.stdout, mock_blocks)
+    if key is not None and not parse_errors:
+      class_nodes = _SelectedClasses(nodes, desired_class_names)
+      output_cache.Put(mocks_cache, key,
+                       [(list(node.namespace), node.name, lines)
+                        for node, lines in zip(class_nodes, blocks)])
+    if parse_errors:
+      sys.stdout.flush()
+      sys.stderr.write('Skipped %d declaration(s) that could not be parsed.\n'
+                       % len(parse_errors))
   except KeyboardInterrupt:
     return
   except:
     # An error message was already printed since we couldn't parse.
+    metrics.RecordError('%s: %s' % (sys.exc_info()[0].__name__,
+                                    sys.exc_info()[1]))
+    sys.stdout.flush()
     sys.exit(1)
-  else:
-    lines = _GenerateMocks(filename, source, entire_ast, desired_class_names)
-    sys.stdout.write('\n'.join(lines))
+
+
+def _ProjectHeaders(args):
+  """Returns [(header, set(class_name, ...) or None), ...] of a compilation
+  database, recording the macros of each header in args.header_macros."""
+  try:
+    commands = compile_commands.Load(args.compile_commands)
+  except (IOError, ValueError, KeyError, TypeError):
+    sys.stderr.write('Unable to read %s: %s\n' % (args.compile_commands,
+                                                  sys.exc_info()[1]))
+    return None
+  project_headers = compile_commands.ProjectHeaders(commands)
+  if not project_headers:
+    sys.stderr.write('No header found in %s\n' % args.compile_commands)
+    return None
+  args.header_macros = dict(project_headers)
+  desired_class_names = set(args.class_names) or None
+  return [(header, desired_class_names) for header, unused_macros in
+          project_headers]
+
+
+def _FindHeaders(index_filename, class_names):
+  """Returns [(header, set(class_name, ...)), ...] using a class index."""
+  try:
+    index = class_index.ClassIndex(index_filename)
+  except class_index.IndexFileError as error:
+    sys.stderr.write('%s\n' % error)
+    return None
+  try:
+    class_names_by_header = {}
+    for name in class_names:
+      header = index.FindHeader(name)
+      if header is None:
+        sys.stderr.write('Class not found in %s: %s\n' % (index_filename, name))
+        return None
+      # The AST only knows the unqualified class name.
+      class_names_by_header.setdefault(header, set()).add(name.split('::')[-1])
+  finally:
+    index.Close()
+  return sorted(class_names_by_header.items())
 
 
 if __name__ == '__main__':
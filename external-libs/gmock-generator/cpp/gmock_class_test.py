@@ -20,15 +20,21 @@
 __author__ = 'nnorwitz@google.com (Neal Norwitz)'
 
 
+import io
+import json
 import os
+import shutil
 import sys
+import tempfile
 import unittest
 
 # Allow the cpp imports below to work when run as a standalone script.
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from cpp import ast
+from cpp import budget
 from cpp import gmock_class
+from cpp import headers
 
 
 class TestCase(unittest.TestCase):
@@ -314,13 +320,14 @@ class Foo {
 
 class GenerateMocksTest(TestCase):
 
-  def GenerateMocks(self, cpp_source):
+  def GenerateMocks(self, cpp_source, desired_class_names=None):
     """Convert C++ source to complete Google Mock output source."""
     # <test> is a pseudo-filename, it is not read or written.
     filename = '<test>'
-    builder = ast.BuilderFromSource(cpp_source, filename)
+    builder = ast.BuilderFromSource(cpp_source, filename, desired_class_names)
     ast_list = list(builder.Generate())
-    lines = gmock_class._GenerateMocks(filename, cpp_source, ast_list, None)
+    lines = gmock_class._GenerateMocks(filename, cpp_source, ast_list,
+                                       desired_class_names)
     return '\n'.join(lines)
 
   def testNamespaces(self):
@@ -462,5 +469,498 @@ void(const FooType& test_arg));
     self.assertEqualIgnoreLeadingWhitespace(
         expected, self.GenerateMocks(source))
 
+  def testDesiredClassStopsParsing(self):
+    source = """
+class Skipped {
+ public:
+  virtual void Foo();
+};
+class Test {
+ public:
+  virtual void Bar();
+};
+class Unparsed {
+ public:
+  @ This would not tokenize.
+};
+"""
+    expected = """\
+class MockTest : public Test {
+public:
+MOCK_METHOD0(Bar,
+void());
+};
+"""
+    self.assertEqualIgnoreLeadingWhitespace(
+        expected, self.GenerateMocks(source, set(['Test'])))
+
+  def testUndesiredClassBodyIsSkipped(self):
+    source = """
+class Skipped {
+ public:
+  virtual void Foo();
+};
+class Test {
+};
+"""
+    builder = ast.BuilderFromSource(source, '<test>', set(['Test']))
+    skipped, test = list(builder.Generate())
+    self.assertEqual('Skipped', skipped.name)
+    self.assertEqual([], skipped.body)
+    self.assertEqual('Test', test.name)
+
+  def testMockSource(self):
+    source = """
+class A { virtual void F(); };
+class B { virtual int G() const; };
+"""
+    stderr = sys.stderr
+    sys.stderr = open(os.devnull, 'w')
+    try:
+      text, class_names = gmock_class.MockSource('<test>', source,
+                                                 set(['B', 'C']))
+    finally:
+      sys.stderr.close()
+      sys.stderr = stderr
+    self.assertEqual(set(['B']), class_names)
+    self.assertEqualIgnoreLeadingWhitespace(
+        'class MockB : public B {\npublic:\nMOCK_CONST_METHOD0(G,\n'
+        'int());\n};\n', text)
+
+
+class InheritedMethodsTest(TestCase):
+
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def WriteHeader(self, relative_path, source):
+    path = os.path.join(self.root, relative_path)
+    if not os.path.isdir(os.path.dirname(path)):
+      os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as fp:
+      fp.write(source)
+    return path
+
+  def GenerateMocks(self, filename):
+    source = open(filename).read()
+    ast_list = ast.ParseSource(source, filename)
+    header_table = headers.HeaderTable([self.root])
+    lines = gmock_class._GenerateMocks(filename, source, ast_list, None,
+                                       header_table)
+    return '\n'.join(lines)
+
+  def testInheritsAcrossIncludes(self):
+    self.WriteHeader('base/IRoot.h', """
+namespace base {
+class IRoot {
+ public:
+  virtual void Reset() = 0;
+  virtual int Size(const Foo& foo) const = 0;
+};
+}  // namespace base
+""")
+    self.WriteHeader('base/IMiddle.h', """
+#include "IRoot.h"
+namespace base {
+class IMiddle : public IRoot {
+ public:
+  virtual int Size(const Foo& f) const override;
+  virtual void Grow(int by) = 0;
+};
+}  // namespace base
+""")
+    filename = self.WriteHeader('app/ITest.h', """
+#include <base/IMiddle.h>
+class ITest : public base::IMiddle {
+ public:
+  virtual void Grow(int by) override;
+};
+""")
+    expected = """\
+class MockITest : public ITest {
+public:
+MOCK_METHOD1(Grow,
+void(int by));
+MOCK_CONST_METHOD1(Size,
+int(const Foo& f));
+MOCK_METHOD0(Reset,
+void());
+};
+"""
+    self.assertEqualIgnoreLeadingWhitespace(
+        expected, self.GenerateMocks(filename))
+
+  def testUnknownAndCyclicBasesAreIgnored(self):
+    filename = self.WriteHeader('ITest.h', """
+#include "ITest.h"
+class ITest : public ITest, public Unknown {
+ public:
+  virtual void Foo() = 0;
+};
+""")
+    expected = """\
+class MockITest : public ITest {
+public:
+MOCK_METHOD0(Foo,
+void());
+};
+"""
+    self.assertEqualIgnoreLeadingWhitespace(
+        expected, self.GenerateMocks(filename))
+
+  def testDeepHierarchy(self):
+    depth = sys.getrecursionlimit() + 100
+    source = ['class I0 {\n public:\n  virtual void F0() = 0;\n};\n']
+    for level in range(1, depth):
+      source.append('class I%d : public I%d {\n public:\n'
+                    '  virtual void F%d() = 0;\n};\n'
+                    % (level, level - 1, level))
+    filename = self.WriteHeader('IDeep.h', ''.join(source))
+    header_table = headers.HeaderTable([self.root])
+    nodes = header_table.Parse(filename)[1]
+    methods = header_table.InheritedMethods(filename, nodes[-1])
+    self.assertEqual(['F%d' % level for level in range(depth - 2, -1, -1)],
+                     [node.name for unused_source, node in methods])
+
+  def testSkipsWhatCannotBeParsed(self):
+    self.WriteHeader('IBase.h', """
+class IBase {
+ public:
+  bool Broken(;
+  virtual void Reset() = 0;
+};
+""")
+    filename = self.WriteHeader('ITest.h', """
+#include "IInvalid.h"
+#include "IBase.h"
+class ITest : public IBase {
+ public:
+  virtual void Foo() = 0;
+};
+""")
+    self.WriteHeader('IInvalid.h', '`')
+    stderr = sys.stderr
+    sys.stderr = io.StringIO()
+    try:
+      text = self.GenerateMocks(filename)
+      errors = sys.stderr.getvalue()
+    finally:
+      sys.stderr = stderr
+    self.assertIn('MOCK_METHOD0(Reset', text)
+    self.assertIn('Skipped declaration at %s:4:' %
+                  os.path.join(self.root, 'IBase.h'), errors)
+    self.assertIn('Skipped header %s: unexpected token' %
+                  os.path.join(self.root, 'IInvalid.h'), errors)
+
+
+class BatchTest(TestCase):
+
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.stderr = sys.stderr
+    sys.stderr = open(os.devnull, 'w')
+
+  def tearDown(self):
+    sys.stderr.close()
+    sys.stderr = self.stderr
+    shutil.rmtree(self.root)
+
+  def WriteHeader(self, filename, source):
+    path = os.path.join(self.root, 'include', filename)
+    if not os.path.isdir(os.path.dirname(path)):
+      os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as fp:
+      fp.write(source)
+    return path
+
+  def Run(self, *args):
+    return gmock_class.main(['gmock_gen.py', '--no-cache'] + list(args))
+
+  def testOneFilePerClass(self):
+    self.WriteHeader('a.h', 'class A { virtual void F(); };\n'
+                     'class B { virtual void G(); };')
+    self.WriteHeader('sub/c.h', 'class C { virtual int H() const; };')
+    pattern = os.path.join(self.root, 'mocks', 'Mock{Class}.h')
+    self.assertEqual(0, self.Run('-j', '2', '-o', pattern,
+                                 os.path.join(self.root, 'include')))
+    self.assertEqual(['MockA.h', 'MockB.h', 'MockC.h'],
+                     sorted(os.listdir(os.path.join(self.root, 'mocks'))))
+    mock = open(os.path.join(self.root, 'mocks', 'MockC.h')).read()
+    self.assertEqualIgnoreLeadingWhitespace(
+        'class MockC : public C {\npublic:\nMOCK_CONST_METHOD0(H,\n'
+        'int());\n};\n', mock)
+
+  def testOneFilePerHeaderAndErrorSummary(self):
+    good = self.WriteHeader('good.h', 'class A { virtual void F(); };\n'
+                            'class B { virtual void G(); };')
+    bad = self.WriteHeader('bad.h', 'class Bad { @ };')
+    pattern = os.path.join(self.root, 'mocks', 'mock_{Header}.h')
+    self.assertEqual(1, self.Run('-o', pattern, good, bad, '--', 'A', 'B'))
+    self.assertEqual(['mock_good.h'],
+                     os.listdir(os.path.join(self.root, 'mocks')))
+    mock = open(os.path.join(self.root, 'mocks', 'mock_good.h')).read()
+    self.assertTrue('class MockA' in mock and 'class MockB' in mock, mock)
+
+  def testFailedHeaderWritesWholeClasses(self):
+    header = self.WriteHeader('a.h', 'class A { virtual void F(); };\n'
+                              'class Bad { bool Broken(; };')
+    stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+      self.assertRaises(SystemExit, self.Run, header)
+      output = sys.stdout.getvalue()
+    finally:
+      sys.stdout = stdout
+    # The mock of A is written before Bad is parsed.
+    self.assertTrue(output.startswith('class MockA : public A {'), output)
+    self.assertTrue(output.endswith('};\n'), output)
+    self.assertFalse('Bad' in output, output)
+
+  def testFailedHeaderKeepsWholeFiles(self):
+    header = self.WriteHeader('a.h', 'class A { virtual void F(); };\n'
+                              'class Bad { bool Broken(; };')
+    # Each class file is written as soon as its mock is generated.
+    pattern = os.path.join(self.root, 'mocks', 'Mock{Class}.h')
+    self.assertEqual(1, self.Run('-o', pattern, header))
+    self.assertEqual(['MockA.h'], os.listdir(os.path.join(self.root, 'mocks')))
+    # The file of the whole header is removed.
+    pattern = os.path.join(self.root, 'mocks', 'mock_{Header}.h')
+    self.assertEqual(1, self.Run('-o', pattern, header))
+    self.assertEqual(['MockA.h'], os.listdir(os.path.join(self.root, 'mocks')))
+
+  def testClassNamesAreNotInputs(self):
+    header = self.WriteHeader('a.h', 'class A { virtual void F(); };\n'
+                              'class B { virtual void G(); };')
+    pattern = os.path.join(self.root, 'mocks', 'Mock{Class}.h')
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(header))
+    try:
+      # A file named like the class is still a class name.
+      self.WriteHeader('A', 'class C { virtual void H(); };')
+      self.assertEqual(0, self.Run('-o', pattern, header, 'A'))
+      self.assertEqual(['MockA.h'],
+                       os.listdir(os.path.join(self.root, 'mocks')))
+      # Several inputs need --.
+      self.assertRaises(SystemExit, self.Run, '-o', pattern, header, 'a.h')
+    finally:
+      os.chdir(cwd)
+
+  def testMetricsJson(self):
+    good = self.WriteHeader('good.h', 'class A {\n virtual void F();\n'
+                            ' virtual int G(int x) const = 0;\n};')
+    bad = self.WriteHeader('bad.h', 'class Bad { @ };')
+    report = os.path.join(self.root, 'metrics.json')
+    pattern = os.path.join(self.root, 'mocks', 'mock_{Header}.h')
+    self.assertEqual(1, self.Run('--metrics-json', report, '--metrics-top',
+                                 '1', '-o', pattern, good, bad, '--'))
+    with open(report) as fp:
+      report = json.load(fp)
+    files = dict([(f['filename'], f) for f in report['files']])
+    self.assertEqual(None, files[good]['error'])
+    self.assertEqual(1, files[good]['classes'])
+    self.assertEqual(2, files[good]['methods'])
+    self.assertEqual(os.path.getsize(good), files[good]['bytes_read'])
+    self.assertEqual(os.path.getsize(pattern.format(Header='good')),
+                     files[good]['bytes_written'])
+    self.assertTrue(files[good]['tokens'] > 0 and files[good]['nodes'] > 0)
+    self.assertNotEqual(None, files[bad]['error'])
+    self.assertEqual(2, report['summary']['files'])
+    self.assertEqual(1, report['summary']['failures'])
+    self.assertEqual(1, len(report['slowest']))
+
+  def testTrace(self):
+    self.WriteHeader('a.h', 'class A { virtual void F(); };')
+    self.WriteHeader('b.h', 'class B { virtual void G(); };')
+    trace = os.path.join(self.root, 'trace.json')
+    pattern = os.path.join(self.root, 'mocks', 'Mock{Class}.h')
+    self.assertEqual(0, self.Run('-j', '2', '--trace', trace, '-o', pattern,
+                                 os.path.join(self.root, 'include')))
+    with open(trace) as fp:
+      events = json.load(fp)['traceEvents']
+    files = [event for event in events if event.get('cat') == 'file']
+    self.assertEqual(['a.h', 'b.h'], sorted([event['name'] for event in files]))
+    worker_pids = set([event['pid'] for event in files])
+    self.assertFalse(os.getpid() in worker_pids)
+    phases = set([event['name'] for event in events
+                  if event.get('cat') == 'phase'])
+    self.assertTrue(set(['read', 'tokenize', 'parse', 'generate']) <= phases)
+
+
+  def testRecover(self):
+    header = self.WriteHeader('mixed.h', 'class A {\n virtual void F();\n'
+                              ' bool Broken(;\n};\nclass B : { };\n'
+                              'class C { virtual int G() const; };')
+    report = os.path.join(self.root, 'metrics.json')
+    pattern = os.path.join(self.root, 'mocks', 'Mock{Class}.h')
+    self.assertEqual(1, self.Run('-o', pattern, header))
+    self.assertFalse(os.path.exists(os.path.join(self.root, 'mocks')))
+    self.assertEqual(0, self.Run('--recover', '--metrics-json', report, '-o',
+                                 pattern, header))
+    self.assertEqual(['MockA.h', 'MockC.h'],
+                     sorted(os.listdir(os.path.join(self.root, 'mocks'))))
+    with open(report) as fp:
+      report = json.load(fp)
+    parse_errors = report['files'][0]['parse_errors']
+    self.assertEqual([(3, 'bool', 'A'), (5, 'class', None)],
+                     [(e['line'], e['token'], e['in_class'])
+                      for e in parse_errors])
+    self.assertEqual(2, report['summary']['parse_errors'])
+
+  def testCompileCommands(self):
+    self.WriteHeader('view.h', '#include "model.h"\n'
+                     'class View {\n'
+                     '#if defined(USE_QT) && QT_VERSION >= 5\n'
+                     ' virtual void Paint(QPainter* p);\n'
+                     '#else\n'
+                     ' virtual void Paint();\n'
+                     '#endif\n'
+                     '};')
+    self.WriteHeader('model.h', 'class Model {\n'
+                     '#ifdef USE_QT\n virtual void Qt();\n#endif\n'
+                     '#ifdef DEBUG\n virtual void Dump();\n#endif\n};')
+    for name in ('a.cc', 'b.cc'):
+      with open(os.path.join(self.root, name), 'w') as fp:
+        fp.write('#include "include/view.h"\n')
+    database = os.path.join(self.root, 'compile_commands.json')
+    with open(database, 'w') as fp:
+      json.dump([{'directory': self.root, 'file': 'a.cc',
+                  'command': 'c++ -DUSE_QT -DQT_VERSION=5 -DDEBUG -c a.cc'},
+                 {'directory': self.root, 'file': 'b.cc',
+                  'command': 'c++ -DUSE_QT -DQT_VERSION=5 -c b.cc'}], fp)
+    pattern = os.path.join(self.root, 'mocks', 'Mock{Class}.h')
+    self.assertEqual(0, self.Run('--compile-commands', database, '-o',
+                                 pattern))
+    self.assertEqual(['MockModel.h', 'MockView.h'],
+                     sorted(os.listdir(os.path.join(self.root, 'mocks'))))
+    mock = open(os.path.join(self.root, 'mocks', 'MockView.h')).read()
+    self.assertEqualIgnoreLeadingWhitespace(
+        'class MockView : public View {\npublic:\nMOCK_METHOD1(Paint,\n'
+        'void(QPainter* p));\n};\n', mock)
+    # DEBUG is defined by a.cc only, so both branches are kept.
+    mock = open(os.path.join(self.root, 'mocks', 'MockModel.h')).read()
+    self.assertEqualIgnoreLeadingWhitespace(
+        'class MockModel : public Model {\npublic:\nMOCK_METHOD0(Qt,\n'
+        'void());\nMOCK_METHOD0(Dump,\nvoid());\n};\n', mock)
+
+  def testAmalgamate(self):
+    self.WriteHeader('ui/view.h', 'namespace app { namespace ui {\n'
+                     'class IView { virtual void Paint() = 0; };\n} }')
+    self.WriteHeader('ui/style.h', 'namespace app {\n'
+                     'class IModel { virtual int Size() const = 0; };\n'
+                     'namespace ui { class IStyle { virtual void F(); }; }\n'
+                     '}')
+    self.WriteHeader('core/clash.h', 'namespace app { namespace ui {\n'
+                     'class IView { virtual void Other(); };\n} }')
+    include = os.path.join(self.root, 'include')
+    amalgamated = os.path.join(self.root, 'mocks', 'mocks.h')
+    self.assertEqual(0, self.Run('-I', include, '--amalgamate', amalgamated,
+                                 os.path.join(include, 'ui')))
+    self.assertEqualIgnoreLeadingWhitespace(
+        '#ifndef MOCKS_H_\n#define MOCKS_H_\n\n#include "gmock/gmock.h"\n'
+        '#include "ui/style.h"\n#include "ui/view.h"\n\n'
+        'namespace app {\n\n'
+        'class MockIModel : public IModel {\npublic:\n'
+        'MOCK_CONST_METHOD0(Size,\nint());\n};\n\n'
+        'namespace ui {\n\n'
+        'class MockIStyle : public IStyle {\npublic:\n'
+        'MOCK_METHOD0(F,\nvoid());\n};\n\n'
+        'class MockIView : public IView {\npublic:\n'
+        'MOCK_METHOD0(Paint,\nvoid());\n};\n\n'
+        '}  // namespace ui\n}  // namespace app\n\n'
+        '#endif  // MOCKS_H_\n', open(amalgamated).read())
+
+    # Different mocks of the same class cannot be put together.
+    self.assertEqual(1, self.Run('--amalgamate', amalgamated, include))
+
+    pattern = os.path.join(self.root, 'mocks', 'mock_{Module}.h')
+    self.assertEqual(0, self.Run('--amalgamate', pattern,
+                                 os.path.join(include, 'ui'),
+                                 os.path.join(include, 'core'), '--'))
+    self.assertEqual(['mock_core.h', 'mock_ui.h', 'mocks.h'],
+                     sorted(os.listdir(os.path.join(self.root, 'mocks'))))
+    self.assertTrue('#include "../include/core/clash.h"\n' in
+                    open(os.path.join(self.root, 'mocks',
+                                      'mock_core.h')).read())
+
+  def testOutputCache(self):
+    header = self.WriteHeader('a.h', 'class A { virtual void F(); };\n'
+                              'class B { virtual void G(); };')
+    cache_dir = os.environ.get('CPPGEN_CACHE_DIR')
+    os.environ['CPPGEN_CACHE_DIR'] = os.path.join(self.root, 'cache')
+    report = os.path.join(self.root, 'metrics.json')
+    pattern = os.path.join(self.root, 'mocks', 'Mock{Class}.h')
+    def RunCached(*args):
+      self.assertEqual(0, gmock_class.main(
+          ['gmock_gen.py', '--metrics-json', report, '-o', pattern] +
+          list(args)))
+      with open(report) as fp:
+        return json.load(fp)['files'][0]['cached']
+    try:
+      self.assertFalse(RunCached(header))
+      mock = open(os.path.join(self.root, 'mocks', 'MockA.h')).read()
+      shutil.rmtree(os.path.join(self.root, 'mocks'))
+      self.assertTrue(RunCached(header))
+      self.assertEqual(mock,
+                       open(os.path.join(self.root, 'mocks', 'MockA.h')).read())
+      # Other options or sources are other entries.
+      self.assertFalse(RunCached(header, 'A'))
+      self.WriteHeader('a.h', 'class A { virtual void H(); };')
+      self.assertFalse(RunCached(header))
+    finally:
+      if cache_dir is None:
+        del os.environ['CPPGEN_CACHE_DIR']
+      else:
+        os.environ['CPPGEN_CACHE_DIR'] = cache_dir
+
+  def testPipeline(self):
+    for i in range(6):
+      self.WriteHeader('h%d.h' % i, 'class C%d { virtual void F(); };' % i)
+    bad = self.WriteHeader('bad.h', 'class Bad { @ };')
+    report = os.path.join(self.root, 'metrics.json')
+    pattern = os.path.join(self.root, 'mocks', 'Mock{Class}.h')
+    self.assertEqual(1, self.Run('--pipeline', '-j', '2', '--io-threads', '2',
+                                 '--queue-size', '1', '--metrics-json', report,
+                                 '-o', pattern,
+                                 os.path.join(self.root, 'include')))
+    self.assertEqual(['MockC%d.h' % i for i in range(6)],
+                     sorted(os.listdir(os.path.join(self.root, 'mocks'))))
+    with open(report) as fp:
+      report = json.load(fp)
+    files = dict([(f['filename'], f) for f in report['files']])
+    self.assertNotEqual(None, files[bad]['error'])
+    good = os.path.join(self.root, 'include', 'h0.h')
+    self.assertEqual(os.path.getsize(good), files[good]['bytes_read'])
+    self.assertEqual(os.path.getsize(pattern.format(Class='C0')),
+                     files[good]['bytes_written'])
+    stages = report['stages']
+    self.assertEqual(7, stages['read']['items'])
+    self.assertEqual(7, stages['mock']['items'])
+    self.assertEqual(6, stages['write']['items'])
+    self.assertEqual(report['summary']['bytes_written'],
+                     stages['write']['bytes'])
+
+  @unittest.skipUnless(budget.Supported(), 'budgets are not supported')
+  def testTimeout(self):
+    self.WriteHeader('a.h', 'class A { virtual void F(); };')
+    self.WriteHeader('huge.h', ''.join(['class H%d { virtual void F(); };\n' % i
+                                        for i in range(100000)]))
+    pattern = os.path.join(self.root, 'mocks', 'mock_{Header}.h')
+    report = os.path.join(self.root, 'metrics.json')
+    self.assertEqual(1, self.Run('--timeout', '0.5', '--metrics-json', report,
+                                 '-o', pattern,
+                                 os.path.join(self.root, 'include')))
+    self.assertEqual(['mock_a.h'],
+                     os.listdir(os.path.join(self.root, 'mocks')))
+    with open(report) as fp:
+      files = json.load(fp)['files']
+    errors = dict([(os.path.basename(f['filename']), f['error'])
+                   for f in files])
+    self.assertEqual({'a.h': None,
+                      'huge.h': 'exceeded the time budget of 0.5s'}, errors)
+
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Find classes and inherited methods across headers.
+
+Headers are located by following #include directives through a list of
+include roots, the same way a compiler's -I path works.
+"""
+
+
+import os
+import sys
+
+from cpp import ast
+from cpp import tokenize
+from cpp import utils
+
+
+_VIRTUAL = (ast.FUNCTION_VIRTUAL | ast.FUNCTION_PURE_VIRTUAL |
+            ast.FUNCTION_OVERRIDE)
+_CTOR_OR_DTOR = ast.FUNCTION_CTOR | ast.FUNCTION_DTOR
+
+
+def IsVirtualMethod(node):
+    """Returns bool if node is a virtual method other than a ctor or dtor."""
+    return (isinstance(node, ast.Function) and
+            bool(node.modifiers & _VIRTUAL) and
+            not node.modifiers & _CTOR_OR_DTOR)
+
+
+def MethodSignature(node):
+    """Returns a hashable key that is equal for overriding methods."""
+    parameters = []
+    for p in node.parameters:
+        t = p.type
+        parameters.append((tuple(t.modifiers), t.name, t.pointer,
+                           t.reference, t.array,
+                           tuple([a.name for a in t.templated_types])))
+    return node.name, tuple(parameters), bool(node.modifiers & ast.FUNCTION_CONST)
+
+
+def _SplitName(name):
+    parts = [part for part in name.split('::') if part]
+    return parts[:-1], parts[-1]
+
+
+class HeaderTable(object):
+    """Parses each header at most once and memoizes lookups into it.
+
+    Quoted includes are searched for next to the including file first
+    and then in include_roots; system includes only in include_roots.
+    Headers that cannot be found, read or tokenized are treated as empty,
+    and declarations that cannot be parsed are skipped; both are reported
+    on stderr.
+    Headers in macros, {path: {name: value or None}}, are parsed with
+    their conditionals evaluated, see compile_commands.ProjectHeaders().
+    """
+
+    def __init__(self, include_roots=(), cache=None, macros=None):
+        self.include_roots = [os.path.abspath(root) for root in include_roots]
+        self.cache = cache
+        self.macros = macros or {}
+        self._headers = {}          # path: (source, [Node, ...])
+        self._classes = {}          # path: {name: [Class, ...]}
+        self._includes = {}         # path: [path, ...]
+        self._found_classes = {}    # (path, name): (path, Class) or None
+        self._inherited = {}        # (path, start): [(source, Function), ...]
+
+    def Add(self, path, source, nodes):
+        """Records an already parsed file so it is not parsed again."""
+        self._headers[os.path.abspath(path)] = (source, nodes)
+
+    def Parse(self, path):
+        """Returns (source, [Node, ...]) for the file at path."""
+        path = os.path.abspath(path)
+        try:
+            return self._headers[path]
+        except KeyError:
+            pass
+        source = utils.ReadFile(path, False)
+        nodes = []
+        if source is None:
+            source = ''
+        else:
+            # Declarations that cannot be parsed are reported and skipped.
+            errors = []
+            try:
+                nodes = ast.ParseSource(source, path, cache=self.cache,
+                                        errors=errors,
+                                        macros=self.macros.get(path))
+            except tokenize.TokenizeError as error:
+                sys.stderr.write('Skipped header %s: %s\n' % (path, error))
+        self._headers[path] = (source, nodes)
+        return source, nodes
+
+    def _Classes(self, path):
+        try:
+            return self._classes[path]
+        except KeyError:
+            pass
+        classes = {}
+        for node in self.Parse(path)[1]:
+            if isinstance(node, ast.Class) and node.body is not None:
+                classes.setdefault(node.name, []).append(node)
+        self._classes[path] = classes
+        return classes
+
+    def _FindInclude(self, include, including_dir):
+        directories = self.include_roots
+        if not include.system:
+            directories = [including_dir] + directories
+        for directory in directories:
+            path = os.path.join(directory, include.filename)
+            if os.path.isfile(path):
+                return os.path.abspath(path)
+        return None
+
+    def Includes(self, path):
+        """Returns the paths of the headers included by path that exist."""
+        path = os.path.abspath(path)
+        try:
+            return self._includes[path]
+        except KeyError:
+            pass
+        including_dir = os.path.dirname(path)
+        includes = []
+        for node in self.Parse(path)[1]:
+            if isinstance(node, ast.Include):
+                include_path = self._FindInclude(node, including_dir)
+                if include_path is not None:
+                    includes.append(include_path)
+        self._includes[path] = includes
+        return includes
+
+    def FindClass(self, name, path):
+        """Returns (path, Class) for the definition of name seen from path.
+
+        The file itself is searched first, then its includes breadth
+        first.  Returns None if the class cannot be found.
+        """
+        path = os.path.abspath(path)
+        key = (path, name)
+        try:
+            return self._found_classes[key]
+        except KeyError:
+            pass
+        namespace, class_name = _SplitName(name)
+        result = None
+        visited = set([path])
+        pending = [path]
+        while pending and result is None:
+            next_pending = []
+            for header in pending:
+                for node in self._Classes(header).get(class_name, ()):
+                    if (not namespace or
+                        list(node.namespace[-len(namespace):]) == namespace):
+                        result = header, node
+                        break
+                if result is not None:
+                    break
+                for include in self.Includes(header):
+                    if include not in visited:
+                        visited.add(include)
+                        next_pending.append(include)
+            pending = next_pending
+        self._found_classes[key] = result
+        return result
+
+    def InheritedMethods(self, path, class_node):
+        """Returns [(source, Function), ...] inherited by class_node.
+
+        Only virtual methods are returned, the nearest declaration wins
+        and methods overridden in class_node are left out.  The source is
+        the text of the header each method was declared in.
+        """
+        own = set([MethodSignature(node) for node in class_node.body or ()
+                   if IsVirtualMethod(node)])
+        return [(source, node)
+                for source, node in self._BaseMethods(path, class_node)
+                if MethodSignature(node) not in own]
+
+    def _Bases(self, path, class_node):
+        # [(path, Class), ...] of the bases of class_node that are found.
+        bases = []
+        for base in class_node.bases or ():
+            found = self.FindClass(base.name, path)
+            if found is not None:
+                bases.append(found)
+        return bases
+
+    def _BaseMethods(self, path, class_node):
+        # The bases are resolved before the classes deriving from them with
+        # an explicit stack, so deep hierarchies do not recurse.  A base
+        # still being resolved, in a cyclic hierarchy, adds no methods.
+        root = (os.path.abspath(path), class_node)
+        resolving = set()
+        stack = [root]
+        while stack:
+            path, node = stack[-1]
+            key = (path, node.start)
+            if key in self._inherited:
+                stack.pop()
+                continue
+            bases = self._Bases(path, node)
+            if key not in resolving:
+                resolving.add(key)
+                pending = [base for base in bases
+                           if (base[0], base[1].start) not in self._inherited
+                           and (base[0], base[1].start) not in resolving]
+                if pending:
+                    stack.extend(reversed(pending))
+                    continue
+            methods = []
+            seen = set()
+            for base_path, base_node in bases:
+                base_source = self.Parse(base_path)[0]
+                candidates = [(base_source, base_method)
+                              for base_method in base_node.body
+                              if IsVirtualMethod(base_method)]
+                candidates.extend(self._inherited.get(
+                    (base_path, base_node.start), ()))
+                for source, method in candidates:
+                    signature = MethodSignature(method)
+                    if signature not in seen:
+                        seen.add(signature)
+                        methods.append((source, method))
+            self._inherited[key] = methods
+            resolving.discard(key)
+            stack.pop()
+        return self._inherited[(root[0], class_node.start)]
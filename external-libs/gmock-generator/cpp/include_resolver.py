@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Finds the header of include roots that defines a type.
+
+The headers under the include roots are scanned once with regular
+expressions for the classes, structs, unions and enums they define and the
+typedefs and aliases they declare; forward declarations are not
+definitions.  Types are known by their unqualified name, and a type
+defined by several headers resolves to the one named after it, if any.
+
+What was found in each header is kept in the output cache with its
+modification time and size, so a later run only reads the headers that
+changed since.  Building an IncludeResolver walks the roots; lookups are
+dictionary lookups, so one resolver serves every file of a batch.
+
+Usage:
+  python -m cpp.include_resolver include-root... -- TypeName...
+"""
+
+
+import os
+import re
+import sys
+
+from cpp import disk_cache
+from cpp import output_cache
+from cpp import utils
+
+
+# Bump when the scan finds something else.
+_SCAN_VERSION = '1'
+
+_COMMENT = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+
+# Definitions and declarations that make a name usable as a type.  Upper
+# case words between the keyword and the name are export macros.
+_DEFINITIONS = (
+    ('enum', re.compile(r'\benum(?:\s+(?:class|struct))?\s+(\w+)\s*'
+                        r'(?::[^;{}()]*)?\{')),
+    (None, re.compile(r'\b(class|struct|union)\s+(?:[A-Z][A-Z0-9_]*\s+)*'
+                      r'(\w+)\s*(?:final\s*)?(?::[^;{}()]*)?\{')),
+    ('typedef', re.compile(r'\btypedef\b[^;{}()]*?(\w+)\s*;')),
+    ('using', re.compile(r'\busing\s+(\w+)\s*=')),
+)
+
+
+def ScanSource(source):
+    """Returns [(name, kind), ...] of the types source defines.
+
+    kind is the keyword defining the type: class, struct, union, enum,
+    typedef or using.
+    """
+    source = _COMMENT.sub('', source)
+    types = []
+    enums = set()
+    for kind, pattern in _DEFINITIONS:
+        for match in pattern.finditer(source):
+            if kind is None:
+                # The class of an enum class is matched again.
+                if match.group(2) not in enums:
+                    types.append((match.group(2), match.group(1)))
+            else:
+                types.append((match.group(1), kind))
+                if kind == 'enum':
+                    enums.add(match.group(1))
+    return types
+
+
+class IncludeResolver(object):
+    """Types of the headers under include roots, by name."""
+
+    def __init__(self, include_roots, cache=None):
+        """
+        Args:
+          include_roots: directories searched for #include "..."
+          cache: DiskCache keeping the scans between runs, or None
+        """
+        self.include_roots = [os.path.abspath(root) for root in include_roots]
+        self._types = {}  # name: (path, kind)
+        for path, types in sorted(self._Scan(cache).items()):
+            for name, kind in types:
+                known = self._types.get(name)
+                # Prefer the header named after the type, then the first.
+                if known is None or (
+                        _Basename(path) == name and
+                        _Basename(known[0]) != name):
+                    self._types[name] = (path, kind)
+        self._key = None
+
+    def Key(self):
+        """Returns a HashKey() of what the resolver knows, for the keys of
+        code generated with it."""
+        if self._key is None:
+            self._key = disk_cache.HashKey(repr(sorted(self._types.items())),
+                                           *self.include_roots)
+        return self._key
+
+    def _Scan(self, cache):
+        """Returns {path: [(name, kind), ...]} of the headers of the roots."""
+        key = disk_cache.HashKey(_SCAN_VERSION, *self.include_roots)
+        scans = None
+        if cache is not None:
+            scans = output_cache.Get(cache, key)
+        if not isinstance(scans, dict):
+            scans = {}
+        result = {}
+        changed = False
+        for path in utils.FindHeaders(self.include_roots):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            scan = scans.get(path)
+            if scan is None or scan[:2] != [stat.st_mtime, stat.st_size]:
+                source = utils.ReadFile(path, False)
+                if source is None:
+                    continue
+                scan = [stat.st_mtime, stat.st_size,
+                        [list(item) for item in ScanSource(source)]]
+                changed = True
+            scans[path] = scan
+            result[path] = [tuple(item) for item in scan[2]]
+        if cache is not None and (changed or len(scans) != len(result)):
+            output_cache.Put(cache, key, dict([(path, scans[path])
+                                               for path in result]))
+        return result
+
+    def Find(self, type_name):
+        """Returns (header path, kind) of type_name or None.
+
+        type_name may be qualified, only its last part is looked up.
+        """
+        return self._types.get(type_name.split('::')[-1])
+
+    def IncludePath(self, type_name):
+        """Returns how to spell the header of type_name in an #include,
+        relative to its include root, or None."""
+        found = self.Find(type_name)
+        if found is None:
+            return None
+        path = found[0]
+        for root in sorted(self.include_roots, key=len, reverse=True):
+            if path.startswith(os.path.join(root, '')):
+                return os.path.relpath(path, root).replace(os.sep, '/')
+        return os.path.basename(path)
+
+
+def _Basename(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def main(argv=sys.argv):
+    if '--' not in argv:
+        sys.stderr.write(__doc__)
+        return 1
+    separator = argv.index('--')
+    resolver = IncludeResolver(argv[1:separator], output_cache.OutputCache())
+    for name in argv[separator + 1:]:
+        found = resolver.Find(name)
+        if found is None:
+            print('%s: not found' % name)
+        else:
+            print('%s: %s "%s"' % (name, found[1], resolver.IncludePath(name)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
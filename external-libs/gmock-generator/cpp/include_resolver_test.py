@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for cpp.include_resolver."""
+
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Allow the cpp imports below to work when run as a standalone script.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from cpp import disk_cache
+from cpp import include_resolver
+
+
+class ScanSourceTest(unittest.TestCase):
+
+    def testDefinitions(self):
+        source = """
+class Forward;
+// class Commented {};
+template <typename T> class EXPORT_API Widget final : public Base<T, int>
+{
+};
+struct Point { int x; };
+enum class Color : unsigned char { Red };
+enum Mode { On };
+typedef std::vector<Point> Points;
+typedef void (*Callback)(int);
+using Id = int;
+friend class Friend;
+"""
+        self.assertEqual([('Color', 'enum'), ('Mode', 'enum'),
+                          ('Widget', 'class'), ('Point', 'struct'),
+                          ('Points', 'typedef'), ('Id', 'using')],
+                         include_resolver.ScanSource(source))
+
+
+class IncludeResolverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.include = os.path.join(self.root, 'include')
+        self.cache = disk_cache.DiskCache(os.path.join(self.root, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def WriteHeader(self, filename, source):
+        path = os.path.join(self.include, filename)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as fp:
+            fp.write(source)
+        return path
+
+    def testFind(self):
+        widget = self.WriteHeader('ui/Widget.h', 'class Widget {};')
+        self.WriteHeader('ui/all.h', 'class Widget {};\nclass Panel {};')
+        resolver = include_resolver.IncludeResolver([self.include])
+        self.assertEqual((widget, 'class'), resolver.Find('ui::Widget'))
+        self.assertEqual('ui/Widget.h', resolver.IncludePath('Widget'))
+        self.assertEqual('ui/all.h', resolver.IncludePath('Panel'))
+        self.assertEqual(None, resolver.Find('Missing'))
+        self.assertEqual(None, resolver.IncludePath('Missing'))
+
+    def testCachedScan(self):
+        self.WriteHeader('a.h', 'struct A {};')
+        b = self.WriteHeader('b.h', 'struct B {};')
+        include_resolver.IncludeResolver([self.include], self.cache)
+        scans = []
+        scan_source = include_resolver.ScanSource
+        def RecordingScan(source):
+            scans.append(source)
+            return scan_source(source)
+        include_resolver.ScanSource = RecordingScan
+        try:
+            resolver = include_resolver.IncludeResolver([self.include],
+                                                        self.cache)
+            self.assertEqual([], scans)
+            self.assertEqual('a.h', resolver.IncludePath('A'))
+            self.WriteHeader('a.h', 'struct A2 {};')
+            os.remove(b)
+            resolver = include_resolver.IncludeResolver([self.include],
+                                                        self.cache)
+            self.assertEqual(['struct A2 {};'], scans)
+        finally:
+            include_resolver.ScanSource = scan_source
+        self.assertEqual(None, resolver.Find('A'))
+        self.assertEqual(None, resolver.Find('B'))
+        self.assertEqual('a.h', resolver.IncludePath('A2'))
+
+
+if __name__ == '__main__':
+    unittest.main()
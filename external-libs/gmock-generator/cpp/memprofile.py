@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Memory used by each stage of mocking a header, for --memprofile.
+
+Normally tokens, nodes and mocks are produced lazily and interleaved.
+Here the stages run one after the other so that tracemalloc snapshots
+taken between them show what each stage allocates: the token list, the
+AST and the generated lines.  The AST cache is not used.
+"""
+
+
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+from cpp import ast
+from cpp import gmock_class
+from cpp import headers
+from cpp import tokenize
+from cpp import utils
+
+
+STAGES = ('tokenize', 'parse', 'generate')
+
+# Objects counted after each stage, subclasses included.
+COUNTED_TYPES = (('Token', tokenize.Token), ('Function', ast.Function),
+                 ('Type', ast.Type), ('Parameter', ast.Parameter))
+
+
+class StageMemory(object):
+    """Memory after one stage."""
+
+    def __init__(self, name, current, peak, object_counts, top_sites):
+        self.name = name
+        self.current = current              # Bytes traced after the stage.
+        self.peak = peak                    # Most bytes traced during it.
+        self.object_counts = object_counts  # {type name: count}
+        self.top_sites = top_sites          # [tracemalloc.StatisticDiff]
+
+
+def CountObjects():
+    """Returns {type name: live instances} for COUNTED_TYPES."""
+    counts = dict([(name, 0) for name, unused_type in COUNTED_TYPES])
+    for obj in gc.get_objects():
+        for name, object_type in COUNTED_TYPES:
+            if isinstance(obj, object_type):
+                counts[name] += 1
+                break
+    return counts
+
+
+def ProfileSource(source, filename, desired_class_names=None,
+                  header_table=None, top=10, macros=None):
+    """Mocks the classes of source while tracing allocations.
+
+    macros decide the conditionals of source, see tokenize.GetTokens().
+
+    Returns:
+      ([StageMemory for each of STAGES], [line of the mocks, ...])
+    """
+    stages = []
+    directory = tempfile.mkdtemp(prefix='memprofile-')
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        # Snapshots are kept on disk so that they are not counted in the
+        # memory of the next stage.
+        def Snapshot(name):
+            gc.collect()
+            current, peak = tracemalloc.get_traced_memory()
+            if name is not None:
+                counts = CountObjects()
+            snapshot = tracemalloc.take_snapshot()
+            path = os.path.join(directory, '%d' % len(stages))
+            if name is not None:
+                previous = tracemalloc.Snapshot.load(path)
+                top_sites = snapshot.compare_to(previous, 'lineno')[:top]
+                stages.append(StageMemory(name, current, peak, counts,
+                                          top_sites))
+                del previous
+            snapshot.dump(os.path.join(directory, '%d' % len(stages)))
+            del snapshot
+            gc.collect()
+            tracemalloc.reset_peak()
+
+        Snapshot(None)
+
+        tokens = list(tokenize.GetTokens(source, macros))
+        Snapshot('tokenize')
+
+        parse_class_names = desired_class_names
+        if header_table is not None:
+            # Base classes can be defined anywhere in the file.
+            parse_class_names = None
+        builder = ast.AstBuilder(iter(tokens), filename,
+                                 desired_class_names=parse_class_names)
+        entire_ast = [node for node in builder.Generate() if node]
+        del builder, tokens
+        Snapshot('parse')
+
+        if header_table is not None:
+            header_table.Add(filename, source, entire_ast)
+        lines = gmock_class._GenerateMocks(filename, source, entire_ast,
+                                           desired_class_names, header_table)
+        Snapshot('generate')
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+        shutil.rmtree(directory)
+    return stages, lines
+
+
+def _MiB(size):
+    return '%.1f MiB' % (size / 1048576.0)
+
+
+def PrintReport(filename, stages, output=sys.stderr):
+    output.write('Memory profile of %s\n' % filename)
+    names = [name for name, unused_type in COUNTED_TYPES]
+    output.write('%-10s %12s %12s' % ('stage', 'current', 'peak') +
+                 ''.join([' %10s' % name for name in names]) + '\n')
+    for stage in stages:
+        output.write('%-10s %12s %12s' %
+                     (stage.name, _MiB(stage.current), _MiB(stage.peak)) +
+                     ''.join([' %10d' % stage.object_counts[name]
+                              for name in names]) + '\n')
+    output.write('Peak: %s\n' % _MiB(max([stage.peak for stage in stages])))
+    for stage in stages:
+        output.write('\nTop allocation sites, %s:\n' % stage.name)
+        for site in stage.top_sites:
+            frame = site.traceback[0]
+            output.write('  %+12d B %+9d blocks  %s:%d\n' %
+                         (site.size_diff, site.count_diff, frame.filename,
+                          frame.lineno))
+
+
+def Run(tasks, options, top=10):
+    """Mocks [(filename, set(class names) or None), ...] one at a time,
+    printing the mocks to stdout and a memory report per header to stderr.
+
+    Returns:
+      0 if every header was mocked, 1 otherwise.
+    """
+    header_table = None
+    if options.include_roots:
+        header_table = headers.HeaderTable(options.include_roots,
+                                           macros=options.header_macros)
+    status = 0
+    for filename, desired_class_names in tasks:
+        source = utils.ReadFile(filename)
+        if source is None:
+            status = 1
+            continue
+        try:
+            stages, lines = ProfileSource(source, filename,
+                                          desired_class_names, header_table,
+                                          top, options.header_macros.get(
+                                              os.path.abspath(filename)))
+        except KeyboardInterrupt:
+            raise
+        except Exception:
+            sys.stderr.write('%s: %s: %s\n' % (filename,
+                                               sys.exc_info()[0].__name__,
+                                               sys.exc_info()[1]))
+            status = 1
+            continue
+        if lines:
+            sys.stdout.write('\n'.join(lines) + '\n')
+        PrintReport(filename, stages)
+    return status
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for cpp.memprofile."""
+
+
+import io
+import os
+import sys
+import tracemalloc
+import unittest
+
+# Allow the cpp imports below to work when run as a standalone script.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from cpp import memprofile
+
+
+class ProfileSourceTest(unittest.TestCase):
+
+    def testStages(self):
+        source = ('class Foo {\n public:\n'
+                  '  virtual int Bar(int x, const std::string& s) = 0;\n'
+                  '  virtual void Baz() = 0;\n};\n')
+        stages, lines = memprofile.ProfileSource(source, 'foo.h', top=3)
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(list(memprofile.STAGES),
+                         [stage.name for stage in stages])
+        self.assertTrue('  MOCK_METHOD0(Baz,' in lines, lines)
+
+        tokenized, parsed, generated = stages
+        self.assertTrue(tokenized.object_counts['Token'] >= 27)
+        self.assertTrue(parsed.object_counts['Function'] >= 2)
+        self.assertTrue(parsed.object_counts['Parameter'] >= 2)
+        self.assertTrue(tokenized.peak > 0)
+        self.assertTrue(0 < len(generated.top_sites) <= 3)
+
+        output = io.StringIO()
+        memprofile.PrintReport('foo.h', stages, output)
+        self.assertTrue('Top allocation sites, parse:' in output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-file counters and phase timings for --metrics-json and --trace.
+
+While a file is processed, `current` holds its FileMetrics and the
+tokenizer, AST builder, mock generator and writers record into it.  The
+hooks only test `current` once per call, so there is next to no cost
+when metrics are off.
+
+The phases of a file are interleaved, tokens are produced while the AST
+is built and classes are parsed while mocks are written, so the time of
+each phase excludes the time of the phases nested in it.
+
+RunMetrics also writes the files of a run as a Chrome trace (the JSON
+trace event format read by chrome://tracing and Perfetto), one track per
+process.  Because of the interleaving, the phases of a file are drawn one
+after the other with their total time rather than where they happened.
+"""
+
+
+import json
+import os
+import sys
+import time
+
+
+PHASES = ('read', 'tokenize', 'parse', 'generate', 'write')
+COUNTERS = ('bytes_read', 'tokens', 'nodes', 'classes', 'methods',
+            'bytes_written')
+
+# FileMetrics of the file being processed, None when metrics are off.
+current = None
+
+_clock = time.perf_counter
+
+
+class _NullPhase(object):
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, unused_type, unused_value, unused_traceback):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase(object):
+
+    def __init__(self, file_metrics, phase):
+        self.file_metrics = file_metrics
+        self.phase = phase
+
+    def __enter__(self):
+        self.recorded = self.file_metrics._recorded
+        self.start = _clock()
+        return self.file_metrics
+
+    def __exit__(self, unused_type, unused_value, unused_traceback):
+        self.file_metrics._Record(self.phase, _clock() - self.start,
+                                  self.recorded)
+        return False
+
+
+class FileMetrics(object):
+    """Counters and seconds per phase of one input file."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.counts = dict([(counter, 0) for counter in COUNTERS])
+        self.seconds = dict([(phase, 0.0) for phase in PHASES])
+        self.cached = False
+        self.error = None
+        self.parse_errors = []  # ParseError.ToDict() of skipped declarations.
+        self.start = _clock()
+        self.end = None
+        self.pid = os.getpid()
+        self.start_time = time.time()  # Comparable between processes.
+        self._recorded = 0.0  # Seconds charged to any phase so far.
+
+    def _Record(self, phase, elapsed, recorded):
+        # Time charged while this phase ran belongs to nested phases.
+        own = elapsed - (self._recorded - recorded)
+        self.seconds[phase] += own
+        self._recorded += own
+
+    def Add(self, counter, value):
+        self.counts[counter] += value
+
+    def Phase(self, phase):
+        """Returns a context manager charging its time to phase."""
+        return _Phase(self, phase)
+
+    def Count(self, items, phase, counter=None):
+        """Yields items, charging the time spent producing them to phase.
+
+        Args:
+          items: iterable, typically a generator doing the actual work
+          phase: one of PHASES
+          counter: one of COUNTERS incremented per item or None
+        """
+        counts = self.counts
+        items = iter(items)
+        while 1:
+            recorded = self._recorded
+            start = _clock()
+            try:
+                item = next(items)
+            except StopIteration:
+                self._Record(phase, _clock() - start, recorded)
+                return
+            self._Record(phase, _clock() - start, recorded)
+            if counter is not None:
+                counts[counter] += 1
+            yield item
+
+    def Write(self, output, text):
+        """Writes text to output as part of the write phase."""
+        with self.Phase('write'):
+            output.write(text)
+        self.counts['bytes_written'] += len(text.encode('utf-8'))
+
+    def ToDict(self):
+        end = self.end
+        if end is None:
+            end = _clock()
+        result = dict(self.counts)
+        result.update(filename=self.filename, cached=self.cached,
+                      error=self.error, parse_errors=list(self.parse_errors),
+                      seconds=dict(self.seconds),
+                      wall_seconds=end - self.start, pid=self.pid,
+                      start_time=self.start_time)
+        return result
+
+
+def StartFile(filename):
+    """Starts collecting metrics for filename and returns its FileMetrics."""
+    global current
+    current = FileMetrics(filename)
+    return current
+
+
+def EndFile():
+    """Stops collecting and returns the FileMetrics or None."""
+    global current
+    file_metrics = current
+    current = None
+    if file_metrics is not None:
+        file_metrics.end = _clock()
+    return file_metrics
+
+
+def Phase(phase):
+    """Returns a context manager charging its time to phase, if enabled."""
+    if current is None:
+        return _NULL_PHASE
+    return _Phase(current, phase)
+
+
+def RecordError(message):
+    if current is not None:
+        current.error = message
+
+
+class RunMetrics(object):
+    """Collects the metrics of every file of a run."""
+
+    def __init__(self):
+        self.start = _clock()
+        self.pid = os.getpid()
+        self.start_time = time.time()
+        self.files = []
+        self.stages = None  # {stage: throughput} of gmock_batch --pipeline.
+
+    def Add(self, file_metrics):
+        """Adds a FileMetrics or the dict of one, as made by a worker."""
+        if isinstance(file_metrics, FileMetrics):
+            file_metrics = file_metrics.ToDict()
+        self.files.append(file_metrics)
+
+    def Report(self, top=10):
+        """Returns {'files': [...], 'summary': {...}, 'slowest': [...]},
+        and 'stages' if they were set."""
+        summary = dict([(counter, 0) for counter in COUNTERS])
+        seconds = dict([(phase, 0.0) for phase in PHASES])
+        for file_metrics in self.files:
+            for counter in COUNTERS:
+                summary[counter] += file_metrics[counter]
+            for phase in PHASES:
+                seconds[phase] += file_metrics['seconds'][phase]
+        summary.update(
+            files=len(self.files),
+            failures=len([f for f in self.files if f['error'] is not None]),
+            cached=len([f for f in self.files if f['cached']]),
+            parse_errors=sum([len(f['parse_errors']) for f in self.files]),
+            seconds=seconds,
+            wall_seconds=_clock() - self.start)
+        slowest = sorted(self.files, key=lambda f: f['wall_seconds'],
+                         reverse=True)[:top]
+        report = {
+            'files': self.files,
+            'summary': summary,
+            'slowest': [{'filename': f['filename'],
+                         'wall_seconds': f['wall_seconds']} for f in slowest],
+        }
+        if self.stages is not None:
+            report['stages'] = self.stages
+        return report
+
+    def TraceEvents(self):
+        """Returns the run as a list of Chrome trace events."""
+        events = []
+        for pid in sorted(set([f['pid'] for f in self.files] + [self.pid])):
+            name = 'worker %d' % pid
+            if pid == self.pid:
+                name = 'main %d' % pid
+            events.append({'ph': 'M', 'name': 'process_name', 'pid': pid,
+                           'tid': 0, 'args': {'name': name}})
+        events.append({'ph': 'X', 'name': 'run', 'cat': 'run',
+                       'pid': self.pid, 'tid': 0,
+                       'ts': self.start_time * 1e6,
+                       'dur': (_clock() - self.start) * 1e6})
+        for file_metrics in self.files:
+            ts = file_metrics['start_time'] * 1e6
+            args = dict([(counter, file_metrics[counter])
+                         for counter in COUNTERS])
+            args.update(filename=file_metrics['filename'],
+                        cached=file_metrics['cached'],
+                        error=file_metrics['error'])
+            events.append({'ph': 'X', 'cat': 'file',
+                           'name': os.path.basename(file_metrics['filename']),
+                           'pid': file_metrics['pid'], 'tid': 0, 'ts': ts,
+                           'dur': file_metrics['wall_seconds'] * 1e6,
+                           'args': args})
+            for phase in PHASES:
+                duration = file_metrics['seconds'][phase] * 1e6
+                if duration <= 0:
+                    continue
+                events.append({'ph': 'X', 'cat': 'phase', 'name': phase,
+                               'pid': file_metrics['pid'], 'tid': 0,
+                               'ts': ts, 'dur': duration,
+                               'args': {'filename': file_metrics['filename']}})
+                ts += duration
+        return events
+
+    def Write(self, filename, top=10):
+        """Writes the report as JSON to filename, '-' is stderr."""
+        _WriteJson(filename, self.Report(top), indent=2)
+
+    def WriteTrace(self, filename):
+        """Writes the run as a Chrome trace to filename, '-' is stderr."""
+        _WriteJson(filename, {'traceEvents': self.TraceEvents(),
+                              'displayTimeUnit': 'ms'})
+
+
+def _WriteJson(filename, data, indent=None):
+    text = json.dumps(data, indent=indent, sort_keys=True)
+    if filename == '-':
+        sys.stderr.write(text + '\n')
+        return
+    fp = open(filename, 'w')
+    try:
+        fp.write(text + '\n')
+    finally:
+        fp.close()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for cpp.metrics."""
+
+
+import os
+import sys
+import time
+import unittest
+
+# Allow the cpp imports below to work when run as a standalone script.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from cpp import ast
+from cpp import metrics
+
+
+class FileMetricsTest(unittest.TestCase):
+
+    def tearDown(self):
+        metrics.EndFile()
+
+    def testDisabled(self):
+        self.assertEqual(None, metrics.current)
+        with metrics.Phase('read'):
+            pass
+        metrics.RecordError('ignored')
+        self.assertEqual(None, metrics.EndFile())
+
+    def testNestedPhasesAreExclusive(self):
+        file_metrics = metrics.StartFile('foo.h')
+
+        def Items():
+            with metrics.Phase('tokenize'):
+                time.sleep(0.02)
+            yield 1
+            time.sleep(0.02)
+            yield 2
+
+        with metrics.Phase('generate'):
+            items = list(file_metrics.Count(Items(), 'parse', 'nodes'))
+        self.assertEqual([1, 2], items)
+        self.assertEqual(2, file_metrics.counts['nodes'])
+        seconds = file_metrics.seconds
+        self.assertTrue(0.015 < seconds['tokenize'] < 0.035, seconds)
+        self.assertTrue(0.015 < seconds['parse'] < 0.035, seconds)
+        self.assertTrue(seconds['generate'] < 0.01, seconds)
+
+    def testParserCounts(self):
+        file_metrics = metrics.StartFile('foo.h')
+        nodes = ast.ParseSource('class Foo { int x; void Bar(); };', 'foo.h')
+        self.assertEqual(1, len(nodes))
+        self.assertEqual(3, file_metrics.counts['nodes'])
+        self.assertEqual(13, file_metrics.counts['tokens'])
+
+    def testReport(self):
+        run_metrics = metrics.RunMetrics()
+        for filename, tokens in (('a.h', 10), ('b.h', 5)):
+            file_metrics = metrics.StartFile(filename)
+            file_metrics.Add('tokens', tokens)
+            time.sleep(tokens / 1000.0)
+            run_metrics.Add(metrics.EndFile())
+        run_metrics.files[1]['error'] = 'failed'
+        report = run_metrics.Report(top=1)
+        self.assertEqual(15, report['summary']['tokens'])
+        self.assertEqual(2, report['summary']['files'])
+        self.assertEqual(1, report['summary']['failures'])
+        self.assertEqual(['a.h'], [f['filename'] for f in report['slowest']])
+
+    def testTraceEvents(self):
+        run_metrics = metrics.RunMetrics()
+        file_metrics = metrics.StartFile('dir/a.h')
+        with metrics.Phase('read'):
+            time.sleep(0.002)
+        with metrics.Phase('parse'):
+            time.sleep(0.002)
+        run_metrics.Add(metrics.EndFile())
+        events = run_metrics.TraceEvents()
+        self.assertEqual(['process_name', 'run', 'a.h', 'read', 'parse'],
+                         [event['name'] for event in events])
+        unused_name, unused_run, whole, read, parse = events
+        self.assertEqual(os.getpid(), whole['pid'])
+        self.assertEqual(whole['ts'], read['ts'])
+        self.assertEqual(read['ts'] + read['dur'], parse['ts'])
+        self.assertTrue(parse['ts'] + parse['dur'] <=
+                        whole['ts'] + whole['dur'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Content-addressed cache of generated code.
+
+Generators key what they produce by a HashKey() of everything it depends
+on: the input source, the templates, the options and the generator's own
+sources (disk_cache.ModulesKey() or FilesKey()).  Identical inputs then
+give identical keys in every checkout, so the output can be copied out of
+the cache instead of being parsed and rendered again.
+
+The cache lives in the "output" directory of disk_cache.DefaultDirectory()
+and is a DiskCache, with its size cap, LRU eviction and atomic writes.
+Pointing CPPGEN_CACHE_DIR to a directory several users can write shares
+it between them.  Entries are JSON rather than pickles, so that reading
+an entry written by someone else cannot run code.  The parsed headers of
+ast.AstCache() are pickles and stay private to each user.
+"""
+
+
+import json
+import os
+
+from cpp import disk_cache
+
+
+def OutputCache():
+    """Returns the DiskCache holding generated code."""
+    directory = os.path.join(disk_cache.DefaultDirectory(), 'output')
+    return disk_cache.DiskCache(directory, disk_cache.DefaultMaxBytes())
+
+
+def Get(cache, key):
+    """Returns the value stored by Put() for key or None."""
+    data = cache.Get(key)
+    if data is None:
+        return None
+    try:
+        return json.loads(data.decode('utf-8'))
+    except ValueError:
+        return None  # Corrupt entry, generate it again.
+
+
+def Put(cache, key, value):
+    """Stores value, made of lists, dicts, strings and numbers, for key."""
+    cache.Put(key, json.dumps(value, sort_keys=True).encode('utf-8'))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for cpp.output_cache."""
+
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Allow the cpp imports below to work when run as a standalone script.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from cpp import disk_cache
+from cpp import output_cache
+
+
+class OutputCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_dir = os.environ.get('CPPGEN_CACHE_DIR')
+        os.environ['CPPGEN_CACHE_DIR'] = self.directory
+
+    def tearDown(self):
+        if self.cache_dir is None:
+            del os.environ['CPPGEN_CACHE_DIR']
+        else:
+            os.environ['CPPGEN_CACHE_DIR'] = self.cache_dir
+        shutil.rmtree(self.directory)
+
+    def testGetAndPut(self):
+        cache = output_cache.OutputCache()
+        self.assertEqual(os.path.join(self.directory, 'output'),
+                         cache.directory)
+        key = disk_cache.HashKey('source', 'options')
+        self.assertEqual(None, output_cache.Get(cache, key))
+        output_cache.Put(cache, key, [['Foo.h', u'class Foo {};\n']])
+        self.assertEqual([['Foo.h', u'class Foo {};\n']],
+                         output_cache.Get(cache, key))
+
+    def testCorruptEntry(self):
+        cache = output_cache.OutputCache()
+        cache.Put('key', b'\x80 not json')
+        self.assertEqual(None, output_cache.Get(cache, 'key'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Performance regression tests against perf_baseline.json.
+
+The tokenizer, parser and generator are run on the benchmark corpus of
+benchmarks/corpus.py.  Their throughput is multiplied by the time of the
+calibration loop in benchmarks/run.py, which makes it roughly independent
+of the speed of the machine, and compared with the checked-in baseline.
+
+Timings still vary with the machine, its load and the Python version, so
+the tests only run when asked for, e.g. on a dedicated benchmark machine.
+
+Environment:
+  CPPGEN_PERF_TEST       when set, run the tests
+  CPPGEN_PERF_TOLERANCE  allowed slowdown, 0.3 is 30%; overrides the
+                         tolerance of the baseline file
+  CPPGEN_PERF_UPDATE     when set, write a new baseline instead of testing
+"""
+
+
+import json
+import os
+import platform
+import sys
+import unittest
+
+# Allow the cpp imports below to work when run as a standalone script.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# The benchmarks package is at the root of the repository.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+from benchmarks import corpus
+from benchmarks import run
+
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'perf_baseline.json')
+
+# Phases checked and the throughput of each in the benchmark results.
+RATES = (('tokenize', 'tokens_per_second'),
+         ('parse', 'nodes_per_second'),
+         ('generate', 'classes_per_second'))
+
+
+def Measure(spec, repeat):
+    """Returns {phase: throughput per second of calibration loop}.
+
+    The calibration loop is timed next to every run so that both see the
+    same machine load, and the best of repeat runs is kept.
+    """
+    sources = [('corpus%d.h' % i, corpus.GenerateHeader(spec, i)[0])
+               for i in range(spec.files)]
+    throughput = dict([(phase, 0.0) for phase, unused_rate in RATES])
+    for unused_run in range(repeat):
+        calibration = run.Calibrate(1)
+        parse, asts = run.BenchParse(sources, 1)
+        results = {
+            'tokenize': run.BenchTokenize(sources, 1),
+            'parse': parse,
+            'generate': run.BenchGenerate(sources, asts, 1),
+        }
+        calibration = min(calibration, run.Calibrate(1))
+        for phase, rate in RATES:
+            throughput[phase] = max(throughput[phase],
+                                    results[phase][rate] * calibration)
+    return throughput
+
+
+def _LoadBaseline():
+    with open(BASELINE) as fp:
+        return json.load(fp)
+
+
+def _WriteBaseline(baseline, throughput):
+    baseline = dict(baseline, throughput=throughput,
+                    python=platform.python_version())
+    with open(BASELINE, 'w') as fp:
+        fp.write(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+
+
+@unittest.skipUnless(os.environ.get('CPPGEN_PERF_TEST') or
+                     os.environ.get('CPPGEN_PERF_UPDATE'),
+                     'set CPPGEN_PERF_TEST=1 to run the performance tests')
+class PerfTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.baseline = _LoadBaseline()
+        spec = corpus.CorpusSpec(**cls.baseline['corpus'])
+        cls.throughput = Measure(spec, cls.baseline['repeat'])
+        cls.tolerance = float(os.environ.get('CPPGEN_PERF_TOLERANCE',
+                                             cls.baseline['tolerance']))
+        if os.environ.get('CPPGEN_PERF_UPDATE'):
+            _WriteBaseline(cls.baseline, cls.throughput)
+
+    def CheckThroughput(self, phase):
+        if os.environ.get('CPPGEN_PERF_UPDATE'):
+            self.skipTest('baseline updated')
+        expected = self.baseline['throughput'][phase]
+        actual = self.throughput[phase]
+        ratio = actual / expected
+        self.assertTrue(
+            ratio >= 1 - self.tolerance,
+            '%s throughput regressed to %.0f%% of the baseline (%.1f, '
+            'expected %.1f); run with CPPGEN_PERF_UPDATE=1 if this is '
+            'intended' % (phase, 100 * ratio, actual, expected))
+
+    def testTokenizer(self):
+        self.CheckThroughput('tokenize')
+
+    def testParser(self):
+        self.CheckThroughput('parse')
+
+    def testGenerator(self):
+        self.CheckThroughput('generate')
+
+
+if __name__ == '__main__':
+    unittest.main()
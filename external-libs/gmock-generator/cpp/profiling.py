@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Run the generators under cProfile and summarize by pipeline phase.
+
+Every profiled function is assigned to one of PHASES using rules that
+match its file and function name.  Time spent in builtins is charged to
+the phase of the function that called them.
+"""
+
+
+import cProfile
+import fnmatch
+import os
+import pstats
+import sys
+
+
+PHASES = ('read', 'tokenize', 'parse', 'generate', 'write')
+OTHER = 'other'
+
+# (file name, function name pattern, phase), the first match wins.
+_RULES = [
+    ('utils.py', 'ReadFile', 'read'),
+    ('disk_cache.py', 'Get', 'read'),
+    ('disk_cache.py', '*', 'write'),
+    ('tokenize.py', '*', 'tokenize'),
+    ('ast.py', '*', 'parse'),
+    ('keywords.py', '*', 'parse'),
+    ('headers.py', '*', 'parse'),
+    ('class_index.py', '*', 'parse'),
+    ('gmock_class.py', '_WriteMocks', 'write'),
+    ('gmock_batch.py', '_WriteFile', 'write'),
+    ('gmock_class.py', '*', 'generate'),
+    ('gmock_batch.py', '*', 'generate'),
+]
+
+
+def DefaultPath(program):
+    """Returns the .pstats file written when no path is given."""
+    return os.path.splitext(os.path.basename(program))[0] + '.pstats'
+
+
+class _PhaseClassifier(object):
+
+    def __init__(self, rules):
+        self.rules = rules
+        self._phases = {}
+
+    def Phase(self, function):
+        try:
+            return self._phases[function]
+        except KeyError:
+            pass
+        filename, unused_line, name = function
+        basename = os.path.basename(filename)
+        phase = None
+        for rule_file, pattern, rule_phase in self.rules:
+            if basename == rule_file and fnmatch.fnmatchcase(name, pattern):
+                phase = rule_phase
+                break
+        self._phases[function] = phase
+        return phase
+
+
+def PhaseTimes(stats, rules=()):
+    """Returns {phase: seconds} of own time spent in each phase."""
+    classifier = _PhaseClassifier(list(rules) + _RULES)
+    times = dict([(phase, 0.0) for phase in PHASES + (OTHER,)])
+    for function, (unused_cc, unused_nc, tt, unused_ct,
+                   callers) in stats.stats.items():
+        phase = classifier.Phase(function)
+        if phase is not None or not callers:
+            times[phase or OTHER] += tt
+            continue
+        # Charge builtins and unknown code to their callers' phases.
+        for caller, caller_stats in callers.items():
+            times[classifier.Phase(caller) or OTHER] += caller_stats[2]
+    return times
+
+
+def PrintSummary(stats, output=sys.stderr, top=10, rules=()):
+    """Prints time per phase and the top functions of each phase."""
+    classifier = _PhaseClassifier(list(rules) + _RULES)
+    times = PhaseTimes(stats, rules)
+    total = sum(times.values()) or 1.0
+    output.write('%-10s %10s %7s\n' % ('phase', 'seconds', 'share'))
+    for phase in PHASES + (OTHER,):
+        output.write('%-10s %10.3f %6.1f%%\n' %
+                     (phase, times[phase], 100.0 * times[phase] / total))
+
+    by_phase = {}
+    for function, (unused_cc, nc, unused_tt, ct,
+                   unused_callers) in stats.stats.items():
+        phase = classifier.Phase(function)
+        if phase is not None:
+            by_phase.setdefault(phase, []).append((ct, nc, function))
+    output.write('\nTop %d functions by cumulative time in each phase:\n' % top)
+    for phase in PHASES:
+        functions = sorted(by_phase.get(phase, ()), reverse=True)[:top]
+        if not functions:
+            continue
+        output.write('[%s]\n' % phase)
+        for ct, nc, (filename, line, name) in functions:
+            output.write('  %9.3fs %9d  %s:%d(%s)\n' %
+                         (ct, nc, os.path.basename(filename), line, name))
+
+
+def Profile(function, path, output=sys.stderr, top=10, rules=()):
+    """Runs function() under cProfile and returns its result.
+
+    The raw profile is written to path and a summary by phase to output,
+    also when function() raises or exits.
+
+    Args:
+      function: callable taking no arguments
+      path: 'file.pstats'
+      rules: [(file name, function name pattern, phase), ...] that are
+             tried before the built-in rules, for code outside this package
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function)
+    finally:
+        profiler.dump_stats(path)
+        output.write('Profile written to %s\n' % path)
+        PrintSummary(pstats.Stats(profiler), output, top, rules)
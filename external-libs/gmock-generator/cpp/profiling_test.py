@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for cpp.profiling."""
+
+
+import io
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Allow the cpp imports below to work when run as a standalone script.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from cpp import ast
+from cpp import profiling
+
+
+class ProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'out.pstats')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def testPhases(self):
+        source = 'class Foo {\n public:\n  virtual int Bar(int x) = 0;\n};\n'
+        output = io.StringIO()
+        nodes = profiling.Profile(lambda: ast.ParseSource(source, 'foo.h'),
+                                  self.path, output)
+        self.assertEqual(['Foo'], [node.name for node in nodes])
+
+        times = profiling.PhaseTimes(pstats.Stats(self.path))
+        self.assertTrue(times['tokenize'] > 0)
+        self.assertTrue(times['parse'] > 0)
+        self.assertEqual(0, times['write'])
+        self.assertTrue('[parse]' in output.getvalue())
+
+    def testWritesProfileOnExit(self):
+        def Exit():
+            sys.exit(1)
+        output = io.StringIO()
+        self.assertRaises(SystemExit, profiling.Profile, Exit, self.path,
+                          output)
+        self.assertTrue(os.path.exists(self.path))
+
+    def testRules(self):
+        function = ('/src/NewClass.py', 10, 'writeToDisk')
+        classifier = profiling._PhaseClassifier(
+            [('NewClass.py', 'write*', 'write')])
+        self.assertEqual('write', classifier.Phase(function))
+        self.assertEqual(None, classifier.Phase(('~', 0, '<built-in>')))
+
+
+if __name__ == '__main__':
+    unittest.main()
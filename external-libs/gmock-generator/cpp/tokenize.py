@@ -28,8 +28,10 @@ except ImportError:
     import __builtin__ as builtins
 
 
+import re
 import sys
 
+from cpp import metrics
 from cpp import utils
 
 
@@ -61,6 +63,10 @@ PREPROCESSOR = 'PREPROCESSOR'
 WHENCE_STREAM, WHENCE_QUEUE = range(2)
 
 
+class TokenizeError(RuntimeError):
+    """Raised on a character that cannot start a token."""
+
+
 class Token(object):
     """Data container to represent a C++ token.
 
@@ -70,6 +76,7 @@ class Token(object):
     start contains the index of the first char of the token in the source
     end contains the index of the last char of the token in the source
     """
+    __slots__ = ('token_type', 'name', 'start', 'end', 'whence')
 
     def __init__(self, token_type, name, start, end):
         self.token_type = token_type
@@ -116,15 +123,349 @@ def _GetChar(source, start, i):
     return i + 1
 
 
-def GetTokens(source):
+def GetTokens(source, macros=None):
     """Returns a sequence of Tokens.
 
     Args:
       source: string of C++ source code.
+      macros: {name: value or None if undefined} of the macros known to be
+              (un)defined, e.g. by -D and -U flags.  When given, the
+              conditional directives are evaluated and the branches they
+              rule out are left out, see _SkipInactive().
 
     Yields:
       Token that represents the next token in the source.
     """
+    tokens = _GenerateTokens(source)
+    if macros is not None:
+        tokens = _SkipInactive(tokens, macros)
+    if metrics.current is not None:
+        tokens = metrics.current.Count(tokens, 'tokenize', 'tokens')
+    return tokens
+
+
+_DIRECTIVE = re.compile(r'#\s*(\w*)\s*(.*)', re.DOTALL)
+_DEFINE = re.compile(r'([A-Za-z_$][\w$]*)(\(?)\s*(.*)', re.DOTALL)
+_CONDITION_TOKENS = re.compile(r'\s*(?:(\d\w*)|([A-Za-z_$][\w$]*)|'
+                               r'(&&|\|\||==|!=|<=|>=|<<|>>|[-+*/%<>!~()?:&|^]))')
+_BINARY_OPERATORS = (('||',), ('&&',), ('|',), ('^',), ('&',), ('==', '!='),
+                     ('<', '>', '<=', '>='), ('<<', '>>'), ('+', '-'),
+                     ('*', '/', '%'))
+# Macros whose values refer to other macros are expanded this deep.
+_MAX_EXPANSION_DEPTH = 16
+
+
+class _Unsupported(Exception):
+    """A condition that _Condition cannot evaluate."""
+
+
+class _Condition(object):
+    """Evaluates the expression of a #if or #elif directive.
+
+    Evaluate() returns an int when the value is known and None when it
+    depends on a macro that is not in macros, or on something beyond the
+    integer arithmetic handled here like function-like macros.  Unlike the
+    preprocessor, which takes unknown names for 0, nothing is assumed about
+    them, e.g. 'A || 1' is 1 but 'A && 1' is unknown.
+    """
+
+    def __init__(self, macros, depth=0):
+        self.macros = macros
+        self.depth = depth
+        self.tokens = []
+        self.index = 0
+
+    def Evaluate(self, text):
+        try:
+            self.tokens = self._Tokenize(text)
+            self.index = 0
+            value = self._Ternary()
+            if self.index != len(self.tokens):
+                raise _Unsupported(text)
+        except _Unsupported:
+            return None
+        return value
+
+    def _Tokenize(self, text):
+        tokens = []
+        text = text.rstrip()
+        i = 0
+        while i < len(text):
+            match = _CONDITION_TOKENS.match(text, i)
+            if match is None:
+                raise _Unsupported(text)
+            number, name, operator = match.groups()
+            if number is not None:
+                tokens.append(('number', number))
+            elif name is not None:
+                tokens.append(('name', name))
+            else:
+                tokens.append(('operator', operator))
+            i = match.end()
+        return tokens
+
+    def _Peek(self):
+        if self.index < len(self.tokens):
+            return self.tokens[self.index]
+        return (None, None)
+
+    def _Next(self):
+        if self.index >= len(self.tokens):
+            raise _Unsupported('unexpected end')
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def _Expect(self, operator):
+        if self._Next() != ('operator', operator):
+            raise _Unsupported('expected ' + operator)
+
+    def _Ternary(self):
+        condition = self._Binary(0)
+        if self._Peek() != ('operator', '?'):
+            return condition
+        self._Next()
+        if_true = self._Ternary()
+        self._Expect(':')
+        if_false = self._Ternary()
+        if condition is None:
+            if if_true == if_false:
+                return if_true
+            return None
+        if condition:
+            return if_true
+        return if_false
+
+    def _Binary(self, level):
+        if level == len(_BINARY_OPERATORS):
+            return self._Unary()
+        left = self._Binary(level + 1)
+        operators = _BINARY_OPERATORS[level]
+        while 1:
+            kind, operator = self._Peek()
+            if kind != 'operator' or operator not in operators:
+                return left
+            self._Next()
+            right = self._Binary(level + 1)
+            left = _Apply(operator, left, right)
+
+    def _Unary(self):
+        kind, value = self._Next()
+        if kind == 'operator':
+            if value == '(':
+                result = self._Ternary()
+                self._Expect(')')
+                return result
+            if value in '!~-+':
+                operand = self._Unary()
+                if operand is None:
+                    return None
+                if value == '!':
+                    return int(not operand)
+                if value == '~':
+                    return ~operand
+                if value == '-':
+                    return -operand
+                return operand
+            raise _Unsupported(value)
+        if kind == 'number':
+            return _ParseInteger(value)
+        if value == 'defined':
+            parenthesized = self._Peek() == ('operator', '(')
+            if parenthesized:
+                self._Next()
+            kind, name = self._Next()
+            if kind != 'name':
+                raise _Unsupported(name)
+            if parenthesized:
+                self._Expect(')')
+            if name not in self.macros:
+                return None
+            return int(self.macros[name] is not None)
+        if value == 'true':
+            return 1
+        if value == 'false':
+            return 0
+        if self._Peek() == ('operator', '('):
+            raise _Unsupported('function-like macro ' + value)
+        if value not in self.macros:
+            return None
+        if self.macros[value] is None:
+            return 0  # Known to be undefined.
+        if self.depth >= _MAX_EXPANSION_DEPTH:
+            return None
+        return _Condition(self.macros, self.depth + 1).Evaluate(
+            self.macros[value] or '()')
+
+
+def _ParseInteger(text):
+    digits = text.rstrip('uUlL')
+    try:
+        if digits[:2] in ('0x', '0X'):
+            return int(digits[2:], 16)
+        if digits[:2] in ('0b', '0B'):
+            return int(digits[2:], 2)
+        if len(digits) > 1 and digits[0] == '0':
+            return int(digits[1:], 8)
+        return int(digits)
+    except ValueError:
+        raise _Unsupported(text)
+
+
+def _Apply(operator, left, right):
+    if operator == '&&':
+        if left == 0 or right == 0:
+            return 0
+        if left is None or right is None:
+            return None
+        return 1
+    if operator == '||':
+        if left or right:
+            return 1
+        if left is None or right is None:
+            return None
+        return 0
+    if left is None or right is None:
+        return None
+    if operator in ('/', '%'):
+        if right == 0:
+            return None
+        quotient = abs(left) // abs(right)
+        if (left < 0) != (right < 0):
+            quotient = -quotient
+        if operator == '/':
+            return quotient
+        return left - quotient * right
+    if operator == '==':
+        return int(left == right)
+    if operator == '!=':
+        return int(left != right)
+    if operator == '<':
+        return int(left < right)
+    if operator == '>':
+        return int(left > right)
+    if operator == '<=':
+        return int(left <= right)
+    if operator == '>=':
+        return int(left >= right)
+    if operator in ('<<', '>>') and not 0 <= right < 64:
+        return None
+    if operator == '<<':
+        return left << right
+    if operator == '>>':
+        return left >> right
+    if operator == '+':
+        return left + right
+    if operator == '-':
+        return left - right
+    if operator == '*':
+        return left * right
+    if operator == '&':
+        return left & right
+    if operator == '|':
+        return left | right
+    return left ^ right
+
+
+class _Conditional(object):
+    """State of an #if ... #endif being tokenized."""
+
+    def __init__(self, parent_live, parent_certain, guard):
+        self.parent_live = parent_live
+        self.parent_certain = parent_certain
+        self.taken = False    # A branch was known to be taken.
+        self.unknown = False  # A branch might have been taken.
+        # The macro of an #ifndef that may be an include guard, until
+        # another directive shows it is not.
+        self.guard = guard
+
+
+def _SkipInactive(tokens, macros):
+    """Yields tokens without the branches of conditionals known not taken.
+
+    The conditional directives themselves are left out too.  When a
+    condition cannot be evaluated, all its branches are kept, as without
+    macros.  #define and #undef update macros from then on, but only where
+    it is certain that they are preprocessed; elsewhere the macro becomes
+    unknown.  An #ifndef X directly followed by #define X is taken for an
+    include guard, whose body is preprocessed the first time.
+    """
+    macros = dict(macros)
+    stack = []
+    live = certain = True
+    for token in tokens:
+        if token.token_type != PREPROCESSOR:
+            if live:
+                yield token
+            continue
+        match = _DIRECTIVE.match(token.name)
+        directive = match.group(1)
+        argument = match.group(2).replace('\\\n', ' ').strip()
+        conditional = guard = None
+        if stack:
+            conditional = stack[-1]
+            guard, conditional.guard = conditional.guard, None
+
+        if directive in ('if', 'ifdef', 'ifndef'):
+            value = guard = None
+            if live:
+                if directive == 'if':
+                    value = _Condition(macros).Evaluate(argument)
+                else:
+                    name = argument.split()[0] if argument else ''
+                    if name in macros:
+                        value = int(macros[name] is not None)
+                    elif directive == 'ifndef':
+                        guard = name
+                    if value is not None and directive == 'ifndef':
+                        value = int(not value)
+            conditional = _Conditional(live, certain, guard)
+            stack.append(conditional)
+        elif directive in ('elif', 'else') and conditional is not None:
+            value = None
+            if directive == 'else':
+                value = 1
+            elif conditional.parent_live and not conditional.taken:
+                value = _Condition(macros).Evaluate(argument)
+            if conditional.taken:
+                value = 0
+        elif directive == 'endif' and conditional is not None:
+            stack.pop()
+            live = conditional.parent_live
+            certain = conditional.parent_certain
+            continue
+        else:
+            if not live:
+                continue
+            if directive in ('define', 'undef'):
+                match = _DEFINE.match(argument)
+                if match is not None:
+                    name, function_like, value = match.groups()
+                    if (directive == 'define' and conditional is not None and
+                            guard == name):
+                        # Include guard, its body is preprocessed.
+                        certain = conditional.parent_certain
+                    if function_like or not certain:
+                        macros.pop(name, None)
+                    elif directive == 'define':
+                        macros[name] = value.strip()
+                    else:
+                        macros[name] = None
+            yield token
+            continue
+
+        # Enter the branch of conditional starting at this directive.
+        live = conditional.parent_live and value != 0
+        certain = (conditional.parent_certain and live and
+                   value is not None and not conditional.taken and
+                   not conditional.unknown)
+        if value is None:
+            conditional.unknown = True
+        elif value:
+            conditional.taken = True
+
+
+def _GenerateTokens(source):
     # Cache various valid character sets for speed.
     valid_identifier_chars = VALID_IDENTIFIER_CHARS
     hex_digits = HEX_DIGITS
@@ -262,7 +603,9 @@ def GetTokens(source):
         else:
             sys.stderr.write('Got invalid token in %s @ %d token:%s: %r\n' %
                              ('?', i, c, source[i-10:i+10]))
-            raise RuntimeError('unexpected token')
+            raise TokenizeError('unexpected token %r at line %d, column %d' %
+                                (c, source.count('\n', 0, i) + 1,
+                                 i - source.rfind('\n', 0, i)))
 
         if i <= 0:
             print('Invalid index, exiting now.')
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the conditional directives of cpp.tokenize."""
+
+
+import os
+import sys
+import unittest
+
+# Allow the cpp imports below to work when run as a standalone script.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from cpp import tokenize
+
+
+def _Names(source, macros):
+    return [token.name for token in tokenize.GetTokens(source, macros)]
+
+
+class ConditionTest(unittest.TestCase):
+
+    def Evaluate(self, condition, **macros):
+        return tokenize._Condition(macros).Evaluate(condition)
+
+    def testArithmetic(self):
+        self.assertEqual(1, self.Evaluate('1 + 2 * 3 == 7'))
+        self.assertEqual(-3, self.Evaluate('-7 / 2'))
+        self.assertEqual(-1, self.Evaluate('-7 % 2'))
+        self.assertEqual(31, self.Evaluate('0x1fUL'))
+        self.assertEqual(8, self.Evaluate('010'))
+        self.assertEqual(2, self.Evaluate('0 ? 1 : 2'))
+
+    def testMacros(self):
+        self.assertEqual(1, self.Evaluate('defined(A) && !defined B',
+                                          A='1', B=None))
+        self.assertEqual(1, self.Evaluate('VERSION >= 2', VERSION='LATEST',
+                                          LATEST='3'))
+        self.assertEqual(0, self.Evaluate('B', B=None))
+
+    def testUnknown(self):
+        self.assertEqual(None, self.Evaluate('defined(A)'))
+        self.assertEqual(None, self.Evaluate('A && 1'))
+        self.assertEqual(1, self.Evaluate('A || 1'))
+        self.assertEqual(0, self.Evaluate('0 && A'))
+        self.assertEqual(1, self.Evaluate('A ? 1 : 1'))
+        self.assertEqual(None, self.Evaluate('F(2)', F='1'))
+        self.assertEqual(None, self.Evaluate('1 / 0'))
+        self.assertEqual(None, self.Evaluate('EMPTY', EMPTY=''))
+        self.assertEqual(None, self.Evaluate('A', A='A'))
+        self.assertEqual(None, self.Evaluate('"string"'))
+
+
+class SkipInactiveTest(unittest.TestCase):
+
+    SOURCE = """
+#if defined(WIN32)
+win
+#elif LEVEL >= 2
+high
+#elif OTHER
+other
+#else
+low
+#endif
+"""
+
+    def testWithoutMacros(self):
+        self.assertEqual(['#if defined(WIN32)', 'win', '#elif LEVEL >= 2',
+                          'high', '#elif OTHER', 'other', '#else', 'low',
+                          '#endif'], _Names(self.SOURCE, None))
+
+    def testKnownBranch(self):
+        self.assertEqual(['win'], _Names(self.SOURCE, {'WIN32': '1'}))
+        self.assertEqual(['high'], _Names(self.SOURCE,
+                                          {'WIN32': None, 'LEVEL': '2'}))
+        self.assertEqual(['low'], _Names(self.SOURCE, {'WIN32': None,
+                                                       'LEVEL': '1',
+                                                       'OTHER': '0'}))
+
+    def testUnknownBranchesAreKept(self):
+        self.assertEqual(['win', 'high', 'other', 'low'],
+                         _Names(self.SOURCE, {}))
+        self.assertEqual(['other', 'low'],
+                         _Names(self.SOURCE, {'WIN32': None, 'LEVEL': '1'}))
+
+    def testNestedInSkippedBranch(self):
+        source = '#if 0\n#ifdef A\na\n#else\nb\n#endif\n#else\nc\n#endif\n'
+        self.assertEqual(['c'], _Names(source, {}))
+
+    def testDefinesInFile(self):
+        source = """
+#ifndef HEADER_H
+#define HEADER_H
+#define FEATURE 1
+#ifdef MAYBE
+#define LATER 1
+#endif
+#if FEATURE
+feature
+#endif
+#if LATER
+later
+#endif
+#endif
+"""
+        self.assertEqual(['#define HEADER_H', '#define FEATURE 1',
+                          '#define LATER 1', 'feature', 'later'],
+                         _Names(source, {}))
+        self.assertEqual(['#define HEADER_H', '#define FEATURE 1',
+                          'feature'],
+                         _Names(source, {'MAYBE': None, 'LATER': None}))
+        self.assertEqual(['#define HEADER_H', '#define FEATURE 1',
+                          '#define LATER 1', 'feature', 'later'],
+                         _Names(source, {'MAYBE': '1', 'LATER': None}))
+        # The guard of a header that was already included.
+        self.assertEqual([], _Names(source, {'HEADER_H': '1'}))
+
+    def testTopLevelDefine(self):
+        source = ('#pragma once\n#define X 1\n#if X\nx\n#endif\n'
+                  '#ifndef Y\n#endif\n#define Y 1\n#if Y\ny\n#endif\n')
+        self.assertEqual(['#pragma once', '#define X 1', 'x', '#define Y 1',
+                          'y'], _Names(source, {'A': '1'}))
+
+    def testUndef(self):
+        source = '#undef A\n#ifdef A\na\n#endif\n'
+        self.assertEqual(['#undef A'], _Names(source, {'A': '1'}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,22 +20,45 @@
 __author__ = 'nnorwitz@google.com (Neal Norwitz)'
 
 
+import os
 import sys
 
+from cpp import metrics
+
 
 # Set to True to see the start/end token indices.
 DEBUG = True
 
+HEADER_EXTENSIONS = ('.h', '.hh', '.hpp', '.hxx', '.h++')
+
 
 def ReadFile(filename, print_error=True):
     """Returns the contents of a file."""
     try:
-        fp = open(filename)
-        try:
-            return fp.read()
-        finally:
-            fp.close()
+        with metrics.Phase('read'):
+            fp = open(filename)
+            try:
+                source = fp.read()
+                if metrics.current is not None:
+                    metrics.current.Add('bytes_read',
+                                        os.fstat(fp.fileno()).st_size)
+                return source
+            finally:
+                fp.close()
     except IOError:
         if print_error:
             print('Error reading %s: %s' % (filename, sys.exc_info()[1]))
         return None
+
+
+def FindHeaders(paths, extensions=HEADER_EXTENSIONS):
+    """Yields files in paths and headers found by walking directories."""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for directory, subdirectories, filenames in os.walk(path):
+            subdirectories.sort()
+            for filename in sorted(filenames):
+                if filename.endswith(extensions):
+                    yield os.path.join(directory, filename)
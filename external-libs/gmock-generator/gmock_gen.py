@@ -28,4 +28,4 @@ if __name__ == '__main__':
   from cpp import gmock_class
   # Fix the docstring in case they require the usage.
   gmock_class.__doc__ = gmock_class.__doc__.replace('gmock_class.py', __file__)
-  gmock_class.main()
+  sys.exit(gmock_class.main())
@@ -7,7 +7,41 @@
 # INTERFACE_PATH as a filename.
 # 
 # Usage:
-#   python NewClass.py <CLASS_TYPE> <INTERFACE_PATH>
+#   python NewClass.py [--no-cache] [--index FILE] [--include-root DIR]... [--include-report] [--profile[=FILE]] [--metrics-json FILE] <CLASS_TYPE> <INTERFACE_PATH>
+#   python NewClass.py --stdio [--jobs N] [--no-cache] [--index FILE] [--include-root DIR]...
+# 
+# With --index, INTERFACE_PATH may instead be the name of an interface that
+# is looked up in a class index (see external-libs/gmock-generator/cpp/class_index.py).
+#
+# With --include-root, the types a class depends on are looked up in the
+# headers under the include roots (see
+# external-libs/gmock-generator/cpp/include_resolver.py): they are included
+# by their real path, and forward declared only if they are classes.  Types
+# not found there fall back to "Type.h".
+#
+# A generated header only includes the types its methods use by value;
+# classes only used through pointers and references are forward declared
+# and included by the .cpp instead, which does not include again what the
+# header does.  --include-report prints how many of the includes of its
+# dependencies each file does without.
+#
+# Generated classes and mocks are kept in an output cache keyed by the
+# interface, the templates and the generator itself (see
+# external-libs/gmock-generator/cpp/output_cache.py), so generating the
+# same class again copies it out of the cache; --no-cache disables it.
+#
+# With --stdio, NewClass.py serves requests, one JSON object per line of
+# stdin, and answers each with one JSON line on stdout, keeping the parser,
+# the templates and the Qt classes loaded between requests:
+#   {"id": 1, "type": "class", "path": "IWidget.h", "source": "...",
+#    "options": {"no_cache": true, "directory": "out"}}
+#   {"id": 1, "files": [{"name": "Widget.cpp", "contents": "..."}, ...],
+#    "diagnostics": [], "cached": false, "includes_removed": {"Widget.h": 2},
+#    "error": null}
+# "source" replaces the contents of "path", "classes" are the classes a mock
+# is generated for, and files are only written, to "directory", if it is
+# given.  Up to --jobs requests (4 by default) run at once and their
+# results are written as they complete.
 # 
 # CLASS_TYPE   |                    Notes                    |
 # ------------------------------------------------------------    
@@ -19,6 +53,12 @@
 import sys
 import os
 import ntpath
+import contextlib
+import io
+import json
+import re
+import threading
+from concurrent import futures
 from datetime import datetime
 
 FIELDS = {
@@ -31,6 +71,7 @@ FIELDS = {
     "FUNCTION_DECLARATIONS" : "",
     "FUNCTION_DEFINITIONS" : "",
     "INCLUDES" : "",
+    "HEADER_INCLUDES" : "",
     "SIGNAL_DECLARATIONS" : "",
     "SIGNAL_DEFINITIONS" : ""
 }
@@ -50,28 +91,98 @@ EXTENSIONS = {
     "CPP_HEADER": ".h"
 }
 
-TEMPLATE_TYPES = ["INTERFACE", "CLASS"]
+TEMPLATE_TYPES = ["INTERFACE", "CLASS", "MOCK"]
 
 TEMPLATE_FILENAMES = {
     "INTERFACE" : "interface.txt",
     "CLASS_HEADER" : "class_header.txt",
     "CLASS_CPP" : "class_cpp.txt",
-    "COPYRIGHT" : "copyright.txt"
+    "COPYRIGHT" : "copyright.txt",
+    "ENUM_HEADER" : "enum_header.txt",
+    "ENUM_CPP" : "enum_cpp.txt",
+    "VALUE_HEADER" : "value_header.txt",
+    "VALUE_CPP" : "value_cpp.txt",
+    "VALUE_HASH_HEADER" : "value_hash_header.txt",
+    "VALUE_HASH_CPP" : "value_hash_cpp.txt"
+}
+
+OPTIONS = {
+    "NO_CACHE": False,
+    "INDEX": "",
+    "PROFILE": "",
+    "METRICS_JSON": "",
+    "STDIO": False,
+    "JOBS": 4,
+    "INCLUDE_ROOTS": [],
+    "INCLUDE_REPORT": False
 }
 
-QT_CLASSES = []
+# Pipeline phase of the functions in this file, for --profile.
+PROFILE_PHASES = [
+    ("NewClass.py", "readFile*", "read"),
+    ("NewClass.py", "loadTemplate", "read"),
+    ("NewClass.py", "initialize", "parse"),
+    ("NewClass.py", "__parse*", "parse"),
+    ("NewClass.py", "__isPureVirtualFunctionDeclaration", "parse"),
+    ("NewClass.py", "writeToDisk", "write"),
+    ("NewClass.py", "*", "generate")
+]
+
+# Loaded once by initializeQtClasses().
+QT_CLASSES = None
+
+# {templateType: template} loaded so far by loadTemplate().
+TEMPLATES = {}
+
+# {template: [text, field name, text, ...]} split so far by templateParts().
+TEMPLATE_PARTS = {}
+
+FIELD_PATTERN = re.compile(r"\{\{(\w+)\}\}")
+
+INTERFACE_NAME_PATTERN = re.compile("^" + re.escape(PREFIXES["INTERFACE"]) + r"[A-Za-z_]\w*$")
+
+# cpp.metrics.FileMetrics of the interface, with --metrics-json.
+FILE_METRICS = None
+
+# cpp.ast.AstCache() shared by the mocks of --stdio.
+AST_CACHE = None
+
+# cpp.include_resolver.IncludeResolver of the --include-root directories.
+RESOLVER = None
+
+class Generation:
+    """The fields and files of one class being generated.
+
+    A --stdio request has its own, so that requests can run at once.
+    """
+    def __init__(self, writeFiles=True):
+        self.fields = dict(FIELDS)
+        self.writeFiles = writeFiles
+        self.directory = ""
+        self.noCache = OPTIONS["NO_CACHE"]
+        self.cached = False
+        # [(FILE_NAME, contents), ...] written so far, stored in the output cache.
+        self.writtenFiles = []
+        # {FILE_NAME: n} of the includes of its dependencies each generated
+        # file does without; empty when copied out of the cache.
+        self.includesRemoved = {}
 
 class Interface:
-    def __init__(self, pathToInterface):
+    def __init__(self, pathToInterface, source=None):
         self.functions = []
         self.signals = []
         self.includes = []
         self.interfaceName = ""
-        self.__rawStringLines = readFileLines(pathToInterface)
+        with metricsPhase("read"):
+            if source is None:
+                source = readFile(pathToInterface)
+            self.__rawStringLines = source.splitlines()
+        if FILE_METRICS is not None:
+            FILE_METRICS.Add("bytes_read", len(source.encode("utf-8")))
         self.__initialize(pathToInterface)
 
     def __initialize(self, pathToInterface):
-        self.__parseFunctions()
+        self.__parseFunctions(pathToInterface)
         self.__parseInterfaceName(pathToInterface)
 
     def __parseInterfaceName(self, pathToInterface):
@@ -79,10 +190,15 @@ class Interface:
         interfaceName = interfaceName.split(".")[0]
         self.interfaceName = interfaceName 
     
-    def __parseFunctions(self):
-        for line in self.__rawStringLines:
+    def __parseFunctions(self, pathToInterface):
+        for lineNumber, line in enumerate(self.__rawStringLines, 1):
             if self.__isPureVirtualFunctionDeclaration(line):
-                self.functions.append(Function(line))
+                try:
+                    self.functions.append(Function(line))
+                except (IndexError, ValueError) as error:
+                    raise ValueError("{0}:{1}: cannot parse {2!r} ({3}: {4})".format(
+                        pathToInterface, lineNumber, line.strip(),
+                        type(error).__name__, error))
     
     def __isPureVirtualFunctionDeclaration(self, line):
         if len(line) < 20:
@@ -97,15 +213,24 @@ class Interface:
             function.toString()
 
 class ConcreteClass:
+    # includes, forwardDeclares, declarations and definitions are lists of
+    # chunks of code, written one after the other by emitFields().
     def __init__(self, interface):
         self.interface = interface
         self.classDependencies = []
-        self.includes = ""
-        self.forwardDeclares = ""
-        self.declarations = ""
-        self.definitions = ""
+        self.includes = []
+        self.headerIncludes = []
+        self.forwardDeclares = []
+        self.declarations = []
+        self.definitions = []
         self.className = ""
         self.headerDefine = ""
+        # Dependencies used by value, which the header has to include.
+        self.valueDependencies = set()
+        # How many of the includes of the dependencies the header and the
+        # .cpp do without.
+        self.headerIncludesRemoved = 0
+        self.cppIncludesRemoved = 0
         self.__initialize()
 
     def __initialize(self):
@@ -113,44 +238,60 @@ class ConcreteClass:
         self.__createDeclarations()
         self.__createDefinitions()
         self.__createClassDependencies()
-        self.__createForwardDeclares()
         self.__createIncludes()
         self.headerDefine = "{0}_H".format(self.className.upper())
         return
 
     def __createClassName(self):
-        self.className = self.interface.interfaceName.split(PREFIXES["INTERFACE"])[1]
+        self.className = interfaceClassName(self.interface.interfaceName)
     
     def __createDeclarations(self):
         for function in self.interface.functions:
             argumentsString = function.fullArgumentsString()
-            self.declarations += ("    {0} {1}({2}) override;\n"\
+            self.declarations.append("    {0} {1}({2}) override;\n"\
                 .format(function.returnType, function.functionName, argumentsString))
 
     def __createDefinitions(self):
         for function in self.interface.functions:
             argumentsString = function.fullArgumentsString()
-            self.definitions += ("{0} {1}::{2}({3})\n{4}\n{5}\n\n"\
+            self.definitions.append("{0} {1}::{2}({3})\n{4}\n{5}\n\n"\
                 .format(function.returnType, self.className, function.functionName, argumentsString, "{", "}"))
 
     def __createClassDependencies(self):
+        classDependencies = set()
+        # The class is declared by its own header, which includes the interface.
+        generatedNames = (self.className, self.interface.interfaceName)
         for function in self.interface.functions:
-            for include in function.includes:
-                if (include not in self.classDependencies and len(include) > 1):
-                    self.classDependencies.append(include)
-        self.classDependencies.sort()
-
-    def __createForwardDeclares(self):
-        for dependency in self.classDependencies:
-            if(shouldBeIncluded(dependency)):
-                self.forwardDeclares += "class {0};\n".format(dependency)
+            for include, byValue in function.usedTypes():
+                if (len(include) > 1) and include not in generatedNames:
+                    classDependencies.add(include)
+                    if byValue:
+                        self.valueDependencies.add(include)
+        self.classDependencies = sorted(classDependencies)
 
     def __createIncludes(self):
+        # A class only used through pointers and references is forward
+        # declared in the header and included by the .cpp; the header
+        # includes the other dependencies, and the .cpp gets them from it.
+        forwardDeclares = []
+        includes = []
+        headerIncludes = []
         for dependency in self.classDependencies:
-            if dependency in QT_CLASSES:
-                self.includes += "#include <{0}>\n".format(dependency)
-            elif shouldBeIncluded(dependency):
-                self.includes += "#include \"{0}.h\"\n".format(dependency)
+            include = createInclude(dependency)
+            forwardDeclaration = createForwardDeclaration(dependency)
+            if forwardDeclaration and dependency not in self.valueDependencies:
+                forwardDeclares.append((forwardDeclaration, include))
+                # Types of the same header are included once.
+                if include and include not in includes:
+                    includes.append(include)
+            elif include and include not in headerIncludes:
+                headerIncludes.append(include)
+        self.forwardDeclares = [forwardDeclaration for forwardDeclaration, include in forwardDeclares
+                                if include not in headerIncludes]
+        self.headerIncludes = headerIncludes
+        self.includes = [include for include in includes if include not in headerIncludes]
+        self.headerIncludesRemoved = len(self.includes)
+        self.cppIncludesRemoved = len(headerIncludes)
 
 class Function:
     def __init__(self, virtualDeclaration):
@@ -179,7 +320,7 @@ class Function:
         virtualDefList = self.virtualDeclaration.split(" ")
         virtualDefList = list(filter(lambda x: x != " ", virtualDefList))
         self.returnType = virtualDefList[virtualDefList.index("virtual") + 1]
-        self.includes.append(self.returnType)
+        self.includes.append(typeName(self.returnType))
         self.functionName = virtualDefList[virtualDefList.index(self.returnType) + 1].split("(")[0]
         rawArguments = self.virtualDeclaration.split("(")[1].split(")")[0].split(",")
         for arg in rawArguments:
@@ -187,6 +328,15 @@ class Function:
             self.arguments.append(functionArgument)
             self.includes.append(functionArgument.include)
 
+    def usedTypes(self):
+        """Returns [(type name, used by value), ...] of the return type and
+        the arguments."""
+        returnDeclaration = self.virtualDeclaration.split("(")[0]
+        usedTypes = [(typeName(self.returnType), not isIndirect(returnDeclaration))]
+        for argument in self.arguments:
+            usedTypes.append((argument.include, not isIndirect(argument.rawArgument)))
+        return usedTypes
+
     def toString(self):
         for arg in self.arguments:
             arg.toString()
@@ -208,120 +358,408 @@ class FunctionArgument:
         argument = self.rawArgument.split(" ")
         if(len(argument) > 1):
             objectTypeAndName = list(filter(lambda x: x != " " and len(x) > 0, argument))
-            self.objectType = objectTypeAndName[0]
-            self.objectName = objectTypeAndName[1]
+            self.objectType = " ".join(objectTypeAndName[:-1])
+            self.objectName = objectTypeAndName[-1]
             self.fullArgument = "{0} {1}".format(self.objectType, self.objectName)
         
     def __parseInclude(self):
-        self.include = self.objectType.replace("const", "").replace("*", "").replace("&", "").replace(" ", "")
+        self.include = typeName(self.objectType)
     
     def toString(self):
         print(self.objectType + " " + self.objectName)
 
 def main():
-    if (len(sys.argv) < 2):
+    args = initializeOptions(sys.argv)
+    if OPTIONS["STDIO"]:
+        serve(sys.stdin, sys.stdout)
+        return
+    run = lambda: generate(args)
+    if OPTIONS["METRICS_JSON"]:
+        run = lambda: generateWithMetrics(args)
+    if OPTIONS["PROFILE"]:
+        useGmockGenerator()
+        from cpp import profiling
+        profiling.Profile(run, OPTIONS["PROFILE"], rules=PROFILE_PHASES)
+        return
+    run()
+
+def generateWithMetrics(args):
+    global FILE_METRICS
+    useGmockGenerator()
+    from cpp import metrics
+    runMetrics = metrics.RunMetrics()
+    FILE_METRICS = metrics.StartFile(args[2] if len(args) > 2 else "")
+    try:
+        generate(args)
+    finally:
+        FILE_METRICS = None
+        runMetrics.Add(metrics.EndFile())
+        runMetrics.Write(OPTIONS["METRICS_JSON"])
+
+def generate(args):
+    if (len(args) < 2):
         printUsageError()
-    if (sys.argv[1] == '--help') or (sys.argv[1] == '-h'):
+    if (args[1] == '--help') or (args[1] == '-h'):
         printHelp()
-    if (len (sys.argv) != 3):
+    if (len (args) != 3):
         printUsageError()
-    elif (sys.argv[1].upper() not in TEMPLATE_TYPES):
+    elif (args[1].upper() not in TEMPLATE_TYPES):
         printUsageError()
     
-    initializeFields(sys.argv)
-
-    # Case 1: Creating a new interface (sys.argv[2] is a new interface filename)
-    if(FIELDS["TEMPLATE_TYPE"] == "INTERFACE"):
-        createInterface()
+    if (args[1].upper() != "INTERFACE"):
+        args[2] = resolveInterfacePath(args[2])
+    generation = Generation()
+    try:
+        initializeFields(generation.fields, args[1], args[2])
+    except ValueError as error:
+        print("NewClass.py: {0}.".format(error))
+        sys.exit()
+    if FILE_METRICS is not None:
+        FILE_METRICS.filename = os.path.abspath(args[2])
+
+    # The mock generator parses the interface itself.
+    if (generation.fields["TEMPLATE_TYPE"] == "MOCK"):
+        createMock(generation.fields, os.path.abspath(args[2]))
         return
 
-    pathToInterface = os.path.abspath(sys.argv[2])
-    existingInterface = Interface(pathToInterface)
-    
-    # Case 2: Creating another class from an existing interface (sys.argv[2] is a path to an existing interface)
+    generateFiles(generation, args[2])
+    if OPTIONS["INCLUDE_REPORT"]:
+        printIncludesRemoved(generation)
+
+def generateFiles(generation, path, source=None):
+    """Generates the interface or class of generation.fields for path,
+    reading the interface from source instead of path if given."""
+    fields = generation.fields
+
+    # Case 1: Creating a new interface (path is a new interface filename)
+    if(fields["TEMPLATE_TYPE"] == "INTERFACE"):
+        with metricsPhase("generate"):
+            createInterface(generation)
+        return
 
+    pathToInterface = os.path.abspath(path)
+    if source is None:
+        source = readFile(pathToInterface)
 
-    if (FIELDS["TEMPLATE_TYPE"] == "CLASS"):
-        concreteClass = ConcreteClass(existingInterface)
-        FIELDS["FUNCTION_DECLARATIONS"] = concreteClass.declarations
-        FIELDS["FUNCTION_DEFINITIONS"] = concreteClass.definitions
-        FIELDS["FORWARD_DECLARES"] = concreteClass.forwardDeclares
-        FIELDS["INCLUDES"] = concreteClass.includes
-        FIELDS["HEADER_DEF"] = concreteClass.headerDefine
-        createClass()
+    outputCache, outputKey = openOutputCache(generation, source)
+    if outputCache is not None and copyCachedOutputs(generation, outputCache, outputKey):
         return
+
+    with metricsPhase("parse"):
+        existingInterface = Interface(pathToInterface, source)
     
-    if (FIELDS["TEMPLATE_TYPE"] == "MOCK"):
-        createMock()
+    # Case 2: Creating another class from an existing interface (path is a path to an existing interface)
+
+
+    if (fields["TEMPLATE_TYPE"] == "CLASS"):
+        with metricsPhase("generate"):
+            concreteClass = ConcreteClass(existingInterface)
+            fields["FUNCTION_DECLARATIONS"] = concreteClass.declarations
+            fields["FUNCTION_DEFINITIONS"] = concreteClass.definitions
+            fields["FORWARD_DECLARES"] = concreteClass.forwardDeclares
+            fields["HEADER_INCLUDES"] = concreteClass.headerIncludes
+            fields["INCLUDES"] = concreteClass.includes
+            fields["HEADER_DEF"] = concreteClass.headerDefine
+            createClass(generation)
+        generation.includesRemoved = {
+            fields["CLASS_NAME"] + EXTENSIONS["CPP_HEADER"]: concreteClass.headerIncludesRemoved,
+            fields["CLASS_NAME"] + EXTENSIONS["CPP_CLASS"]: concreteClass.cppIncludesRemoved}
+        if FILE_METRICS is not None:
+            FILE_METRICS.Add("classes", 1)
+            FILE_METRICS.Add("methods", len(existingInterface.functions))
+        if outputCache is not None:
+            from cpp import output_cache
+            output_cache.Put(outputCache, outputKey, generation.writtenFiles)
         return
 
+# -- Requests (--stdio) -------------------------------
+
+def serve(requests, results):
+    """Answers each JSON request line of requests with a JSON line on
+    results, running up to OPTIONS["JOBS"] requests at once."""
+    global AST_CACHE
+    # Everything the requests share is loaded once, up front.
+    useGmockGenerator()
+    from cpp import ast
+    from cpp import gmock_class
+    if not OPTIONS["NO_CACHE"]:
+        AST_CACHE = ast.AstCache()
+    initializeQtClasses()
+    includeResolver()
+    for templateType in TEMPLATE_FILENAMES:
+        loadTemplate(templateType)
+
+    jobs = max(1, OPTIONS["JOBS"])
+    pending = threading.BoundedSemaphore(2 * jobs)
+    resultsLock = threading.Lock()
+
+    def writeResult(future):
+        with resultsLock:
+            results.write(json.dumps(future.result()) + "\n")
+            results.flush()
+        pending.release()
+
+    with futures.ThreadPoolExecutor(jobs) as executor:
+        for line in requests:
+            if not line.strip():
+                continue
+            pending.acquire()
+            executor.submit(handleRequest, line).add_done_callback(writeResult)
+
+def handleRequest(line):
+    """Returns the result of one --stdio request line as a dict."""
+    result = {"id": None, "files": [], "diagnostics": [], "cached": False,
+              "includes_removed": {}, "error": None}
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError("a request must be a JSON object")
+        result["id"] = request.get("id")
+        templateType = str(request.get("type", "")).upper()
+        if templateType not in TEMPLATE_TYPES:
+            raise ValueError("unknown type: {0}".format(request.get("type")))
+        path = request.get("path")
+        if not path or not isinstance(path, str):
+            raise ValueError("a request needs a path")
+        if templateType != "INTERFACE":
+            # The names of the generated files are derived from it.
+            interfaceClassName(ntpath.basename(path).split(".")[0])
+        source = request.get("source")
+        options = request.get("options") or {}
+
+        generation = Generation(writeFiles=bool(options.get("directory")))
+        generation.directory = options.get("directory") or ""
+        generation.noCache = generation.noCache or bool(options.get("no_cache"))
+        if templateType != "INTERFACE" and source is None:
+            path = findInterface(path)
+        initializeFields(generation.fields, templateType, path)
+        if templateType == "MOCK":
+            mockInterface(generation, os.path.abspath(path), source,
+                          request.get("classes"), result["diagnostics"])
+        else:
+            generateFiles(generation, path, source)
+        result["cached"] = generation.cached
+        result["includes_removed"] = generation.includesRemoved
+        result["files"] = [{"name": fileName, "contents": contents}
+                           for fileName, contents in generation.writtenFiles]
+    except Exception as error:
+        result["error"] = "{0}: {1}".format(type(error).__name__, error)
+    return result
+
 # -- Initialization ----------------------------------
 
-def initializeFields(args):
+def initializeOptions(args):
+    positionalArgs = []
+    args = iter(args)
+    for arg in args:
+        if arg == "--no-cache":
+            OPTIONS["NO_CACHE"] = True
+        elif arg == "--index":
+            OPTIONS["INDEX"] = next(args, "")
+        elif arg.startswith("--index="):
+            OPTIONS["INDEX"] = arg.split("=", 1)[1]
+        elif arg == "--profile":
+            OPTIONS["PROFILE"] = "NewClass.pstats"
+        elif arg.startswith("--profile="):
+            OPTIONS["PROFILE"] = arg.split("=", 1)[1]
+        elif arg == "--metrics-json":
+            OPTIONS["METRICS_JSON"] = next(args, "")
+        elif arg.startswith("--metrics-json="):
+            OPTIONS["METRICS_JSON"] = arg.split("=", 1)[1]
+        elif arg == "--include-root":
+            OPTIONS["INCLUDE_ROOTS"].append(next(args, ""))
+        elif arg.startswith("--include-root="):
+            OPTIONS["INCLUDE_ROOTS"].append(arg.split("=", 1)[1])
+        elif arg == "--include-report":
+            OPTIONS["INCLUDE_REPORT"] = True
+        elif arg == "--stdio":
+            OPTIONS["STDIO"] = True
+        elif arg == "--jobs":
+            OPTIONS["JOBS"] = int(next(args, "1"))
+        elif arg.startswith("--jobs="):
+            OPTIONS["JOBS"] = int(arg.split("=", 1)[1])
+        else:
+            positionalArgs.append(arg)
+    return positionalArgs
+
+def resolveInterfacePath(interfaceArg):
+    try:
+        return findInterface(interfaceArg)
+    except LookupError as error:
+        print("NewClass.py: {0}.".format(error.args[0]))
+        sys.exit()
+
+def findInterface(interfaceArg):
+    """Returns the path of interfaceArg, looking it up in the --index if it
+    is not a file.  Raises LookupError if it is not in the index."""
+    if not OPTIONS["INDEX"] or os.path.exists(interfaceArg):
+        return interfaceArg
+    useGmockGenerator()
+    from cpp import class_index
+    try:
+        index = class_index.ClassIndex(OPTIONS["INDEX"])
+    except class_index.IndexFileError as error:
+        raise LookupError(str(error))
+    headerPath = index.FindHeader(interfaceArg)
+    index.Close()
+    if headerPath is None:
+        raise LookupError("{0} not found in index {1}".format(interfaceArg, OPTIONS["INDEX"]))
+    return headerPath
+
+def initializeFields(fields, templateType, path):
     initializeQtClasses()
-    FIELDS["TEMPLATE_TYPE"] = args[1].upper()
-    FIELDS["YEAR"] = datetime.now().strftime("%Y")
-    filePath = os.path.abspath(args[2])
-    initializeClassName(filePath, FIELDS["TEMPLATE_TYPE"])
-    initializeInterfaceName(filePath, FIELDS["TEMPLATE_TYPE"])
-    FIELDS["INTERFACE_DEF"] = "{0}_H".format(FIELDS["INTERFACE_NAME"].upper())
-    FIELDS["COPYRIGHT"] = loadTemplate("COPYRIGHT")
+    fields["TEMPLATE_TYPE"] = templateType.upper()
+    fields["YEAR"] = datetime.now().strftime("%Y")
+    filePath = os.path.abspath(path)
+    initializeClassName(fields, filePath, fields["TEMPLATE_TYPE"])
+    initializeInterfaceName(fields, filePath, fields["TEMPLATE_TYPE"])
+    fields["INTERFACE_DEF"] = "{0}_H".format(fields["INTERFACE_NAME"].upper())
+    fields["COPYRIGHT"] = loadTemplate("COPYRIGHT")
 
 def initializeQtClasses():
     global QT_CLASSES
-    QT_CLASSES = readFileLines(includeListFilepath("qt-includes.txt"))
+    if QT_CLASSES is None:
+        QT_CLASSES = frozenset(readFileLines(includeListFilepath("qt-includes.txt")))
 
-def initializeClassName(filePath, templateType):
+def initializeClassName(fields, filePath, templateType):
     className = ntpath.basename(filePath)
     className = className.split(".")[0]
     if(templateType != "INTERFACE"):
-        className = className.split(PREFIXES["INTERFACE"])[1]
+        className = interfaceClassName(className)
         className = PREFIXES[templateType] + className
     else:
         className = PREFIXES["INTERFACE"] + className
-    FIELDS["CLASS_NAME"] = className
+    fields["CLASS_NAME"] = className
 
-def initializeInterfaceName(filePath, templateType):
+def interfaceClassName(interfaceName):
+    """Returns Name of the interface I<Name>.  Raises ValueError if
+    interfaceName does not follow that convention."""
+    if not INTERFACE_NAME_PATTERN.match(interfaceName):
+        raise ValueError("{0} does not name an interface: expected {1}<Name>"
+                         .format(interfaceName, PREFIXES["INTERFACE"]))
+    return interfaceName[len(PREFIXES["INTERFACE"]):]
+
+def initializeInterfaceName(fields, filePath, templateType):
     interfaceName = ntpath.basename(filePath)
     interfaceName = interfaceName.split(".")[0]
     if(templateType == "INTERFACE"):
-        FIELDS["INTERFACE_NAME"] = FIELDS["CLASS_NAME"]
+        fields["INTERFACE_NAME"] = fields["CLASS_NAME"]
     else:
-        FIELDS["INTERFACE_NAME"] = interfaceName
+        fields["INTERFACE_NAME"] = interfaceName
 
 # -- Dependency Inclusion Logic -----------------------
 
+def typeName(objectType):
+    return objectType.replace("const", "").replace("*", "").replace("&", "").replace(" ", "")
+
+def isIndirect(declaration):
+    """Returns whether the type of declaration is a pointer or a reference."""
+    return "*" in declaration or "&" in declaration
+
 def shouldBeIncluded(includeString):
     return ("::" not in includeString) and (includeString[0].isupper())
 
+def includeResolver():
+    """Returns the IncludeResolver of the --include-root directories, made
+    once for all the classes of the process, or None without any."""
+    global RESOLVER
+    if RESOLVER is None and OPTIONS["INCLUDE_ROOTS"]:
+        useGmockGenerator()
+        from cpp import include_resolver
+        from cpp import output_cache
+        cache = None if OPTIONS["NO_CACHE"] else output_cache.OutputCache()
+        RESOLVER = include_resolver.IncludeResolver(OPTIONS["INCLUDE_ROOTS"], cache)
+    return RESOLVER
+
+def createInclude(dependency):
+    """Returns the #include of dependency, "" if it needs none."""
+    if dependency in QT_CLASSES:
+        return "#include <{0}>\n".format(dependency)
+    resolver = includeResolver()
+    if resolver is not None:
+        includePath = resolver.IncludePath(dependency)
+        if includePath is not None:
+            return "#include \"{0}\"\n".format(includePath)
+    if shouldBeIncluded(dependency):
+        return "#include \"{0}.h\"\n".format(dependency)
+    return ""
+
+def createForwardDeclaration(dependency):
+    """Returns the forward declaration of dependency, "" if it has none."""
+    resolver = includeResolver()
+    if resolver is not None:
+        found = resolver.Find(dependency)
+        if found is not None:
+            # Enums and aliases cannot be forward declared like a class.
+            if found[1] in ("class", "struct", "union") and "::" not in dependency:
+                return "{0} {1};\n".format(found[1], dependency)
+            return ""
+    if shouldBeIncluded(dependency):
+        return "class {0};\n".format(dependency)
+    return ""
+
 # -- File Creation ------------------------------------
-def createInterface():
-    FIELDS["FILE_NAME"] = FIELDS["CLASS_NAME"] + EXTENSIONS["CPP_HEADER"]
+def createInterface(generation):
+    fields = generation.fields
+    fields["FILE_NAME"] = fields["CLASS_NAME"] + EXTENSIONS["CPP_HEADER"]
     interfaceTemplate = loadTemplate("INTERFACE")
-    completedTemplate = replaceFields(interfaceTemplate)
-    writeToDisk(completedTemplate)
+    completedTemplate = replaceFields(fields, interfaceTemplate)
+    writeToDisk(generation, completedTemplate)
 
-def createClass():
-    FIELDS["FILE_NAME"] = FIELDS["CLASS_NAME"] + EXTENSIONS["CPP_CLASS"]
+def createClass(generation):
+    fields = generation.fields
+    fields["FILE_NAME"] = fields["CLASS_NAME"] + EXTENSIONS["CPP_CLASS"]
     cppTemplate = loadTemplate("CLASS_CPP")
-    completedCpp = replaceFields(cppTemplate)
-    writeToDisk(completedCpp)
+    completedCpp = replaceFields(fields, cppTemplate)
+    writeToDisk(generation, completedCpp)
 
-    FIELDS["FILE_NAME"] = FIELDS["CLASS_NAME"] + EXTENSIONS["CPP_HEADER"]
+    fields["FILE_NAME"] = fields["CLASS_NAME"] + EXTENSIONS["CPP_HEADER"]
     headerTemplate = loadTemplate("CLASS_HEADER")
-    completedHeader = replaceFields(headerTemplate)
-    writeToDisk(completedHeader)
+    completedHeader = replaceFields(fields, headerTemplate)
+    writeToDisk(generation, completedHeader)
 
-def createMock():
-    sys.path.append(os.path.dirname(__file__))
+def createMock(fields, pathToInterface):
+    useGmockGenerator()
     from cpp import gmock_class
     gmock_class.__doc__ = gmock_class.__doc__.replace('gmock_class.py', __file__)
-    gmock_class.main()
+    gmockArgs = [__file__]
+    if OPTIONS["NO_CACHE"]:
+        gmockArgs.append("--no-cache")
+    gmockArgs.extend([pathToInterface, fields["INTERFACE_NAME"]])
+    gmock_class.main(gmockArgs)
+
+def mockInterface(generation, pathToInterface, source, classNames, diagnostics):
+    """Generates the mocks of classNames, by default the interface, into
+    generation, appending the declarations that could not be parsed and the
+    classes that were not found to diagnostics."""
+    useGmockGenerator()
+    from cpp import gmock_class
+    if source is None:
+        source = readFile(pathToInterface)
+    desiredClassNames = set(classNames or [generation.fields["INTERFACE_NAME"]])
+    cache = None if generation.noCache else AST_CACHE
+    # Declarations that cannot be parsed are skipped and reported with
+    # their line and token.
+    parseErrors = []
+    mocks, mockedClassNames = gmock_class.MockSource(
+        pathToInterface, source, desiredClassNames, cache, parseErrors)
+    for parseError in parseErrors:
+        diagnostics.append(str(parseError))
+    missingClassNames = sorted(desiredClassNames - mockedClassNames)
+    if missingClassNames:
+        diagnostics.append("Class(es) not found in {0}: {1}".format(
+            pathToInterface, ", ".join(missingClassNames)))
+    fields = generation.fields
+    fields["FILE_NAME"] = fields["CLASS_NAME"] + EXTENSIONS["CPP_HEADER"]
+    writeToDisk(generation, mocks)
 
 # -- I/O from Disk ----------------------------------
 def loadTemplate(templateType):
-    filePath = templateFilepath(templateType)
-    return readFile(filePath)
+    template = TEMPLATES.get(templateType)
+    if template is None:
+        template = readFile(templateFilepath(templateType))
+        TEMPLATES[templateType] = template
+    return template
 
 def readFile(filePath):
     with open(filePath, "r") as openTemplate:
@@ -341,21 +779,117 @@ def includeListFilepath(includeFileName):
     relativePath = "../resources/include-lists/" + includeFileName
     return os.path.join(scriptDirectory, relativePath)
 
-def writeToDisk(stringToSave):
-    with open(FIELDS["FILE_NAME"], "w+") as newFile:
-        newFile.write(stringToSave)
-
-# -- String Search and Replace ----------------------
-def replaceFields(stringToFill):
-    for fieldKey in FIELDS.keys():
-        stringToFill = searchAndReplace(fieldKey, FIELDS[fieldKey], stringToFill)
-    return stringToFill
-
-def searchAndReplace(toSearch, toReplace, stringToUpdate):
-    toSearch = "{{" + toSearch + "}}"
-    return stringToUpdate.replace(toSearch, toReplace)
+def gmockGeneratorPath():
+    scriptDirectory = os.path.dirname(__file__)
+    return os.path.join(scriptDirectory, "../external-libs/gmock-generator")
+
+def useGmockGenerator():
+    """Makes the cpp package of the gmock generator importable."""
+    path = gmockGeneratorPath()
+    if path not in sys.path:
+        sys.path.append(path)
+
+def writeToDisk(generation, stringToSave):
+    fileName = generation.fields["FILE_NAME"]
+    generation.writtenFiles.append((fileName, stringToSave))
+    if not generation.writeFiles:
+        return
+    if generation.directory:
+        if not os.path.isdir(generation.directory):
+            os.makedirs(generation.directory, exist_ok=True)
+        fileName = os.path.join(generation.directory, fileName)
+    with open(fileName, "w+") as newFile:
+        if FILE_METRICS is None:
+            newFile.write(stringToSave)
+        else:
+            FILE_METRICS.Write(newFile, stringToSave)
+
+# -- Output Cache ----------------------------------
+def openOutputCache(generation, source):
+    """Returns (cache, key) of the class generated from the interface
+    source, (None, None) with --no-cache."""
+    if generation.noCache:
+        return None, None
+    useGmockGenerator()
+    from cpp import disk_cache
+    from cpp import output_cache
+    generatorFiles = [__file__, includeListFilepath("qt-includes.txt")]
+    generatorFiles.extend([templateFilepath(templateType)
+                           for templateType in TEMPLATE_FILENAMES])
+    fields = generation.fields
+    resolver = includeResolver()
+    key = disk_cache.HashKey(disk_cache.FilesKey(*generatorFiles), source,
+                             fields["TEMPLATE_TYPE"], fields["CLASS_NAME"],
+                             fields["INTERFACE_NAME"], fields["YEAR"],
+                             resolver.Key() if resolver is not None else "")
+    return output_cache.OutputCache(), key
+
+def copyCachedOutputs(generation, outputCache, outputKey):
+    """Writes the files stored for outputKey, returns False on a miss."""
+    from cpp import output_cache
+    cachedFiles = output_cache.Get(outputCache, outputKey)
+    if cachedFiles is None:
+        return False
+    generation.cached = True
+    if FILE_METRICS is not None:
+        FILE_METRICS.cached = True
+    for fileName, stringToSave in cachedFiles:
+        generation.fields["FILE_NAME"] = fileName
+        writeToDisk(generation, stringToSave)
+    return True
+
+# -- Metrics (--metrics-json) -----------------------
+def metricsPhase(phase):
+    if FILE_METRICS is None:
+        return contextlib.nullcontext()
+    return FILE_METRICS.Phase(phase)
+
+# -- Template Filling -------------------------------
+def replaceFields(fields, stringToFill):
+    output = io.StringIO()
+    emitFields(output, fields, stringToFill)
+    return output.getvalue()
+
+def emitFields(output, fields, template, expanding=()):
+    """Writes template to output with each {{FIELD}} replaced by its value
+    in fields, chunk by chunk, without building the filled text.
+
+    A value is either a string, itself filled in (e.g. the copyright holds
+    {{FILE_NAME}}), or a list of chunks of code written as they are.
+    Unknown fields, and fields within their own value, are kept.
+    """
+    parts = templateParts(template)
+    for index in range(0, len(parts) - 1, 2):
+        if parts[index]:
+            output.write(parts[index])
+        fieldKey = parts[index + 1]
+        value = fields.get(fieldKey)
+        if value is None or fieldKey in expanding:
+            output.write("{{" + fieldKey + "}}")
+        elif isinstance(value, str):
+            if "{{" in value:
+                emitFields(output, fields, value, expanding + (fieldKey,))
+            else:
+                output.write(value)
+        else:
+            for chunk in value:
+                output.write(chunk)
+    if parts[-1]:
+        output.write(parts[-1])
+
+def templateParts(template):
+    """Returns template split into [text, field name, ..., text]."""
+    parts = TEMPLATE_PARTS.get(template)
+    if parts is None:
+        parts = FIELD_PATTERN.split(template)
+        TEMPLATE_PARTS[template] = parts
+    return parts
 
 # -- Print Statements -------------------------------
+def printIncludesRemoved(generation):
+    for fileName, removed in sorted(generation.includesRemoved.items()):
+        print("{0}: {1} include(s) removed".format(fileName, removed))
+
 def printUsageError():
     print("NewClass.py: Invalid arguments. Try \"python NewClass.py --help\".\n")
     sys.exit()
@@ -369,7 +903,37 @@ def printHelp():
         to suit your specific styles / needs.
 
     Usage:
-        python NewClass.py <CLASS_TYPE> <INTERFACE_PATH>
+        python NewClass.py [--no-cache] [--index FILE] [--include-root DIR]...
+                           [--include-report] [--profile[=FILE]]
+                           [--metrics-json FILE] <CLASS_TYPE> <INTERFACE_PATH>
+        python NewClass.py --stdio [--jobs N] [--no-cache] [--index FILE]
+                           [--include-root DIR]...
+
+        --no-cache   Parse the interface and render the templates from
+                     scratch instead of reusing the parsed header and
+                     output caches.
+        --index FILE Look INTERFACE_PATH up by class name in a class index
+                     built with cpp/class_index.py.
+        --include-root DIR
+                     Include the types the class depends on from the
+                     headers under DIR that define them, and only
+                     forward declare classes.  May be repeated.
+        --include-report
+                     Print how many includes of its dependencies each
+                     generated file does without.
+        --metrics-json FILE
+                     Write bytes, counts and the time per phase as JSON
+                     to FILE (- for stderr).
+        --profile[=FILE]
+                     Run under cProfile, write the profile to FILE
+                     (NewClass.pstats by default) and print the time
+                     spent reading, parsing, generating and writing.
+        --stdio      Read one JSON request per line of stdin, e.g.
+                     {"id": 1, "type": "class", "path": "IWidget.h"},
+                     and write one JSON result per line to stdout with
+                     the contents of the generated files, keeping the
+                     parser and templates loaded between requests.
+        --jobs N     Requests run at once with --stdio (4 by default).
         
         CLASS_TYPE   |                    Notes                    |
         ------------------------------------------------------------    
@@ -0,0 +1,240 @@
+# C++ Code Generator
+# NewClass_test.py: Tests for NewClass.py.
+#
+# Usage:
+#   python -m pytest src
+
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+# Allow the NewClass import below to work when run as a standalone script.
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import NewClass
+
+NEW_CLASS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "NewClass.py")
+
+INTERFACE = """\
+#ifndef ITHING_H
+#define ITHING_H
+
+class IThing
+{
+public:
+    virtual ~IThing() {}
+    virtual Widget* widget() = 0;
+    virtual void setLevel(Level level) = 0;
+};
+
+#endif
+"""
+
+def generateClass(source, path="IThing.h"):
+    """Returns the Generation of the class of the interface source."""
+    generation = NewClass.Generation(writeFiles=False)
+    generation.noCache = True
+    NewClass.initializeFields(generation.fields, "class", path)
+    NewClass.generateFiles(generation, path, source)
+    return generation
+
+class StdioTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def serve(self, *requests):
+        """Runs NewClass.py --stdio on requests, returns {id: result} of the
+        lines of stdout, each of which must be a JSON object."""
+        lines = [request if isinstance(request, str) else json.dumps(request)
+                 for request in requests]
+        process = subprocess.run(
+            [sys.executable, NEW_CLASS, "--stdio", "--no-cache", "--jobs", "2"],
+            input="\n".join(lines) + "\n", stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, universal_newlines=True, cwd=self.directory,
+            timeout=60)
+        self.assertEqual(0, process.returncode, process.stderr)
+        results = {}
+        for line in process.stdout.splitlines():
+            result = json.loads(line)
+            self.assertIsInstance(result, dict)
+            results[result["id"]] = result
+        self.assertEqual(len(requests), len(process.stdout.splitlines()))
+        return results
+
+    def testValidRequest(self):
+        results = self.serve({"id": 1, "type": "class", "path": "IThing.h",
+                              "source": INTERFACE})
+        result = results[1]
+        self.assertEqual(None, result["error"])
+        self.assertEqual(["Thing.cpp", "Thing.h"],
+                         [file["name"] for file in result["files"]])
+        # Nothing is written without a directory.
+        self.assertEqual([], os.listdir(self.directory))
+
+    def testMalformedAndInvalidRequests(self):
+        results = self.serve(
+            "{not json",
+            {"id": 2, "type": "class", "path": "Widget.h", "source": INTERFACE},
+            {"id": 3, "type": "widget", "path": "IThing.h"},
+            {"id": 4, "type": "class", "path": "IThing.h",
+             "source": "class IThing {\n    virtual int missingParens = 0;\n};\n"},
+            {"id": 5, "type": "class", "path": "IThing.h", "source": INTERFACE})
+        self.assertTrue(results[None]["error"].startswith("JSONDecodeError: "))
+        self.assertEqual("ValueError: Widget does not name an interface: "
+                         "expected I<Name>", results[2]["error"])
+        self.assertEqual("ValueError: unknown type: widget", results[3]["error"])
+        self.assertIn("IThing.h:2: cannot parse 'virtual int missingParens = 0;'",
+                      results[4]["error"])
+        # A failed request does not stop the others.
+        self.assertEqual(None, results[5]["error"])
+        for result in results.values():
+            if result["error"] is not None:
+                self.assertEqual([], result["files"])
+
+    def testMockDiagnosticsHaveLocations(self):
+        source = ("class IThing {\n public:\n  bool Broken(;\n"
+                  "  virtual void reset() = 0;\n};\n")
+        results = self.serve({"id": 1, "type": "mock", "path": "IThing.h",
+                              "source": source})
+        result = results[1]
+        self.assertEqual(None, result["error"])
+        self.assertEqual(1, len(result["diagnostics"]))
+        self.assertIn("IThing.h:3:3: ", result["diagnostics"][0])
+        self.assertIn("near 'bool' in class IThing", result["diagnostics"][0])
+        self.assertIn("MOCK_METHOD0(reset", result["files"][0]["contents"])
+
+class IncludesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        NewClass.OPTIONS["INCLUDE_ROOTS"] = []
+        NewClass.RESOLVER = None
+        shutil.rmtree(self.directory)
+
+    def files(self, source, path="IThing.h"):
+        generation = generateClass(source, path)
+        return dict(generation.writtenFiles), generation.includesRemoved
+
+    def testByValueOnlyIncludes(self):
+        files, includesRemoved = self.files(INTERFACE)
+        header = files["Thing.h"]
+        self.assertIn('#include "Level.h"\n', header)
+        self.assertNotIn('#include "Widget.h"', header)
+        self.assertIn("class Widget;\n", header)
+        self.assertNotIn("class Level;", header)
+        cpp = files["Thing.cpp"]
+        self.assertIn('#include "Thing.h"\n\n#include "Widget.h"\n\n\nThing::Thing()', cpp)
+        self.assertNotIn("Level.h", cpp)
+        self.assertEqual({"Thing.h": 1, "Thing.cpp": 1}, includesRemoved)
+
+    def testOwnNameIsNotADependency(self):
+        source = ("class IWidget\n{\npublic:\n"
+                  "    virtual Widget* clone() = 0;\n"
+                  "    virtual IWidget& self() = 0;\n"
+                  "    virtual bool equals(Widget other) = 0;\n"
+                  "    virtual void attach(Parent* parent) = 0;\n};\n")
+        files, includesRemoved = self.files(source, "IWidget.h")
+        header = files["Widget.h"]
+        self.assertNotIn("class Widget;", header)
+        self.assertNotIn("class IWidget;", header)
+        self.assertNotIn('#include "Widget.h"', header)
+        self.assertEqual(1, header.count('#include "IWidget.h"'))
+        self.assertIn("class Parent;\n", header)
+        cpp = files["Widget.cpp"]
+        self.assertEqual(1, cpp.count('#include "Widget.h"'))
+        self.assertNotIn('#include "IWidget.h"', cpp)
+        self.assertIn('#include "Parent.h"\n', cpp)
+        self.assertEqual({"Widget.h": 1, "Widget.cpp": 0}, includesRemoved)
+
+    def testIncludeRoots(self):
+        headers = {
+            os.path.join("gfx", "Level.h"): "namespace gfx {\nenum class Level { Low, High };\n}\n",
+            os.path.join("ui", "Widget.h"): "struct Widget\n{\n    int id;\n};\n"
+        }
+        for relativePath, contents in headers.items():
+            os.makedirs(os.path.join(self.directory, os.path.dirname(relativePath)), exist_ok=True)
+            with open(os.path.join(self.directory, relativePath), "w") as headerFile:
+                headerFile.write(contents)
+        NewClass.OPTIONS["INCLUDE_ROOTS"] = [self.directory]
+        NewClass.RESOLVER = None
+        files, includesRemoved = self.files(INTERFACE.replace("Level level", "const Level& level"))
+        header = files["Thing.h"]
+        # An enum cannot be forward declared, even when used by reference.
+        self.assertIn('#include "gfx/Level.h"\n', header)
+        self.assertIn("struct Widget;\n", header)
+        self.assertNotIn("ui/Widget.h", header)
+        self.assertIn('#include "ui/Widget.h"\n', files["Thing.cpp"])
+        self.assertNotIn("Level.h", files["Thing.cpp"])
+        self.assertEqual({"Thing.h": 1, "Thing.cpp": 1}, includesRemoved)
+
+def replaceWholeFields(fields, stringToFill):
+    """replaceFields() as it was before emitFields(): the whole text is
+    replaced once per field, in the order of fields."""
+    for fieldKey, value in fields.items():
+        if isinstance(value, list):
+            value = "".join(value)
+        stringToFill = stringToFill.replace("{{" + fieldKey + "}}", value)
+    return stringToFill
+
+class EmitFieldsTest(unittest.TestCase):
+
+    def fields(self):
+        fields = {"COPYRIGHT": NewClass.loadTemplate("COPYRIGHT")}
+        for fieldKey in sorted(set(NewClass.FIELD_PATTERN.findall(
+                "".join(NewClass.loadTemplate(templateType)
+                        for templateType in NewClass.TEMPLATE_FILENAMES)))):
+            if fieldKey not in fields:
+                fields[fieldKey] = ["{0} {1};\n".format(fieldKey.lower(), index)
+                                    for index in range(3)]
+        fields["CLASS_NAME"] = "Thing"
+        fields["FILE_NAME"] = "Thing.h"
+        fields["YEAR"] = "2026"
+        return fields
+
+    def testTemplatesMatchWholeReplacement(self):
+        fields = self.fields()
+        for templateType in NewClass.TEMPLATE_FILENAMES:
+            template = NewClass.loadTemplate(templateType)
+            output = io.StringIO()
+            NewClass.emitFields(output, fields, template)
+            self.assertEqual(replaceWholeFields(fields, template), output.getvalue(),
+                             templateType)
+            self.assertEqual(output.getvalue(), NewClass.replaceFields(fields, template))
+            self.assertNotIn("{{", output.getvalue(), templateType)
+
+    def testGeneratedClassMatchesWholeReplacement(self):
+        generation = generateClass(INTERFACE)
+        fields = generation.fields
+        self.assertIsInstance(fields["FUNCTION_DEFINITIONS"], list)
+        for fileName, contents in generation.writtenFiles:
+            fields["FILE_NAME"] = fileName
+            templateType = "CLASS_HEADER" if fileName.endswith(".h") else "CLASS_CPP"
+            self.assertEqual(replaceWholeFields(fields, NewClass.loadTemplate(templateType)),
+                             contents)
+
+    def testFieldsOfValues(self):
+        fields = {"OUTER": "<{{INNER}}>", "INNER": ["a", "b"], "LOOP": "{{LOOP}}"}
+        self.assertEqual("x <ab> {{LOOP}} {{UNKNOWN}} y",
+                         NewClass.replaceFields(fields, "x {{OUTER}} {{LOOP}} {{UNKNOWN}} y"))
+
+class InterfaceNameTest(unittest.TestCase):
+
+    def testInterfaceClassName(self):
+        self.assertEqual("Thing", NewClass.interfaceClassName("IThing"))
+        self.assertEqual("Inline", NewClass.interfaceClassName("IInline"))
+        self.assertRaises(ValueError, NewClass.interfaceClassName, "Thing")
+        self.assertRaises(ValueError, NewClass.interfaceClassName, "I")
+
+if __name__ == "__main__":
+    unittest.main()
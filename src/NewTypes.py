@@ -0,0 +1,415 @@
+# C++ Code Generator
+# NewTypes.py: Generates enums and value types in bulk from a spec.
+#
+# Usage:
+#   python NewTypes.py [--output-dir DIR] [--include-root DIR]... <SPEC>...
+#
+# Each type is written as a .h and a .cpp rendered from the enum_* and
+# value_* templates in resources/templates, with the same fields as the
+# templates of NewClass.py.  An enum gets toString() and fromString() backed
+# by a table of its names; a value type gets operator==, operator!= and, if
+# std::hash is known to exist for the types of all its fields, a std::hash
+# specialization.  The types of fields are included like the dependencies of
+# NewClass.py classes, from --include-root if given.
+#
+# A SPEC ending in .csv has one row per enumerator or field:
+#
+#   kind,namespace,name,member,type,value
+#   enum,gfx,Color,Red,uint8_t,
+#   enum,gfx,Color,Green,,2
+#   value,gfx,Point,x,int,0
+#   value,gfx,Point,y,int,
+#
+# For an enum, type is its underlying type (given on any of its rows) and
+# value the value of the enumerator; for a value type, type is the type of
+# the field and value its default.  The rows of a type must follow each
+# other, so that each type is generated as soon as its last row is read.
+#
+# Any other SPEC is JSON: either one type per line (JSON Lines), generated
+# as it is read, or an array of types:
+#
+#   {"kind": "enum", "namespace": "gfx", "name": "Color", "type": "uint8_t",
+#    "members": ["Red", {"name": "Green", "value": "2"}]}
+#   {"kind": "value", "name": "Point",
+#    "members": [{"name": "x", "type": "int", "value": "0"}]}
+#
+# std::hash is known for arithmetic types, pointers, strings, smart pointers
+# and the enums and hashed value types generated before.  A value type with a
+# field of any other type, e.g. std::vector, gets no std::hash and a warning;
+# "hash": true in its JSON spec generates it anyway, for types given a
+# std::hash elsewhere, and "hash": false leaves it out without a warning.
+
+import sys
+import re
+import csv
+import json
+from datetime import datetime
+
+import NewClass
+
+KINDS = ["ENUM", "VALUE"]
+
+# (cpp, header) templates of each kind.
+TEMPLATES = {
+    "ENUM": ("ENUM_CPP", "ENUM_HEADER"),
+    "VALUE": ("VALUE_CPP", "VALUE_HEADER")
+}
+
+# Headers of the std types enums and value types commonly use.
+STD_HEADERS = {
+    "std::string": "string",
+    "std::vector": "vector",
+    "std::map": "map",
+    "std::set": "set",
+    "std::unordered_map": "unordered_map",
+    "std::unordered_set": "unordered_set",
+    "std::array": "array",
+    "std::optional": "optional",
+    "std::pair": "utility",
+    "std::shared_ptr": "memory",
+    "std::unique_ptr": "memory"
+}
+
+OPTIONS = {
+    "OUTPUT_DIR": ""
+}
+
+IDENTIFIER = re.compile(r"^[A-Za-z_]\w*$")
+TYPE_NAME = re.compile(r"[A-Za-z_][\w:]*")
+FIXED_WIDTH_INTEGER = re.compile(r"^(std::)?u?int(_least|_fast)?\d+_t$")
+
+# Types the standard library specializes std::hash for, besides pointers and
+# fixed width integers.
+STD_HASHABLE = frozenset([
+    "bool", "char", "signed char", "unsigned char", "wchar_t", "char16_t",
+    "char32_t", "short", "unsigned short", "int", "unsigned", "unsigned int",
+    "long", "unsigned long", "long long", "unsigned long long", "float",
+    "double", "long double", "size_t", "std::size_t", "std::nullptr_t",
+    "std::string", "std::wstring", "std::u16string", "std::u32string",
+    "std::string_view"
+])
+
+# Templates std::hash is specialized for whatever their arguments are.
+STD_HASHABLE_TEMPLATES = frozenset(["std::shared_ptr", "std::unique_ptr"])
+
+# Names of the types generated so far that have a std::hash.
+HASHABLE_TYPES = set()
+
+class SpecError(ValueError):
+    def __init__(self, location, message):
+        ValueError.__init__(self, "{0}: {1}".format(location, message))
+
+class TypeSpec:
+    def __init__(self, kind, namespace, name, location):
+        self.kind = kind.upper()
+        self.namespace = namespace
+        self.name = name
+        self.location = location
+        self.underlyingType = ""
+        self.members = []
+        # Whether a value type gets a std::hash: None to decide from the
+        # types of its members.
+        self.hash = None
+        # Set when the spec of the type could not be read.
+        self.error = ""
+
+    def qualifiedName(self):
+        if self.namespace:
+            return "{0}::{1}".format(self.namespace, self.name)
+        return self.name
+
+    def validate(self):
+        if self.error:
+            raise SpecError(self.location, self.error)
+        if self.kind not in KINDS:
+            raise SpecError(self.location, "unknown kind '{0}'".format(self.kind.lower()))
+        names = [self.name] + [member.name for member in self.members]
+        if self.namespace:
+            names.extend(self.namespace.split("::"))
+        for name in names:
+            if not IDENTIFIER.match(name):
+                raise SpecError(self.location, "'{0}' is not an identifier".format(name))
+        if not self.members:
+            raise SpecError(self.location, "{0} has no members".format(self.name))
+        if self.kind == "VALUE":
+            for member in self.members:
+                if not member.type:
+                    raise SpecError(self.location, "{0}::{1} has no type".format(self.name, member.name))
+        elif self.hash is not None:
+            raise SpecError(self.location, "only value types have a hash")
+
+class Member:
+    def __init__(self, name, memberType="", value=""):
+        self.name = name
+        self.type = memberType
+        self.value = value
+
+def main():
+    specPaths = initializeOptions(sys.argv[1:])
+    if not specPaths or specPaths[0] in ("--help", "-h"):
+        printHelp()
+    NewClass.initializeQtClasses()
+    typeCount = 0
+    failures = 0
+    for specPath in specPaths:
+        try:
+            for typeSpec in readSpecs(specPath):
+                try:
+                    typeSpec.validate()
+                    createType(typeSpec)
+                    typeCount += 1
+                except SpecError as error:
+                    sys.stderr.write("NewTypes.py: {0}\n".format(error))
+                    failures += 1
+        except (IOError, ValueError) as error:
+            sys.stderr.write("NewTypes.py: {0}: {1}\n".format(specPath, error))
+            failures += 1
+    print("Generated {0} type(s).".format(typeCount))
+    if failures:
+        sys.exit(1)
+
+def initializeOptions(args):
+    positionalArgs = []
+    args = iter(args)
+    for arg in args:
+        if arg == "--output-dir":
+            OPTIONS["OUTPUT_DIR"] = next(args, "")
+        elif arg.startswith("--output-dir="):
+            OPTIONS["OUTPUT_DIR"] = arg.split("=", 1)[1]
+        elif arg == "--include-root":
+            NewClass.OPTIONS["INCLUDE_ROOTS"].append(next(args, ""))
+        elif arg.startswith("--include-root="):
+            NewClass.OPTIONS["INCLUDE_ROOTS"].append(arg.split("=", 1)[1])
+        else:
+            positionalArgs.append(arg)
+    return positionalArgs
+
+# -- Reading Specs -----------------------------------
+
+def readSpecs(specPath):
+    """Yields the TypeSpec of each type of specPath as it is read."""
+    if specPath.lower().endswith(".csv"):
+        return readCsvSpecs(specPath)
+    return readJsonSpecs(specPath)
+
+def readCsvSpecs(specPath):
+    seenNames = set()
+    typeSpec = None
+    with open(specPath, "r", newline="") as specFile:
+        reader = csv.DictReader(specFile)
+        for row in reader:
+            location = "{0}:{1}".format(specPath, reader.line_num)
+            kind = csvField(row, "kind").upper()
+            namespace = csvField(row, "namespace")
+            name = csvField(row, "name")
+            if (typeSpec is None or typeSpec.kind != kind or
+                    typeSpec.namespace != namespace or typeSpec.name != name):
+                if typeSpec is not None:
+                    yield typeSpec
+                typeSpec = TypeSpec(kind, namespace, name, location)
+                if typeSpec.qualifiedName() in seenNames:
+                    typeSpec.error = "the rows of {0} do not follow each other".format(typeSpec.qualifiedName())
+                seenNames.add(typeSpec.qualifiedName())
+            member = Member(csvField(row, "member"), csvField(row, "type"), csvField(row, "value"))
+            if kind == "ENUM":
+                if member.type:
+                    typeSpec.underlyingType = member.type
+                member.type = ""
+            typeSpec.members.append(member)
+    if typeSpec is not None:
+        yield typeSpec
+
+def csvField(row, column):
+    return (row.get(column) or "").strip()
+
+def readJsonSpecs(specPath):
+    with open(specPath, "r") as specFile:
+        firstLine = specFile.readline()
+        if firstLine.lstrip().startswith("["):
+            # An array is only complete at its end.
+            entries = json.loads(firstLine + specFile.read())
+            for index, entry in enumerate(entries):
+                yield jsonTypeSpec(entry, "{0}[{1}]".format(specPath, index))
+            return
+        lineNumber = 1
+        line = firstLine
+        while line:
+            if line.strip():
+                location = "{0}:{1}".format(specPath, lineNumber)
+                try:
+                    entry = json.loads(line)
+                except ValueError as error:
+                    entry = None
+                    typeSpec = TypeSpec("", "", "", location)
+                    typeSpec.error = str(error)
+                    yield typeSpec
+                if entry is not None:
+                    yield jsonTypeSpec(entry, location)
+            line = specFile.readline()
+            lineNumber += 1
+
+def jsonTypeSpec(entry, location):
+    if not isinstance(entry, dict):
+        typeSpec = TypeSpec("", "", "", location)
+        typeSpec.error = "a type must be a JSON object"
+        return typeSpec
+    typeSpec = TypeSpec(jsonField(entry, "kind"), jsonField(entry, "namespace"),
+                        jsonField(entry, "name"), location)
+    typeSpec.underlyingType = jsonField(entry, "type")
+    typeSpec.hash = entry.get("hash")
+    if typeSpec.hash not in (None, True, False):
+        typeSpec.error = "hash must be true or false"
+    for member in entry.get("members") or []:
+        if isinstance(member, dict):
+            typeSpec.members.append(Member(jsonField(member, "name"),
+                                           jsonField(member, "type"),
+                                           jsonField(member, "value")))
+        else:
+            typeSpec.members.append(Member(str(member)))
+    return typeSpec
+
+def jsonField(entry, key):
+    value = entry.get(key)
+    if value is None:
+        return ""
+    return str(value).strip()
+
+# -- Type Creation -----------------------------------
+
+def createType(typeSpec):
+    generation = NewClass.Generation()
+    generation.directory = OPTIONS["OUTPUT_DIR"]
+    fields = generation.fields
+    fields["TEMPLATE_TYPE"] = typeSpec.kind
+    fields["YEAR"] = datetime.now().strftime("%Y")
+    fields["COPYRIGHT"] = NewClass.loadTemplate("COPYRIGHT")
+    fields["CLASS_NAME"] = typeSpec.name
+    fields["QUALIFIED_NAME"] = typeSpec.qualifiedName()
+    fields["HEADER_DEF"] = "{0}_H".format(typeSpec.name.upper())
+    fields["NAMESPACE_BEGIN"], fields["NAMESPACE_END"] = namespaceBlocks(typeSpec.namespace)
+    if typeSpec.kind == "ENUM":
+        initializeEnumFields(fields, typeSpec)
+    else:
+        initializeValueFields(fields, typeSpec)
+
+    cppTemplate, headerTemplate = TEMPLATES[typeSpec.kind]
+    fields["FILE_NAME"] = typeSpec.name + NewClass.EXTENSIONS["CPP_CLASS"]
+    NewClass.writeToDisk(generation, NewClass.replaceFields(fields, NewClass.loadTemplate(cppTemplate)))
+    fields["FILE_NAME"] = typeSpec.name + NewClass.EXTENSIONS["CPP_HEADER"]
+    NewClass.writeToDisk(generation, NewClass.replaceFields(fields, NewClass.loadTemplate(headerTemplate)))
+
+def initializeEnumFields(fields, typeSpec):
+    enumerators = []
+    nameTable = []
+    for member in typeSpec.members:
+        if member.value:
+            enumerators.append("    {0} = {1},\n".format(member.name, member.value))
+        else:
+            enumerators.append("    {0},\n".format(member.name))
+        nameTable.append("    {{ {0}::{1}, \"{1}\" }},\n".format(typeSpec.name, member.name))
+    fields["ENUMERATORS"] = "".join(enumerators)
+    fields["NAME_TABLE"] = "".join(nameTable)
+    fields["UNDERLYING_TYPE"] = ""
+    if typeSpec.underlyingType:
+        fields["UNDERLYING_TYPE"] = " : {0}".format(typeSpec.underlyingType)
+    fields["INCLUDES"] = createIncludes([typeSpec.underlyingType])
+    # Enumerations have had a std::hash since C++14.
+    HASHABLE_TYPES.update([typeSpec.name, typeSpec.qualifiedName()])
+
+def initializeValueFields(fields, typeSpec):
+    members = []
+    comparisons = []
+    hashCombines = []
+    for member in typeSpec.members:
+        members.append("    {0} {1}{{{2}}};\n".format(member.type, member.name, member.value))
+        comparisons.append("{0} == other.{0}".format(member.name))
+        hashCombines.append("    seed ^= std::hash<{0}>()(value.{1}) + 0x9e3779b9 + (seed << 6) + (seed >> 2);\n"
+                            .format(unqualifiedType(member.type), member.name))
+    fields["MEMBERS"] = "".join(members)
+    fields["EQUALITY"] = "\n        && ".join(comparisons)
+    fields["HASH_COMBINE"] = "".join(hashCombines)
+    fields["INCLUDES"] = createIncludes([member.type for member in typeSpec.members])
+    fields["HASH_DECLARATION"] = ""
+    fields["HASH_DEFINITION"] = ""
+    unhashable = [member.type for member in typeSpec.members if not isHashable(member.type)]
+    if typeSpec.hash is None and unhashable:
+        sys.stderr.write("NewTypes.py: {0}: warning: no std::hash<{1}> generated, std::hash<{2}> "
+                         "is not known to exist; set \"hash\": true if it does\n"
+                         .format(typeSpec.location, typeSpec.qualifiedName(), unhashable[0]))
+    if typeSpec.hash or (typeSpec.hash is None and not unhashable):
+        fields["HASH_DECLARATION"] = "\n" + NewClass.replaceFields(fields, NewClass.loadTemplate("VALUE_HASH_HEADER")) + "\n"
+        fields["HASH_DEFINITION"] = "\n" + NewClass.replaceFields(fields, NewClass.loadTemplate("VALUE_HASH_CPP"))
+        HASHABLE_TYPES.update([typeSpec.name, typeSpec.qualifiedName()])
+
+def unqualifiedType(typeString):
+    """Returns typeString without its top-level const, which std::hash is
+    not given.  The const of what a pointer points to is kept."""
+    typeString = " ".join(typeString.split())
+    if typeString.endswith(" const") or typeString.endswith("*const"):
+        typeString = typeString[:-len("const")].rstrip()
+    if "*" not in typeString and typeString.startswith("const "):
+        typeString = typeString[len("const "):]
+    return typeString
+
+def isHashable(typeString):
+    """Returns whether std::hash is known to exist for typeString."""
+    typeString = unqualifiedType(typeString)
+    if typeString.endswith("*"):
+        return True
+    if "<" in typeString:
+        return typeString.split("<", 1)[0].strip() in STD_HASHABLE_TEMPLATES
+    return (typeString in STD_HASHABLE or typeString in HASHABLE_TYPES or
+            FIXED_WIDTH_INTEGER.match(typeString) is not None)
+
+def namespaceBlocks(namespace):
+    """Returns the text opening and closing namespace around a type."""
+    if not namespace:
+        return "", ""
+    names = namespace.split("::")
+    begin = "".join(["namespace {0}\n{{\n".format(name) for name in names])
+    end = "".join(["}} // namespace {0}\n".format(name) for name in reversed(names)])
+    return begin + "\n", "\n" + end
+
+# -- Dependency Inclusion Logic -----------------------
+
+def createIncludes(typeStrings):
+    """Returns the #includes of the types named in typeStrings, by the same
+    rules as the classes of NewClass.py."""
+    systemIncludes = set()
+    localIncludes = set()
+    for typeString in typeStrings:
+        for typeName in TYPE_NAME.findall(typeString):
+            if FIXED_WIDTH_INTEGER.match(typeName):
+                systemIncludes.add("#include <cstdint>\n")
+            elif typeName in STD_HEADERS:
+                systemIncludes.add("#include <{0}>\n".format(STD_HEADERS[typeName]))
+            else:
+                include = NewClass.createInclude(typeName)
+                if include.startswith("#include <"):
+                    systemIncludes.add(include)
+                elif include:
+                    localIncludes.add(include)
+    return "".join(sorted(systemIncludes) + sorted(localIncludes))
+
+# -- Print Statements -------------------------------
+def printHelp():
+    print('''
+    C++ Code Generator
+        NewTypes.py: Generates enums and value types in bulk from CSV or
+        JSON specs, one .h and .cpp per type.  See the top of NewTypes.py
+        for the format of the specs.
+
+    Usage:
+        python NewTypes.py [--output-dir DIR] [--include-root DIR]... <SPEC>...
+
+        --output-dir DIR
+                     Write the generated files to DIR instead of the
+                     working directory.
+        --include-root DIR
+                     Include the types of fields from the headers under
+                     DIR that define them.  May be repeated.
+        ''')
+    sys.exit()
+
+if __name__ == "__main__":
+    main()
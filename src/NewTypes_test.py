@@ -0,0 +1,137 @@
+# C++ Code Generator
+# NewTypes_test.py: Tests for NewTypes.py.
+#
+# Usage:
+#   python -m pytest src
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Allow the NewTypes import below to work when run as a standalone script.
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import NewClass
+import NewTypes
+
+class GenerationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        NewTypes.OPTIONS["OUTPUT_DIR"] = self.directory
+        NewTypes.HASHABLE_TYPES.clear()
+        NewClass.initializeQtClasses()
+
+    def tearDown(self):
+        NewTypes.OPTIONS["OUTPUT_DIR"] = ""
+        NewTypes.HASHABLE_TYPES.clear()
+        shutil.rmtree(self.directory)
+
+    def generate(self, spec, specName="types.jsonl"):
+        """Generates the types of spec, returns what was written to stderr."""
+        specPath = os.path.join(self.directory, specName)
+        with open(specPath, "w") as specFile:
+            specFile.write(spec)
+        stderr = sys.stderr
+        sys.stderr = io.StringIO()
+        try:
+            for typeSpec in NewTypes.readSpecs(specPath):
+                typeSpec.validate()
+                NewTypes.createType(typeSpec)
+            return sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+
+    def read(self, fileName):
+        with open(os.path.join(self.directory, fileName), "r") as generatedFile:
+            return generatedFile.read()
+
+    def testEnum(self):
+        self.generate("kind,namespace,name,member,type,value\n"
+                      "enum,gfx,Color,Red,uint8_t,\n"
+                      "enum,gfx,Color,Green,,2\n", "types.csv")
+        header = self.read("Color.h")
+        self.assertIn("#include <cstdint>\n", header)
+        self.assertIn("namespace gfx\n{\n\nenum class Color : uint8_t\n{\n"
+                      "    Red,\n    Green = 2,\n};\n", header)
+        self.assertIn("} // namespace gfx\n", header)
+        cpp = self.read("Color.cpp")
+        self.assertIn("    { Color::Red, \"Red\" },\n", cpp)
+        self.assertIn("    { Color::Green, \"Green\" },\n", cpp)
+
+    def testValueType(self):
+        stderr = self.generate(
+            '{"kind": "value", "namespace": "gfx", "name": "Point", "members": '
+            '[{"name": "x", "type": "int", "value": "0"}, '
+            '{"name": "label", "type": "const std::string"}]}\n')
+        self.assertEqual("", stderr)
+        header = self.read("Point.h")
+        self.assertIn("    int x{0};\n    const std::string label{};\n", header)
+        self.assertIn("#include <string>\n", header)
+        self.assertIn("struct hash<gfx::Point>\n", header)
+        cpp = self.read("Point.cpp")
+        self.assertIn("    return x == other.x\n        && label == other.label;\n", cpp)
+        self.assertIn("std::hash<std::string>()(value.label)", cpp)
+
+    def testConstMembers(self):
+        stderr = self.generate(
+            '{"kind": "value", "name": "Key", "members": '
+            '[{"name": "id", "type": "const int"}, '
+            '{"name": "count", "type": "unsigned long const"}, '
+            '{"name": "name", "type": "const char* const"}, '
+            '{"name": "owner", "type": "const std::shared_ptr<const Owner>"}]}\n')
+        self.assertEqual("", stderr)
+        self.assertIn("    const int id{};\n", self.read("Key.h"))
+        cpp = self.read("Key.cpp")
+        self.assertIn("std::hash<int>()(value.id)", cpp)
+        self.assertIn("std::hash<unsigned long>()(value.count)", cpp)
+        self.assertIn("std::hash<const char*>()(value.name)", cpp)
+        self.assertIn("std::hash<std::shared_ptr<const Owner>>()(value.owner)", cpp)
+        self.assertNotIn("std::hash<const int>", cpp)
+
+    def testContainerMemberHasNoHash(self):
+        stderr = self.generate(
+            '{"kind": "value", "name": "Path", "members": '
+            '[{"name": "points", "type": "std::vector<int>"}]}\n')
+        self.assertIn("warning: no std::hash<Path> generated, "
+                      "std::hash<std::vector<int>> is not known to exist", stderr)
+        header = self.read("Path.h")
+        self.assertIn("#include <vector>\n", header)
+        self.assertIn("    std::vector<int> points{};\n", header)
+        self.assertNotIn("hash<", header)
+        self.assertNotIn("hash<", self.read("Path.cpp"))
+        self.assertTrue(self.read("Path.cpp").endswith("    return !(*this == other);\n}\n"))
+
+    def testHashOption(self):
+        stderr = self.generate(
+            '{"kind": "value", "name": "Tags", "hash": false, "members": '
+            '[{"name": "tags", "type": "std::map<int, int>"}]}\n'
+            '{"kind": "value", "name": "Holder", "hash": true, "members": '
+            '[{"name": "widget", "type": "Widget"}]}\n')
+        self.assertEqual("", stderr)
+        self.assertNotIn("hash<", self.read("Tags.h"))
+        self.assertIn("std::hash<Widget>()(value.widget)", self.read("Holder.cpp"))
+        self.assertRaises(NewTypes.SpecError, self.generate,
+                          '{"kind": "value", "name": "Tags", "hash": "no", "members": '
+                          '[{"name": "tags", "type": "int"}]}\n')
+        self.assertRaises(NewTypes.SpecError, self.generate,
+                          '{"kind": "enum", "name": "Color", "hash": true, '
+                          '"members": ["Red"]}\n')
+
+    def testGeneratedTypesAreHashable(self):
+        stderr = self.generate(
+            '{"kind": "enum", "namespace": "gfx", "name": "Color", "members": ["Red"]}\n'
+            '{"kind": "value", "namespace": "gfx", "name": "Point", "members": '
+            '[{"name": "x", "type": "std::int32_t"}]}\n'
+            '{"kind": "value", "namespace": "gfx", "name": "Pixel", "members": '
+            '[{"name": "color", "type": "Color"}, {"name": "at", "type": "gfx::Point"}, '
+            '{"name": "next", "type": "std::unique_ptr<Pixel>"}, '
+            '{"name": "previous", "type": "Pixel*"}]}\n')
+        self.assertEqual("", stderr)
+        self.assertIn("struct hash<gfx::Pixel>\n", self.read("Pixel.h"))
+
+if __name__ == "__main__":
+    unittest.main()